@@ -0,0 +1,42 @@
+"""partition contacts by user
+
+Opt-in: the table is only partitioned on Postgres, when the number of partitions is passed, e.g.
+
+    alembic -x contact_partitions=16 upgrade head
+
+Without it the revision changes nothing, and it can be applied later by downgrading to the previous
+revision and upgrading again with the argument.
+
+Revision ID: 9a4f2c6d8e13
+Revises: 3c1d7e52a9b4
+Create Date: 2026-10-19 13:25:51.092634
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+
+from src.database.partitioning import partition_contacts, unpartition_contacts
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f2c6d8e13'
+down_revision: Union[str, None] = '3c1d7e52a9b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    arguments = context.get_x_argument(as_dictionary=True)
+    partitions = int(arguments.get('contact_partitions', 0))
+    if not partitions:
+        return
+    # The rows are copied in batches that commit on their own, outside of the migration transaction
+    with op.get_context().autocommit_block():
+        partition_contacts(op.get_bind(), partitions, batch_size=int(arguments.get('batch_size', 10_000)))
+
+
+def downgrade() -> None:
+    if context.is_offline_mode():
+        return
+    unpartition_contacts(op.get_bind())
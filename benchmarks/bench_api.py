@@ -0,0 +1,221 @@
+"""
+In-process load benchmark for the API's hot endpoints.
+
+The application is driven through httpx's ASGI transport, with a SQLite file database and in-memory
+Redis stand-ins, so no network or external service is needed. Every scenario reports throughput
+and p50/p95/p99 latency, and the results are written as JSON so that runs can be compared:
+
+    python -m benchmarks.bench_api --requests 2000 --concurrency 16
+    python -m benchmarks.bench_api --compare benchmarks/results/before.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import httpx
+from fastapi_limiter import FastAPILimiter
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.reporting import write_report
+from benchmarks.stand_ins import InMemoryAsyncRedis, InMemoryRedis
+from main import app
+from src.database.db import get_db
+from src.database.models import Base, Contact, User
+from src.services.auth import auth_service
+
+EMAIL = "bench@example.com"
+PASSWORD = "12345678"
+
+
+def contact_body(i: int) -> dict:
+    return {"name": f"Name{i}", "fullname": f"Full Name{i}", "email": f"contact{i}@example.com",
+            "phone_number": f"38050{i % 10000000:07d}", "birthday": str(date(1990, 1, 1) + timedelta(days=i % 365)),
+            "description": "benchmark contact"}
+
+
+def setup_database(url: str, contacts: int):
+    """
+    The setup_database function creates the schema, a confirmed user and its contacts.
+
+    :param url: str: The SQLAlchemy URL of the benchmark database
+    :param contacts: int: How many contacts the user owns
+    :return: A sessionmaker bound to the database and the id of the user
+    :doc-author: Trelent
+    """
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+    with session_factory() as db:
+        user = User(username="bench", email=EMAIL, password=auth_service.get_password_hash(PASSWORD),
+                    avatar="https://www.gravatar.com/avatar/bench", confirmed=True)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    add_contacts(session_factory, user_id, contacts)
+    return session_factory, user_id
+
+
+def add_contacts(session_factory, user_id: int, count: int) -> list[int]:
+    with session_factory() as db:
+        first = db.query(func.max(Contact.id)).scalar() or 0
+        now = datetime.now()
+        rows = []
+        for i in range(count):
+            row = contact_body(i)
+            row.update(birthday=date.fromisoformat(row["birthday"]), user_id=user_id, created_at=now, updated_at=now)
+            rows.append(row)
+        if rows:
+            db.execute(insert(Contact), rows)
+        db.commit()
+        return [contact_id for contact_id, in db.query(Contact.id).filter(Contact.id > first).order_by(Contact.id)]
+
+
+def install_stand_ins(session_factory):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    redis = InMemoryRedis()
+    auth_service.cache = redis
+    auth_service.user_cache.client = redis
+
+
+def percentile(latencies: list[float], q: int) -> float:
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0.0
+    return statistics.quantiles(latencies, n=100, method="inclusive")[q - 1]
+
+
+async def run_scenario(client: httpx.AsyncClient, make_request, requests: int, concurrency: int) -> dict:
+    """
+    The run_scenario function sends requests through concurrency workers and measures every request.
+
+    :param client: httpx.AsyncClient: The client bound to the application
+    :param make_request: An async callable taking the client and a request number
+    :param requests: int: How many requests to send
+    :param concurrency: int: How many requests are in flight at once
+    :return: Throughput, latency percentiles and the number of failed requests
+    :doc-author: Trelent
+    """
+    counter = itertools.count()
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            start = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+def scenarios(headers: dict, contact_ids: list[int], delete_ids: list[int]) -> dict:
+    ids = itertools.cycle(contact_ids)
+    deletes = iter(delete_ids)
+
+    return {
+        "login": lambda client, i: client.post("/api/auth/login", data={"username": EMAIL, "password": PASSWORD}),
+        "users_me": lambda client, i: client.get("/api/users/me", headers=headers),
+        "contacts_list": lambda client, i: client.get("/api/contacts/", params={"limit": 100}, headers=headers),
+        "contacts_detail": lambda client, i: client.get(f"/api/contacts/{next(ids)}", headers=headers),
+        "contacts_search": lambda client, i: client.get("/api/contacts/search_by_elem_body",
+                                                        params={"name": f"Name{i % len(contact_ids)}"},
+                                                        headers=headers),
+        "contacts_birthday": lambda client, i: client.get("/api/contacts/search_by_birthday", headers=headers),
+        "contacts_create": lambda client, i: client.post("/api/contacts/", json=contact_body(i), headers=headers),
+        "contacts_update": lambda client, i: client.put(f"/api/contacts/{next(ids)}", json=contact_body(i),
+                                                        headers=headers),
+        "contacts_delete": lambda client, i: client.delete(f"/api/contacts/{next(deletes)}", headers=headers),
+    }
+
+
+async def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        session_factory, user_id = setup_database(f"sqlite:///{directory}/bench.db", args.contacts)
+        install_stand_ins(session_factory)
+        await FastAPILimiter.init(InMemoryAsyncRedis())
+
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.post("/api/auth/login", data={"username": EMAIL, "password": PASSWORD})
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            with session_factory() as db:
+                contact_ids = [contact_id for contact_id, in db.query(Contact.id).order_by(Contact.id)]
+            delete_ids = add_contacts(session_factory, user_id, args.requests + args.warmup)
+
+            results = {}
+            for name, make_request in scenarios(headers, contact_ids, delete_ids).items():
+                if args.only and name not in args.only:
+                    continue
+                requests = args.login_requests if name == "login" else args.requests
+                await run_scenario(client, make_request, min(args.warmup, requests), args.concurrency)
+                results[name] = await run_scenario(client, make_request, requests, args.concurrency)
+                print(f"{name:18} {results[name]['throughput_rps']:9.1f} req/s  "
+                      f"p50 {results[name]['p50_ms']:7.2f} ms  p95 {results[name]['p95_ms']:7.2f} ms  "
+                      f"p99 {results[name]['p99_ms']:7.2f} ms  errors {results[name]['errors']}")
+        app.dependency_overrides.pop(get_db, None)
+    return results
+
+
+def compare(results: dict, baseline_path: str):
+    baseline = json.loads(Path(baseline_path).read_text())["results"]
+    print(f"\nCompared with {baseline_path}:")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]
+        print(f"{name:18} throughput {100 * (result['throughput_rps'] / before['throughput_rps'] - 1):+6.1f}%  "
+              f"p95 {100 * (result['p95_ms'] / before['p95_ms'] - 1):+6.1f}%  "
+              f"p99 {100 * (result['p99_ms'] / before['p99_ms'] - 1):+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=50, help="requests for the login scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each scenario")
+    parser.add_argument("--contacts", type=int, default=1000, help="contacts owned by the benchmark user")
+    parser.add_argument("--only", nargs="*", help="run only these scenarios")
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--compare", help="a previous JSON result to compare with")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    write_report("api", {"requests": args.requests, "concurrency": args.concurrency, "contacts": args.contacts},
+                 results, args.output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark of the duplicate contact detection on large address books.
+
+One user gets --contacts contacts, of which --duplicate-rate are altered copies of other contacts: a changed
+email spelling, another phone format, swapped or misspelled names. The contacts are written to a temporary
+SQLite database, then loading them and grouping them are timed separately, and the share of the copies
+found is reported:
+
+    python -m benchmarks.bench_dedupe --contacts 100000 200000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.reporting import write_report
+from benchmarks.seed import fake_contact, speed_up_sqlite
+from src.database.models import Base, Contact, User
+from src.repository.contacts import get_dedupe_candidates
+from src.schemas import Principal
+from src.services.dedupe import find_duplicates
+from src.services.phones import to_e164
+
+
+def alter(rng: random.Random, contact: dict) -> dict:
+    """
+    The alter function makes the kind of copy that repeated imports leave behind.
+
+    :param rng: random.Random: The seeded random generator
+    :param contact: dict: The original contact
+    :return: The copy
+    :doc-author: Trelent
+    """
+    copy = dict(contact)
+    change = rng.randrange(4)
+    if change == 0:
+        local, domain = copy["email"].split("@")
+        copy["email"] = f"{local.upper()}@{domain}"
+        copy["phone_number"] = f"+380{rng.randrange(10**8, 10**9)}"
+    elif change == 1:
+        copy["phone_number"] = "+38" + "".join(ch for ch in copy["phone_number"] if ch.isdigit())[-10:]
+        copy["email"] = f"other{rng.randrange(10**6)}@example.com"
+    elif change == 2:
+        first, last = copy["fullname"].split(" ", 1)
+        copy["fullname"] = f"{last} {first}"
+        copy["email"] = f"other{rng.randrange(10**6)}@example.com"
+        copy["phone_number"] = f"0{rng.randrange(10**8, 10**9)}"
+    else:
+        position = rng.randrange(1, len(copy["fullname"]))
+        copy["fullname"] = copy["fullname"][:position] + "x" + copy["fullname"][position + 1:]
+        copy["email"] = f"other{rng.randrange(10**6)}@example.com"
+        copy["phone_number"] = f"0{rng.randrange(10**8, 10**9)}"
+    copy["phone_e164"] = to_e164(copy["phone_number"])
+    return copy
+
+
+def run_size(url: str, contacts: int, duplicate_rate: float, repeat: int, random_seed: int) -> dict:
+    rng = random.Random(random_seed)
+    engine = create_engine(url)
+    speed_up_sqlite(engine)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        user_id = connection.execute(insert(User).returning(User.id),
+                                     [{"username": "bench", "email": "bench@example.com", "password": "x"}]).scalar()
+    now = datetime.now().replace(microsecond=0)
+    originals = int(contacts * (1 - duplicate_rate))
+    rows = [fake_contact(rng, user_id, now) for _ in range(originals)]
+    copies = {}
+    for _ in range(contacts - originals):
+        source = rng.randrange(originals)
+        copies[len(rows)] = source
+        rows.append(alter(rng, rows[source]))
+    with engine.begin() as connection:
+        for start in range(0, len(rows), 10_000):
+            connection.execute(insert(Contact), rows[start:start + 10_000])
+
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+    user = Principal(id=user_id, email="bench@example.com")
+    load_times, find_times = [], []
+    for _ in range(repeat):
+        with session_factory() as db:
+            start = time.perf_counter()
+            candidates = asyncio.run(get_dedupe_candidates(db, user))
+            load_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        groups = find_duplicates(candidates)
+        find_times.append(time.perf_counter() - start)
+    engine.dispose()
+
+    # Row n was inserted as the n-th contact, its id is n + 1
+    group_of = {contact_id: index for index, group in enumerate(groups) for contact_id in group.contact_ids}
+    found = sum(1 for copy, source in copies.items()
+                if copy + 1 in group_of and group_of.get(copy + 1) == group_of.get(source + 1))
+    return {
+        "contacts": contacts,
+        "copies": len(copies),
+        "copies_found": found,
+        "recall": found / len(copies) if copies else 1.0,
+        "groups": len(groups),
+        "contacts_in_groups": sum(len(group.contact_ids) for group in groups),
+        "load_median_ms": statistics.median(load_times) * 1000,
+        "find_median_ms": statistics.median(find_times) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for contacts in args.contacts:
+            result = run_size(f"sqlite:///{directory}/dedupe-{contacts}.db", contacts, args.duplicate_rate,
+                              args.repeat, args.seed)
+            print(f"{contacts} contacts: load {result['load_median_ms']:.0f} ms, "
+                  f"find {result['find_median_ms']:.0f} ms, {result['groups']} groups, "
+                  f"{result['copies_found']}/{result['copies']} copies found")
+            results.append(result)
+    write_report("dedupe", {"duplicate_rate": args.duplicate_rate, "repeat": args.repeat, "seed": args.seed},
+                 results, args.output)
+
+
+if __name__ == "__main__":
+    main()
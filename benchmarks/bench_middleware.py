@@ -0,0 +1,57 @@
+"""
+Benchmark of the overhead the ASGI middlewares add to a request.
+
+Each middleware wraps an app that answers with a small body, and the time per request is compared with
+the bare app, without any HTTP server in between:
+
+    python -m benchmarks.bench_middleware --requests 20000
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.reporting import write_report
+from src.services.metrics import MetricsMiddleware
+from src.services.query_stats import QueryStatsMiddleware
+
+MIDDLEWARES = {"metrics": MetricsMiddleware, "query_stats": QueryStatsMiddleware}
+
+
+async def plain_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def receive():
+    return {"type": "http.request"}
+
+
+async def send(message):
+    pass
+
+
+async def time_requests(app, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app({"type": "http", "method": "GET", "path": "/", "headers": []}, receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    base = asyncio.run(time_requests(plain_app, args.requests))
+    results = []
+    for name, middleware in MIDDLEWARES.items():
+        per_request = asyncio.run(time_requests(middleware(plain_app), args.requests))
+        overhead_us = (per_request - base) * 1e6
+        print(f"{name:12}: {overhead_us:6.1f} us per request")
+        results.append({"middleware": name, "overhead_us": overhead_us})
+    write_report("middleware", {"requests": args.requests, "base_us": base * 1e6}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
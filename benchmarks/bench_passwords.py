@@ -0,0 +1,63 @@
+"""
+Benchmark of password hashing throughput per bcrypt cost factor.
+
+For every cost, --hashes hashes are timed in one process, and then in one process per core at the same
+time, which is what a worker per core serving logins does. The per core rate is the number of logins a
+core can verify per second; it halves with every extra round:
+
+    python -m benchmarks.bench_passwords --rounds 10 11 12 13
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.reporting import write_report
+from src.services.passwords import password_context
+
+
+def hash_many(rounds: int, hashes: int) -> float:
+    context = password_context(rounds)
+    start = time.perf_counter()
+    for _ in range(hashes):
+        context.hash("benchmark password")
+    return time.perf_counter() - start
+
+
+def run_rounds(rounds: int, hashes: int, processes: int) -> dict:
+    single = hash_many(rounds, hashes)
+    with ProcessPoolExecutor(processes) as pool:
+        # Warm the processes up first, so that the imports are not timed
+        list(pool.map(hash_many, [rounds] * processes, [1] * processes))
+        start = time.perf_counter()
+        list(pool.map(hash_many, [rounds] * processes, [hashes] * processes))
+        parallel = time.perf_counter() - start
+    return {
+        "rounds": rounds,
+        "ms_per_hash": single / hashes * 1000,
+        "hashes_per_second_one_core": hashes / single,
+        "hashes_per_second_all_cores": processes * hashes / parallel,
+        "hashes_per_second_per_core": hashes / parallel,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--hashes", type=int, default=10)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    results = []
+    for rounds in args.rounds:
+        result = run_rounds(rounds, args.hashes, args.processes)
+        print(f"rounds {rounds:2}: {result['ms_per_hash']:7.1f} ms per hash, "
+              f"{result['hashes_per_second_one_core']:6.1f}/s on one core, "
+              f"{result['hashes_per_second_per_core']:6.1f}/s per core with {args.processes} processes")
+        results.append(result)
+    write_report("passwords", {"hashes": args.hashes, "processes": args.processes}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
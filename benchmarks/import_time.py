@@ -0,0 +1,64 @@
+"""
+Per-module import time of the application, measured with python -X importtime in a fresh interpreter.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --module src.services.email --top 15 --budget-ms 800
+
+Each run is repeated and the fastest one is reported, so that disk caches do not skew the numbers.
+With --budget-ms the command fails when importing the module takes longer than the budget.
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+from benchmarks.reporting import write_report
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def measure(module: str) -> dict[str, dict]:
+    """
+    The measure function imports a module in a new interpreter and parses the -X importtime report.
+
+    :param module: str: The module to import
+    :return: Self and cumulative time in milliseconds for every imported module
+    :doc-author: Trelent
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            own, cumulative, _, name = match.groups()
+            times[name] = {"self_ms": int(own) / 1000, "cumulative_ms": int(cumulative) / 1000}
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget-ms", type=float, help="fail when the import takes longer")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: times[args.module]["cumulative_ms"])
+    total = best[args.module]["cumulative_ms"]
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, times in sorted(best.items(), key=lambda item: -item[1]["cumulative_ms"])[:args.top]:
+        print(f"{times['cumulative_ms']:14.1f} {times['self_ms']:9.1f}  {name}")
+    if args.output:
+        write_report("import-time", {"module": args.module, "repeat": args.repeat}, best, args.output)
+
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"import {args.module} took {total:.1f} ms, the budget is {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
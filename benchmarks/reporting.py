@@ -0,0 +1,39 @@
+import json
+import platform
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(name: str, meta: dict, results, output: str | None = None) -> Path:
+    """
+    The write_report function stores benchmark results as JSON, by default in benchmarks/results.
+
+    :param name: str: The benchmark name, used as the file name prefix
+    :param meta: dict: The benchmark parameters
+    :param results: The measurements
+    :param output: str | None: An explicit file to write instead
+    :return: The path of the written file
+    :doc-author: Trelent
+    """
+    now = datetime.now()
+    report = {
+        "meta": {"timestamp": now.isoformat(timespec="seconds"), "revision": git_revision(),
+                 "python": platform.python_version(), "machine": platform.machine(), **meta},
+        "results": results,
+    }
+    path = Path(output) if output else RESULTS_DIR / f"{name}-{now:%Y%m%dT%H%M%S}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {path}")
+    return path
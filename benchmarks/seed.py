@@ -0,0 +1,165 @@
+"""
+Synthetic dataset generator for users and contacts.
+
+Contacts are spread over users with a heavy skew: a few users own up to --heavy-contacts contacts each,
+the rest follow a Pareto distribution, like real address books. The same --seed always produces the
+same rows, so runs on different machines or revisions are comparable:
+
+    python -m benchmarks.seed --url sqlite:///seed.db --users 2000 --contacts 1000000
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.engine import Engine
+
+from src.database.models import Base, Contact, User
+from src.services.auth import auth_service
+from src.services.phones import to_e164
+
+FIRST_NAMES = ["Olena", "Andrii", "Iryna", "Dmytro", "Maria", "Oleksandr", "Kateryna", "Serhii", "Natalia", "Yurii",
+               "Anna", "Taras", "Sofiia", "Mykola", "Viktoriia", "Bohdan", "Julia", "Roman", "Oksana", "Pavlo",
+               "James", "Emma", "Liam", "Olivia", "Noah", "Ava", "Lucas", "Mia", "Ethan", "Zoe"]
+LAST_NAMES = ["Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Oliinyk", "Shevchuk", "Koval",
+              "Polishchuk", "Bondar", "Melnyk", "Marchenko", "Lysenko", "Rudenko", "Savchenko", "Petrenko",
+              "Smith", "Johnson", "Brown", "Taylor", "Wilson", "Davies", "Evans", "Thomas", "Roberts", "Walker"]
+DOMAINS = ["gmail.com", "gmail.com", "gmail.com", "ukr.net", "ukr.net", "i.ua", "outlook.com", "yahoo.com",
+           "meta.ua", "icloud.com", "proton.me", "example.com"]
+# Spellings of one number, operator code and subscriber number, that all fit the 13 characters of phone_number
+PHONE_FORMATS = ["+380{}{}", "0{}{}", "380{}{}", "0{} {}", "(0{}){}"]
+BATCH_SIZE = 10_000
+
+
+def contacts_per_user(rng: random.Random, users: int, contacts: int, heavy_users: int,
+                      heavy_contacts: int) -> list[int]:
+    """
+    The contacts_per_user function splits the contacts over the users.
+
+    :param rng: random.Random: The seeded random generator
+    :param users: int: The number of users
+    :param contacts: int: The total number of contacts
+    :param heavy_users: int: How many users get heavy_contacts contacts each
+    :param heavy_contacts: int: The size of a heavy user's address book
+    :return: The number of contacts of every user
+    :doc-author: Trelent
+    """
+    heavy_users = min(heavy_users, users)
+    counts = [0] * users
+    remaining = contacts
+    for i in range(heavy_users):
+        counts[i] = min(heavy_contacts, remaining)
+        remaining -= counts[i]
+    light = users - heavy_users
+    if remaining and light:
+        weights = [rng.paretovariate(1.2) for _ in range(light)]
+        total = sum(weights)
+        shares = [int(remaining * weight / total) for weight in weights]
+        # Rounding down loses fewer contacts than there are light users
+        for i in rng.sample(range(light), remaining - sum(shares)):
+            shares[i] += 1
+        counts[heavy_users:] = shares
+    elif remaining:
+        counts[0] += remaining
+    return counts
+
+
+def fake_contact(rng: random.Random, user_id: int, now: datetime) -> dict:
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    number = f"{rng.randrange(10**8, 10**9)}"
+    phone_number = rng.choice(PHONE_FORMATS).format(number[:2], number[2:])
+    return {
+        "name": first,
+        "fullname": f"{first} {last}",
+        "email": f"{first}.{last}{rng.randrange(1000)}@{rng.choice(DOMAINS)}".lower(),
+        "phone_number": phone_number,
+        "phone_e164": to_e164(phone_number),
+        "birthday": date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 60)),
+        "description": rng.choice(["", "work", "family", "friend", "met at the conference", "neighbour"]),
+        "created_at": now - timedelta(seconds=rng.randrange(2 * 365 * 24 * 3600)),
+        "updated_at": now,
+        "user_id": user_id,
+    }
+
+
+def speed_up_sqlite(engine: Engine):
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.close()
+
+
+def seed(engine: Engine, users: int = 100, contacts: int = 10_000, heavy_users: int = 3,
+         heavy_contacts: int = 100_000, random_seed: int = 42, drop: bool = True) -> list[tuple[int, int]]:
+    """
+    The seed function fills the database with users and contacts.
+
+    :param engine: Engine: The database to fill
+    :param users: int: The number of users
+    :param contacts: int: The total number of contacts
+    :param heavy_users: int: How many users get heavy_contacts contacts each
+    :param heavy_contacts: int: The size of a heavy user's address book
+    :param random_seed: int: The seed of the random generator
+    :param drop: bool: Drop and recreate the tables first
+    :return: A list of (user id, number of contacts), the largest address books first
+    :doc-author: Trelent
+    """
+    rng = random.Random(random_seed)
+    if drop:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    password = auth_service.get_password_hash("12345678")
+    now = datetime.now().replace(microsecond=0)
+    counts = contacts_per_user(rng, users, contacts, heavy_users, heavy_contacts)
+
+    with engine.begin() as connection:
+        first_id = connection.execute(text("SELECT COALESCE(MAX(id), 0) FROM users")).scalar() + 1
+        user_rows = [{"id": first_id + i, "username": f"user{first_id + i}", "email": f"user{first_id + i}@example.com",
+                      "password": password, "avatar": None, "confirmed": True, "created_at": now, "updated_at": now}
+                     for i in range(users)]
+        for start in range(0, len(user_rows), BATCH_SIZE):
+            connection.execute(insert(User), user_rows[start:start + BATCH_SIZE])
+
+    batch = []
+    for i, count in enumerate(counts):
+        for _ in range(count):
+            batch.append(fake_contact(rng, first_id + i, now))
+            if len(batch) == BATCH_SIZE:
+                with engine.begin() as connection:
+                    connection.execute(insert(Contact), batch)
+                batch = []
+    if batch:
+        with engine.begin() as connection:
+            connection.execute(insert(Contact), batch)
+
+    return sorted(((first_id + i, count) for i, count in enumerate(counts)), key=lambda item: -item[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite:///seed.db", help="SQLAlchemy URL of the database to fill")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--contacts", type=int, default=100_000)
+    parser.add_argument("--heavy-users", type=int, default=3)
+    parser.add_argument("--heavy-contacts", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--append", action="store_true", help="keep existing rows")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    speed_up_sqlite(engine)
+    start = time.perf_counter()
+    counts = seed(engine, args.users, args.contacts, args.heavy_users, args.heavy_contacts, args.seed,
+                  drop=not args.append)
+    print(f"Seeded {args.users} users and {args.contacts} contacts in {time.perf_counter() - start:.1f} s")
+    print("Largest address books:", ", ".join(f"user {user_id}: {count}" for user_id, count in counts[:5]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import time
+
+
+class InMemoryRedis:
+    """
+    Synchronous in-memory stand-in for the redis client, covering the commands the application uses.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def get(self, key):
+        return self.data.get(key) if self._alive(key) else None
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and self._alive(key):
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        self.expires.pop(key, None)
+        if ex is not None or px is not None:
+            self.expire(key, ex if ex is not None else px / 1000)
+        return True
+
+    def expire(self, key, seconds):
+        if key in self.data:
+            self.expires[key] = time.monotonic() + seconds
+            return True
+        return False
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                removed += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return removed
+
+    def ping(self):
+        return True
+
+    def register_script(self, script):
+        # The only script run through it is the lock release of the cache, a compare and delete
+        def release(keys, args):
+            if self.get(keys[0]) != args[0].encode():
+                return 0
+            return self.delete(keys[0])
+
+        return release
+
+
+class InMemoryAsyncRedis:
+    """
+    Asynchronous stand-in for the redis client used by FastAPILimiter. The rate limit script always
+    reports that the request is allowed, so the benchmarks measure the handlers and not the limiter.
+    """
+
+    async def script_load(self, script):
+        return "stand-in"
+
+    async def evalsha(self, sha, numkeys, *args):
+        return 0
+
+    async def ping(self):
+        return True
+
+    async def close(self):
+        pass
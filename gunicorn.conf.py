@@ -0,0 +1,50 @@
+"""
+Gunicorn settings for serving the API in production:
+
+    gunicorn -c gunicorn.conf.py
+
+The application is imported once in the master and the workers are forked from it, so they share its
+memory pages and start quickly. Uvicorn workers use uvloop and httptools when they are installed.
+Each worker is replaced after about SERVER_MAX_REQUESTS requests to cap slow memory growth.
+
+kill -HUP <master pid> starts new workers and stops the old ones after their in-flight requests have
+finished, within SERVER_GRACEFUL_TIMEOUT seconds. Because the application is preloaded, new code needs
+a restart of the master instead (or kill -USR2 followed by -WINCH and -QUIT of the old master).
+"""
+import multiprocessing
+
+from src.conf.config import config as app_config  # "config" is a gunicorn setting
+
+wsgi_app = "main:app"
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = app_config.SERVER_BIND
+workers = app_config.SERVER_WORKERS or multiprocessing.cpu_count()
+preload_app = True
+max_requests = app_config.SERVER_MAX_REQUESTS
+max_requests_jitter = app_config.SERVER_MAX_REQUESTS_JITTER
+graceful_timeout = app_config.SERVER_GRACEFUL_TIMEOUT
+keepalive = app_config.SERVER_KEEPALIVE
+
+
+def post_fork(server, worker):
+    """
+    The post_fork function drops the connections a worker inherited from the master.
+        Database sockets and Redis clients must not be shared between processes, so every worker
+        opens its own on first use. close=False leaves the master's connections open for the master.
+
+    :param server: The gunicorn arbiter
+    :param worker: The new worker
+    :return: None
+    :doc-author: Trelent
+    """
+    from src.database.db import engine
+    from src.database.replicas import replica_router
+    from src.services.auth import auth_service
+    from src.services.stats import stats_cache
+
+    engine.dispose(close=False)
+    for replica in replica_router.replicas:
+        replica.engine.dispose(close=False)
+    auth_service.cache = None
+    auth_service.user_cache.client = None
+    stats_cache.client = None
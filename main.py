@@ -1,22 +1,51 @@
+import logging
 from contextlib import asynccontextmanager
 
-import redis.asyncio as redis
 from pathlib import Path
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request
 
-from sqlalchemy import text
-from fastapi.responses import JSONResponse, HTMLResponse
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi_limiter import FastAPILimiter
 
-from src.database.db import get_db
-from src.routes import contacts, auth, users
+from src.routes import contacts, auth, users, health
 from src.conf.config import config
+from src.database.replicas import replica_router
+from src.services.assets import PrecompressedStaticFiles, RenderedPage, static_url
+from src.services.compression import CompressionMiddleware
+from src.services.metrics import MetricsMiddleware, registry
+from src.services.query_stats import QueryStatsMiddleware
+from src.services.profiling import ProfilingMiddleware
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    The lifespan function creates the per-process clients when a worker starts and closes them on shutdown.
+    Nothing connects at import time, so tools and tests can import the app without Redis.
+
+    :param app: FastAPI: The application
+    :return: None
+    :doc-author: Trelent
+    """
+    import redis.asyncio as redis
+
+    r = redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
+    await FastAPILimiter.init(r)
+    health.monitor.start()
+    replica_router.start()
+    auth.open_events.start()
+    yield
+    await auth.open_events.stop()
+    await replica_router.stop()
+    await health.monitor.stop()
+    await FastAPILimiter.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ['*']
 
@@ -26,38 +55,76 @@ app.add_middleware(CORSMiddleware,
                    allow_methods=['*'],
                    allow_headers=['*'],)
 
+if config.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware,
+                       minimum_size=config.COMPRESSION_MIN_SIZE,
+                       gzip_level=config.COMPRESSION_GZIP_LEVEL,
+                       brotli_quality=config.COMPRESSION_BROTLI_QUALITY,
+                       thread_size=config.COMPRESSION_THREAD_SIZE)
+if config.QUERY_STATS_ENABLED:
+    app.add_middleware(QueryStatsMiddleware)
+if config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if config.PROFILING_ENABLED:
+    # Off by default, the middleware is not installed at all then
+    app.add_middleware(ProfilingMiddleware,
+                       directory=config.PROFILING_DIR,
+                       token=config.PROFILING_TOKEN,
+                       sample_rate=config.PROFILING_SAMPLE_RATE,
+                       interval=config.PROFILING_INTERVAL_MS / 1000,
+                       max_files=config.PROFILING_MAX_FILES)
 
 BASE_DIR = Path(__file__).parent
-app.mount("/static", StaticFiles(directory=BASE_DIR/"src"/"static"), name="static")
+app.mount("/static", PrecompressedStaticFiles(directory=BASE_DIR/"src"/"static"), name="static")
 
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
 app.include_router(contacts.router, prefix='/api')
-# uvicorn main:app --reload
+app.include_router(health.router, prefix='/api')
+# uvicorn main:app --reload for development, gunicorn -c gunicorn.conf.py in production
 
 
-@asynccontextmanager
-async def lifespan():
-    r = await redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
-    await FastAPILimiter.init(r)
-
 templates = Jinja2Templates(directory=str(BASE_DIR/"src"/"templates"))
+templates.env.globals["static_url"] = static_url
+index_page = RenderedPage(templates, "index.html")
 
 
 @app.get('/', response_class=HTMLResponse)
-def index(request: Request):
-    return templates.TemplateResponse("index.html", context={"request": request})
+async def index(request: Request):
+    """
+    The index function serves the landing page. It is rendered once and again only when the template changes.
+
+    :param request: Request: The request, used to negotiate the encoding and to answer revalidations
+    :return: The page
+    :doc-author: Trelent
+    """
+    return index_page.response(request)
 
 
 @app.get("/api/healthchecker")
-async def healthchecker(db: AsyncSession = Depends(get_db)):
-    try:
-        # Make request
-        result = await db.execute(text("SELECT 1"))
-        result = result.fetchone()
-        if result is None:
-            raise HTTPException(status_code=500, detail="Database is not configured correctly")
-        return {"message": "Welcome to FastAPI!"}
-    except Exception as e:
-        print(e)
+async def healthchecker():
+    """
+    The healthchecker function reports whether the database is reachable.
+    It answers from the report of the health monitor and does not open a connection itself.
+
+    :return: A welcome message when the database is reachable
+    :doc-author: Trelent
+    """
+    report = await health.monitor.get_report()
+    if not report["database"]["ok"]:
+        logger.warning("Database health check failed: %s", report["database"]["error"])
         raise HTTPException(status_code=500, detail="Error connecting to the database")
+    return {"message": "Welcome to FastAPI!"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """
+    The metrics function exposes request, database and cache metrics in the Prometheus text format.
+
+    :return: The metrics of this worker
+    :doc-author: Trelent
+    """
+    if not config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,19 +1,54 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
 
 from src.conf.config import config
+from src.services.metrics import instrument_engine
 
 
-engine = create_engine(config.DB_URL)
+def engine_options(url: str) -> dict:
+    """
+    The engine_options function builds the create_engine arguments from the pool settings.
+    With DB_NULL_POOL every checkout opens a new connection, which lets an external pooler such as
+    PgBouncer own the pooling. DB_PGBOUNCER turns off the server-side prepared statements of the drivers
+    that use them, because in transaction pooling mode consecutive transactions may run on different
+    server connections that do not know the statement.
+
+    :param url: str: The database URL
+    :return: The keyword arguments for create_engine
+    :doc-author: Trelent
+    """
+    url = make_url(url)
+    options = {"pool_pre_ping": config.DB_POOL_PRE_PING}
+    if config.DB_NULL_POOL:
+        options["poolclass"] = NullPool
+    elif url.get_backend_name() != "sqlite":
+        options.update(pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW,
+                       pool_timeout=config.DB_POOL_TIMEOUT, pool_recycle=config.DB_POOL_RECYCLE)
+    if config.DB_PGBOUNCER:
+        driver = url.get_driver_name()
+        if driver == "asyncpg":
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        elif driver == "psycopg":
+            options["connect_args"] = {"prepare_threshold": None}
+    return options
+
+
+engine = instrument_engine(create_engine(config.DB_URL, **engine_options(config.DB_URL)))
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay loaded after a commit, so a read can end its transaction before the response is built
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 
 # Dependency
-def get_db():
+async def get_db():
     """
     The get_db function is a context manager that returns the database session.
     It also ensures that the connection to the database is closed after each request.
+        Creating a session does not touch the pool, a connection is only checked out by the first statement,
+        so requests that never query, like cache hits, never hold one. The dependency is async so that
+        FastAPI does not run it in the threadpool.
 
     :return: A database session
     :doc-author: Trelent
@@ -23,3 +58,23 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def release_connection(db: Session):
+    """
+    The release_connection function ends the read transaction of a session, so that its connection goes back
+        to the pool right after the last statement instead of when the request ends. The session stays usable,
+        the next statement checks out a connection again. A session with changes that were not committed yet
+        is left alone, they belong to a write that commits them itself. The loaded objects are not expired
+        whatever the session factory says, otherwise reading them afterwards would query every row again.
+
+    :param db: Session: The session
+    :return: None
+    :doc-author: Trelent
+    """
+    if db.in_transaction() and not (db.new or db.dirty or db.deleted):
+        expire_on_commit, db.expire_on_commit = db.expire_on_commit, False
+        try:
+            db.commit()
+        finally:
+            db.expire_on_commit = expire_on_commit
@@ -0,0 +1,23 @@
+from sqlalchemy import String
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class email_domain(FunctionElement):
+    """
+    The lowercased part of an email address after the @, computed by the database so it can be grouped by.
+    """
+    type = String()
+    name = "email_domain"
+    inherit_cache = True
+
+
+@compiles(email_domain)
+def _email_domain(element, compiler, **kw):
+    email = compiler.process(list(element.clauses)[0], **kw)
+    return f"lower(substr({email}, instr({email}, '@') + 1))"
+
+
+@compiles(email_domain, "postgresql")
+def _email_domain_postgresql(element, compiler, **kw):
+    return f"lower(split_part({compiler.process(list(element.clauses)[0], **kw)}, '@', 2))"
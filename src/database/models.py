@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, func
+from sqlalchemy import Column, Integer, String, Boolean, Index, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy.sql.sqltypes import DateTime, Date
@@ -16,6 +16,7 @@ class Contact(Base):
     fullname = Column(String(30), nullable=False)
     email = Column(String(40), nullable=False)
     phone_number = Column(String(13), nullable=False)
+    phone_e164 = Column(String(16), nullable=True)
     birthday = Column(Date, nullable=False)
     description = Column(String(150))
     created_at = Column('created_at', DateTime, default=func.now())
@@ -23,6 +24,11 @@ class Contact(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
     user = relationship("User", backref='todos', lazy='joined')
 
+    __table_args__ = (Index("ix_contacts_user_id_phone_e164", "user_id", "phone_e164"),)
+    # The ORM identifies contacts by user_id too, so its updates and deletes name the partition key and read a
+    # single partition when the table is partitioned by user (see src/database/partitioning.py)
+    __mapper_args__ = {"primary_key": [id, user_id]}
+
 
 class User(Base):
     __tablename__ = "users"
@@ -35,3 +41,26 @@ class User(Base):
     created_at = Column('created_at', DateTime, default=func.now())
     updated_at = Column('updated_at', DateTime, default=func.now(), onupdate=func.now())
     confirmed = Column(Boolean, default=False, nullable=True)
+
+
+# Rebuilt every day by the birthday job, without foreign keys so that the rebuild stays a plain bulk insert
+class UpcomingBirthday(Base):
+    __tablename__ = "upcoming_birthdays"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    contact_id = Column(Integer, nullable=False, index=True)
+    birthday_on = Column(Date, nullable=False)
+    computed_on = Column(Date, nullable=False)
+
+    __table_args__ = (Index("ix_upcoming_birthdays_user_id_birthday_on", "user_id", "birthday_on"),)
+
+
+# Written in batches by the open event recorder, keyed by username as the tracking pixel URL carries it
+class EmailOpenEvent(Base):
+    __tablename__ = "email_open_events"
+    id = Column(Integer, primary_key=True)
+    username = Column(String(50), nullable=False)
+    opened_at = Column(DateTime, nullable=False)
+    user_agent = Column(String(255), nullable=True)
+
+    __table_args__ = (Index("ix_email_open_events_username_opened_at", "username", "opened_at"),)
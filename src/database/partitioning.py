@@ -0,0 +1,161 @@
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+NEW_TABLE = "contacts_partitioned"
+DELETED_TABLE = "contacts_partition_deleted"
+MIRROR_FUNCTION = "contacts_partition_mirror"
+# Index names share one namespace with tables, so the new ones get a temporary name until the swap
+INDEXES = {"contacts_partitioned_pkey": "contacts_pkey",
+           "ix_contacts_partitioned_user_id_phone_e164": "ix_contacts_user_id_phone_e164"}
+
+
+def is_partitioned(connection: Connection) -> bool:
+    """
+    The is_partitioned function tells whether the contacts table is a partitioned Postgres table.
+
+    :param connection: Connection: The database connection
+    :return: True if contacts is partitioned
+    :doc-author: Trelent
+    """
+    if connection.dialect.name != "postgresql":
+        return False
+    return connection.execute(text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                                   "WHERE partrelid = 'contacts'::regclass)")).scalar()
+
+
+def _columns(connection: Connection) -> list[str]:
+    return connection.execute(text("SELECT column_name FROM information_schema.columns "
+                                   "WHERE table_schema = current_schema() AND table_name = 'contacts' "
+                                   "ORDER BY ordinal_position")).scalars().all()
+
+
+def _create_mirror(connection: Connection, columns: list[str]):
+    # Rows written while the copy runs are mirrored into the new table. Deletes are also remembered, because
+    # a copy batch that read the row before the delete committed would otherwise bring it back.
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns if column not in ("id", "user_id"))
+    connection.execute(text(f"CREATE TABLE {DELETED_TABLE} (id integer PRIMARY KEY)"))
+    connection.execute(text(f"""
+        CREATE FUNCTION {MIRROR_FUNCTION}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' AND (TG_OP = 'DELETE' OR OLD.user_id IS DISTINCT FROM NEW.user_id) THEN
+                DELETE FROM {NEW_TABLE} WHERE user_id = OLD.user_id AND id = OLD.id;
+            END IF;
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO {DELETED_TABLE} (id) VALUES (OLD.id) ON CONFLICT DO NOTHING;
+                RETURN NULL;
+            END IF;
+            INSERT INTO {NEW_TABLE} SELECT NEW.* ON CONFLICT (user_id, id) DO UPDATE SET {updates};
+            RETURN NULL;
+        END $$"""))
+    connection.execute(text(f"CREATE TRIGGER {MIRROR_FUNCTION} AFTER INSERT OR UPDATE OR DELETE ON contacts "
+                            f"FOR EACH ROW EXECUTE FUNCTION {MIRROR_FUNCTION}()"))
+
+
+def _copy(connection: Connection, batch_size: int) -> int:
+    copied, last_id = 0, 0
+    while True:
+        upper = connection.execute(text("SELECT max(id) FROM (SELECT id FROM contacts WHERE id > :last "
+                                        "ORDER BY id LIMIT :size) AS batch"),
+                                   {"last": last_id, "size": batch_size}).scalar()
+        if upper is None:
+            return copied
+        copied += connection.execute(text(f"INSERT INTO {NEW_TABLE} SELECT * FROM contacts "
+                                          "WHERE id > :last AND id <= :upper ON CONFLICT DO NOTHING"),
+                                     {"last": last_id, "upper": upper}).rowcount
+        last_id = upper
+
+
+def partition_contacts(connection: Connection, partitions: int, batch_size: int = 10_000,
+                       lock_timeout: str = "5s") -> bool:
+    """
+    The partition_contacts function turns contacts into a table hash partitioned on user_id, while it stays
+        readable and writable. Every query of the application is scoped to one user, so each one reads a
+        single partition, and vacuum and index maintenance work on partitions of 1/partitions of the rows.
+
+        The new table is filled in batches of batch_size rows, each committed on its own, while a trigger
+        mirrors concurrent writes into it. The tables are then swapped in one short transaction that holds
+        an exclusive lock on contacts; it gives up after lock_timeout instead of queueing all writes behind
+        a long transaction, and can be run again.
+
+        The connection must be in autocommit mode, like in an Alembic autocommit_block. On other databases
+        than Postgres nothing is done.
+
+    :param connection: Connection: A connection in autocommit mode
+    :param partitions: int: The number of hash partitions
+    :param batch_size: int: How many rows each copy statement moves
+    :param lock_timeout: str: How long the swap waits for its lock
+    :return: True if the table was partitioned
+    :doc-author: Trelent
+    """
+    if connection.dialect.name != "postgresql" or partitions < 2 or is_partitioned(connection):
+        return False
+    # The partition key must be part of the primary key, so it cannot be NULL
+    orphans = connection.execute(text("SELECT count(*) FROM contacts WHERE user_id IS NULL")).scalar()
+    if orphans:
+        raise RuntimeError(f"{orphans} contacts have no user_id, assign or delete them before partitioning")
+
+    columns = _columns(connection)
+    connection.execute(text(f"DROP TABLE IF EXISTS {NEW_TABLE}, {DELETED_TABLE}"))
+    connection.execute(text(f"DROP FUNCTION IF EXISTS {MIRROR_FUNCTION}() CASCADE"))
+    connection.execute(text(f"CREATE TABLE {NEW_TABLE} (LIKE contacts INCLUDING DEFAULTS, "
+                            "CONSTRAINT contacts_partitioned_pkey PRIMARY KEY (user_id, id), "
+                            "CONSTRAINT contacts_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)) "
+                            "PARTITION BY HASH (user_id)"))
+    for remainder in range(partitions):
+        connection.execute(text(f"CREATE TABLE contacts_p{remainder} PARTITION OF {NEW_TABLE} "
+                                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"))
+    connection.execute(text(f"CREATE INDEX ix_contacts_partitioned_user_id_phone_e164 "
+                            f"ON {NEW_TABLE} (user_id, phone_e164)"))
+    _create_mirror(connection, columns)
+
+    copied = _copy(connection, batch_size)
+    logger.info("Copied %d contacts into %d partitions", copied, partitions)
+
+    renames = "\n".join(f"ALTER INDEX {old} RENAME TO {new};" for old, new in INDEXES.items())
+    connection.execute(text(f"""
+        DO $$
+        BEGIN
+            PERFORM set_config('lock_timeout', '{lock_timeout}', true);
+            LOCK TABLE contacts IN ACCESS EXCLUSIVE MODE;
+            DELETE FROM {NEW_TABLE} AS moved USING {DELETED_TABLE} AS deleted WHERE moved.id = deleted.id;
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY {NEW_TABLE}.id', pg_get_serial_sequence('contacts', 'id'));
+            DROP TABLE contacts, {DELETED_TABLE};
+            DROP FUNCTION {MIRROR_FUNCTION}();
+            ALTER TABLE {NEW_TABLE} RENAME TO contacts;
+            {renames}
+        END $$"""))
+    connection.execute(text("ANALYZE contacts"))
+    return True
+
+
+def unpartition_contacts(connection: Connection) -> bool:
+    """
+    The unpartition_contacts function turns a partitioned contacts table back into a plain one.
+        Unlike partition_contacts it copies the rows in a single transaction, during which contacts is locked.
+
+    :param connection: Connection: The database connection
+    :return: True if the table was converted
+    :doc-author: Trelent
+    """
+    if not is_partitioned(connection):
+        return False
+    connection.execute(text("""
+        DO $$
+        BEGIN
+            LOCK TABLE contacts IN ACCESS EXCLUSIVE MODE;
+            CREATE TABLE contacts_plain (LIKE contacts INCLUDING DEFAULTS,
+                                         CONSTRAINT contacts_plain_pkey PRIMARY KEY (id),
+                                         CONSTRAINT contacts_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id));
+            INSERT INTO contacts_plain SELECT * FROM contacts;
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY contacts_plain.id', pg_get_serial_sequence('contacts', 'id'));
+            DROP TABLE contacts;
+            ALTER TABLE contacts_plain RENAME TO contacts;
+            ALTER INDEX contacts_plain_pkey RENAME TO contacts_pkey;
+            ALTER TABLE contacts ALTER COLUMN user_id DROP NOT NULL;
+            CREATE INDEX ix_contacts_user_id_phone_e164 ON contacts (user_id, phone_e164);
+        END $$"""))
+    return True
@@ -0,0 +1,270 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from fastapi import Depends
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.conf.config import config
+from src.database.db import engine_options, get_db
+from src.schemas import Principal
+from src.services.auth import auth_service
+from src.services.metrics import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+# The replay timestamp stops moving while the primary is idle, so a replica that replayed everything it received
+# is reported as not lagging
+POSTGRES_LAG = text("SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END")
+
+
+class Replica:
+    """
+    A read replica with its own engine and the result of its last health check.
+    """
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = instrument_engine(create_engine(url, **engine_options(url)), name=name)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine)
+        self.available = True
+        self.lag = 0.0
+        self.checked_at = float("-inf")
+
+
+class ReplicaRouter:
+    """
+    Spreads reads over the read replicas in turn. A user who has just written is sent to the primary
+    for sticky_seconds, so that they read their own writes, and replicas that are down or more than
+    max_lag seconds behind are skipped until a later check finds them healthy again. The checks run in
+    the background every check_interval seconds, a request only reads their last result.
+    """
+
+    def __init__(self, urls: list[str], sticky_seconds: float = 5.0, max_lag: float = 2.0,
+                 check_interval: float = 1.0, client_factory=None):
+        self.replicas = [Replica(f"replica{i}", url) for i, url in enumerate(urls)]
+        self.sticky_seconds = sticky_seconds
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.client_factory = client_factory
+        self._next = itertools.count()
+        self._written = {}
+        self._task = None
+
+    @staticmethod
+    def _sticky_key(user_id: int) -> str:
+        return f"replica:sticky:{user_id}"
+
+    def mark_write(self, user_id: int):
+        """
+        The mark_write function pins the reads of a user to the primary for sticky_seconds.
+            The mark is kept in this process and in Redis, so that the other workers see it too.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user who wrote
+        :return: None
+        :doc-author: Trelent
+        """
+        now = time.monotonic()
+        if len(self._written) > 10_000:
+            self._written = {key: deadline for key, deadline in self._written.items() if deadline > now}
+        self._written[user_id] = now + self.sticky_seconds
+        if self.client_factory is None:
+            return
+        try:
+            self.client_factory().set(self._sticky_key(user_id), b"1", px=int(self.sticky_seconds * 1000))
+        except Exception as e:
+            logger.warning("Could not share the read-your-writes mark of user %s: %s", user_id, e)
+
+    def is_sticky(self, user_id: int) -> bool:
+        """
+        The is_sticky function tells whether a user wrote within the last sticky_seconds.
+            When Redis cannot be asked the answer is yes, reading from the primary is always correct.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user who reads
+        :return: True if the user's reads must go to the primary
+        :doc-author: Trelent
+        """
+        if self._written.get(user_id, 0.0) > time.monotonic():
+            return True
+        if self.client_factory is None:
+            return False
+        try:
+            return self.client_factory().get(self._sticky_key(user_id)) is not None
+        except Exception:
+            return True
+
+    def measure_lag(self, replica: Replica) -> float:
+        """
+        The measure_lag function returns how many seconds a replica is behind the primary.
+            Only PostgreSQL streaming replicas can tell, other databases are reported as up to date.
+
+        :param self: Represent the instance of the class
+        :param replica: Replica: The replica to ask
+        :return: The replication lag in seconds
+        :doc-author: Trelent
+        """
+        with replica.engine.connect() as connection:
+            if replica.engine.dialect.name != "postgresql":
+                connection.execute(text("SELECT 1"))
+                return 0.0
+            return float(connection.execute(POSTGRES_LAG).scalar() or 0.0)
+
+    def check(self, replica: Replica):
+        try:
+            replica.lag = self.measure_lag(replica)
+            replica.available = replica.lag <= self.max_lag
+            if not replica.available:
+                logger.warning("Replica %s is %.1f s behind, reading from the primary", replica.name, replica.lag)
+        except Exception as e:
+            replica.available = False
+            logger.warning("Replica %s is unavailable: %s", replica.name, e)
+        replica.checked_at = time.monotonic()
+
+    def mark_down(self, replica: Replica):
+        replica.available = False
+        replica.checked_at = time.monotonic()
+
+    def check_all(self):
+        """
+        The check_all function measures every replica and stores the results that pick reads.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        for replica in self.replicas:
+            self.check(replica)
+
+    async def _check_forever(self):
+        while True:
+            await asyncio.to_thread(self.check_all)
+            await asyncio.sleep(self.check_interval)
+
+    def start(self):
+        """
+        The start function starts the background health checks of the replicas, when there are any.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        if self.replicas:
+            self._task = asyncio.create_task(self._check_forever())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def pick(self, user_id: int) -> Replica | None:
+        """
+        The pick function chooses the replica for the reads of a user.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user who reads
+        :return: The next healthy replica, or None when the reads must go to the primary
+        :doc-author: Trelent
+        """
+        if not self.replicas or self.is_sticky(user_id):
+            return None
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._next) % len(self.replicas)]
+            if replica.available:
+                return replica
+        return None
+
+
+replica_router = ReplicaRouter(config.DB_REPLICA_URLS, sticky_seconds=config.DB_REPLICA_STICKY_SECONDS,
+                               max_lag=config.DB_REPLICA_MAX_LAG_SECONDS,
+                               check_interval=config.DB_REPLICA_CHECK_SECONDS,
+                               client_factory=lambda: auth_service.cache)
+
+
+def get_read_db(user: Principal = Depends(auth_service.get_current_principal), db: Session = Depends(get_db)):
+    """
+    The get_read_db function returns a session for endpoints that only read.
+        It is bound to a replica when one is configured and healthy, and to the primary otherwise.
+        A statement that fails on the replica with a connection error is run again on the primary, the session
+        stays on the primary from then on and the replica is skipped until the monitor finds it healthy again.
+
+    :param user: Principal: The current user
+    :param db: Session: The primary session, it does not connect unless it is used
+    :return: A database session
+    :doc-author: Trelent
+    """
+    replica = replica_router.pick(user.id)
+    if replica is None:
+        yield db
+        return
+    primary = db.get_bind()
+
+    def fall_back(state):
+        if state.session.bind is primary:
+            return None
+        try:
+            return state.invoke_statement()
+        except OperationalError as e:
+            replica_router.mark_down(replica)
+            logger.warning("Replica %s failed, reading from the primary: %s", replica.name, e)
+            state.session.bind = primary
+            return state.invoke_statement()
+
+    session = replica.session_factory()
+    event.listen(session, "do_orm_execute", fall_back)
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def get_write_db(user: Principal = Depends(auth_service.get_current_principal), db: Session = Depends(get_db)):
+    """
+    The get_write_db function returns the primary session for endpoints that write.
+        A commit that wrote something pins the user's reads to the primary for a short time, so they see
+        what they wrote. The commits that only end a read transaction do not.
+
+    :param user: Principal: The current user
+    :param db: Session: The primary session
+    :return: A database session
+    :doc-author: Trelent
+    """
+    if not replica_router.replicas:
+        yield db
+        return
+    wrote = False
+
+    def flushed(session, flush_context):
+        nonlocal wrote
+        wrote = True
+
+    def executed(state):
+        nonlocal wrote
+        wrote = wrote or state.is_insert or state.is_update or state.is_delete
+
+    def committed(session):
+        nonlocal wrote
+        if wrote:
+            replica_router.mark_write(user.id)
+        wrote = False
+
+    def rolled_back(session):
+        nonlocal wrote
+        wrote = False
+
+    hooks = [("after_flush", flushed), ("do_orm_execute", executed), ("after_commit", committed),
+             ("after_rollback", rolled_back)]
+    for name, hook in hooks:
+        event.listen(db, name, hook)
+    try:
+        yield db
+    finally:
+        for name, hook in hooks:
+            event.remove(db, name, hook)
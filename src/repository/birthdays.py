@@ -0,0 +1,165 @@
+import calendar
+import weakref
+from datetime import date, timedelta
+
+from sqlalchemy import case, delete, extract, insert, literal, select
+from sqlalchemy.orm import Session
+
+from src.database.models import Contact, UpcomingBirthday, User
+from src.schemas import Principal
+
+# A birthday as month * 100 + day, comparable without the year
+BIRTHDAY_KEY = extract('month', Contact.birthday) * 100 + extract('day', Contact.birthday)
+
+# The day the table was last found built for, per engine. A rebuild replaces the rows in one transaction,
+# so once a day is there it stays until the next day's run
+_materialized_on = weakref.WeakKeyDictionary()
+
+
+def birthday_window(today: date, days: int) -> dict[int, date]:
+    """
+    The birthday_window function lists the birthdays that fall within the next days.
+        Contacts born on February 29 celebrate on February 28 in years that are not leap years.
+
+    :param today: date: The first day of the window
+    :param days: int: How many days after today the window covers
+    :return: The date of each birthday in the window, keyed by month * 100 + day
+    :doc-author: Trelent
+    """
+    window = {}
+    for offset in range(days + 1):
+        day = today + timedelta(days=offset)
+        window[day.month * 100 + day.day] = day
+        if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+            window[229] = day
+    return window
+
+
+def _birthday_on(window: dict[int, date]):
+    return case(*((BIRTHDAY_KEY == key, literal(day, UpcomingBirthday.birthday_on.type))
+                  for key, day in window.items()))
+
+
+async def materialize_upcoming_birthdays(db: Session, today: date, days: int) -> int:
+    """
+    The materialize_upcoming_birthdays function rebuilds the upcoming_birthdays table for every user with a
+        single INSERT ... SELECT, so the whole contacts table is read once however many users there are.
+        The old rows are replaced in the same transaction, readers see either the old or the new day.
+
+    :param db: Session: Pass the database session to the function
+    :param today: date: The first day of the window
+    :param days: int: How many days after today the window covers
+    :return: The number of upcoming birthdays
+    :doc-author: Trelent
+    """
+    window = birthday_window(today, days)
+    db.execute(delete(UpcomingBirthday))
+    result = db.execute(insert(UpcomingBirthday).from_select(
+        ["user_id", "contact_id", "birthday_on", "computed_on"],
+        select(Contact.user_id, Contact.id, _birthday_on(window), literal(today, UpcomingBirthday.computed_on.type))
+        .where(BIRTHDAY_KEY.in_(window), Contact.user_id.is_not(None))
+    ))
+    db.commit()
+    _materialized_on[db.get_bind()] = today
+    return result.rowcount
+
+
+def is_materialized(db: Session, today: date) -> bool:
+    """
+    The is_materialized function tells whether the upcoming_birthdays table was built for today.
+        Only the answer yes is remembered, the table is asked again until the job has run.
+
+    :param db: Session: Pass the database session to the function
+    :param today: date: The day to look for
+    :return: True if the table holds the rows of that day
+    :doc-author: Trelent
+    """
+    bind = db.get_bind()
+    if _materialized_on.get(bind) == today:
+        return True
+    if db.query(UpcomingBirthday.id).filter(UpcomingBirthday.computed_on == today).first() is None:
+        return False
+    _materialized_on[bind] = today
+    return True
+
+
+async def get_upcoming_birthdays(db: Session, user: User | Principal, today: date,
+                                 fields: tuple[str, ...] | None = None):
+    """
+    The get_upcoming_birthdays function reads the user's upcoming birthdays from the table built by the job.
+
+    :param db: Session: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :param today: date: The day the table was built for
+    :param fields: tuple[str, ...]: Select only these columns, and return rows instead of contacts
+    :return: The contacts in the order of their birthdays
+    :doc-author: Trelent
+    """
+    joined = (UpcomingBirthday.user_id == Contact.user_id) & (UpcomingBirthday.contact_id == Contact.id)
+    criteria = (UpcomingBirthday.user_id == user.id, UpcomingBirthday.computed_on == today, Contact.user_id == user.id)
+    order = (UpcomingBirthday.birthday_on, Contact.id)
+    if fields:
+        columns = [getattr(Contact, field) for field in fields]
+        return db.execute(select(*columns).join(UpcomingBirthday, joined).where(*criteria).order_by(*order)) \
+            .mappings().all()
+    return db.query(Contact).join(UpcomingBirthday, joined).filter(*criteria).order_by(*order).all()
+
+
+def forget_contact(db: Session, contact_id: int):
+    db.execute(delete(UpcomingBirthday).where(UpcomingBirthday.contact_id == contact_id))
+
+
+def remember_contact(db: Session, contact: Contact, today: date, days: int):
+    """
+    The remember_contact function adds a created or updated contact to upcoming_birthdays when its birthday
+        is in the window, so that the endpoint does not wait for the next run of the job. It runs in the
+        caller's transaction, and only adds the row when the table was built today, because the endpoint
+        does not read the table otherwise.
+
+    :param db: Session: Pass the database session to the function
+    :param contact: Contact: The contact, already flushed so that it has an id
+    :param today: date: The first day of the window
+    :param days: int: How many days after today the window covers
+    :return: None
+    :doc-author: Trelent
+    """
+    window = birthday_window(today, days)
+    key = contact.birthday.month * 100 + contact.birthday.day
+    if key not in window:
+        return
+    db.execute(insert(UpcomingBirthday).from_select(
+        ["user_id", "contact_id", "birthday_on", "computed_on"],
+        select(literal(contact.user_id), literal(contact.id), literal(window[key], UpcomingBirthday.birthday_on.type),
+               UpcomingBirthday.computed_on)
+        .where(UpcomingBirthday.computed_on == today).limit(1)
+    ))
+
+
+async def get_digest_rows(db: Session, today: date, after_user_id: int = 0, users: int = 1000) -> list:
+    """
+    The get_digest_rows function reads the upcoming birthdays of the next page of confirmed users, grouped by user.
+        Pages are cut by user id, so a user's birthdays are never split between two pages.
+
+    :param db: Session: Pass the database session to the function
+    :param today: date: The day the table was built for
+    :param after_user_id: int: The last user of the previous page
+    :param users: int: How many users a page holds
+    :return: A list of (user id, email, username, contact name, contact fullname, birthday) rows
+    :doc-author: Trelent
+    """
+    page = (
+        select(UpcomingBirthday.user_id)
+        .join(User, User.id == UpcomingBirthday.user_id)
+        .where(UpcomingBirthday.computed_on == today, UpcomingBirthday.user_id > after_user_id,
+               User.confirmed.is_(True))
+        .group_by(UpcomingBirthday.user_id)
+        .order_by(UpcomingBirthday.user_id)
+        .limit(users)
+    )
+    return db.execute(
+        select(User.id, User.email, User.username, Contact.name, Contact.fullname, UpcomingBirthday.birthday_on)
+        .join(UpcomingBirthday, UpcomingBirthday.user_id == User.id)
+        .join(Contact, (Contact.user_id == UpcomingBirthday.user_id) & (Contact.id == UpcomingBirthday.contact_id))
+        .where(UpcomingBirthday.computed_on == today, User.id.in_(page))
+        .order_by(User.id, UpcomingBirthday.birthday_on, Contact.id)
+    ).all()
@@ -1,12 +1,32 @@
-from datetime import timedelta, datetime
+from collections import Counter
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, delete, extract, func, select
 from sqlalchemy.orm import Session
 
-from sqlalchemy import extract
+from src.conf.config import config
+from src.database.db import release_connection
+from src.database.functions import email_domain
 from src.database.models import Contact, User
-from src.schemas import ContactBase
+from src.repository import birthdays
+from src.schemas import ContactBase, ContactStats, DomainCount, Principal
+from src.services.phones import to_e164
 
 
-async def search_contacts(name: str, fullname: str, email: str, db: Session, user: User):
+def _columns(fields: tuple[str, ...]):
+    # A narrow select also skips the eager join of the contact's user
+    return [getattr(Contact, field) for field in fields]
+
+
+def _find(db: Session, fields: tuple[str, ...] | None, *criteria, order_by=()):
+    # The contacts matching criteria, or with fields only those columns as rows
+    if fields:
+        return db.execute(select(*_columns(fields)).where(*criteria).order_by(*order_by)).mappings().all()
+    query = db.query(Contact).filter(*criteria)
+    return (query.order_by(*order_by) if order_by else query).all()
+
+
+async def search_contacts(name: str, fullname: str, email: str, db: Session, user: User | Principal,
+                          fields: tuple[str, ...] | None = None):
 
     """
     The search_contacts function searches for contacts in the database.
@@ -20,42 +40,44 @@ async def search_contacts(name: str, fullname: str, email: str, db: Session, use
     :param email: str: Search for a contact by email address
     :param db: Session: Pass in the database session
     :param user: User: Filter the results by user
+    :param fields: tuple[str, ...]: Select only these columns, and return rows instead of contacts
     :return: A list of contacts
     :doc-author: Trelent
     """
-    if name:
-        contact = db.query(Contact).filter_by(name=name, user=user).all()
-        return contact
-    if fullname:
-        contact = db.query(Contact).filter_by(fullname=fullname, user=user).all()
-        return contact
-    if email:
-        contact = db.query(Contact).filter_by(email=email, user=user).all()
-        return contact
+    contact = None
+    search = {"name": name} if name else {"fullname": fullname} if fullname else {"email": email} if email else None
+    if search and fields:
+        contact = db.execute(select(*_columns(fields)).filter_by(**search, user_id=user.id)).mappings().all()
+    elif search:
+        contact = db.query(Contact).filter_by(**search, user_id=user.id).all()
+    release_connection(db)
+    return contact
 
 
-async def search_birthday(db: Session, user: User):
+async def search_birthday(db: Session, user: User | Principal, fields: tuple[str, ...] | None = None):
     """
     The search_birthday function searches the database for contacts whose birthday is within a week of today's date.
-        It returns a list of all such contacts.
+        It reads the upcoming_birthdays table when the daily job has built it today, and asks the contacts
+        table directly otherwise.
 
     :param db: Session: Pass the database session to the function
     :param user: User: Identify the user that is currently logged in
+    :param fields: tuple[str, ...]: Select only these columns, and return rows instead of contacts
     :return: A list of contacts with birthdays in the next 7 days
     :doc-author: Trelent
     """
-    today = datetime.today()
-    end_date = today + timedelta(days=7)
-    contacts = db.query(Contact).filter(
-            ((extract('month', Contact.birthday) == today.month) & (extract('day', Contact.birthday) >= today.day)) |
-            ((extract('month', Contact.birthday) == end_date.month) & (
-                    extract('day', Contact.birthday) <= end_date.day)), user=user
-        ).all()
-
+    today = date.today()
+    if birthdays.is_materialized(db, today):
+        contacts = await birthdays.get_upcoming_birthdays(db, user, today, fields)
+    else:
+        window = birthdays.birthday_window(today, config.BIRTHDAY_WINDOW_DAYS)
+        contacts = _find(db, fields, birthdays.BIRTHDAY_KEY.in_(window), Contact.user_id == user.id)
+    release_connection(db)
     return contacts
 
 
-async def get_contacts(offset: int, limit: int, db: Session, user: User):
+async def get_contacts(offset: int, limit: int, db: Session, user: User | Principal,
+                       fields: tuple[str, ...] | None = None):
     """
     The get_contacts function returns a list of contacts for the user.
 
@@ -63,13 +85,20 @@ async def get_contacts(offset: int, limit: int, db: Session, user: User):
     :param limit: int: Limit the number of contacts returned
     :param db: Session: Access the database
     :param user: User: Filter the contacts by user
+    :param fields: tuple[str, ...]: Select only these columns, and return rows instead of contacts
     :return: A list of contacts
     :doc-author: Trelent
     """
-    return db.query(Contact).filter_by(user=user).offset(offset).limit(limit).all()
+    if fields:
+        contacts = db.execute(select(*_columns(fields)).where(Contact.user_id == user.id)
+                              .offset(offset).limit(limit)).mappings().all()
+    else:
+        contacts = db.query(Contact).filter_by(user_id=user.id).offset(offset).limit(limit).all()
+    release_connection(db)
+    return contacts
 
 
-async def get_contact(contact_id: int, db: Session, user: User):
+async def get_contact(contact_id: int, db: Session, user: User | Principal, fields: tuple[str, ...] | None = None):
     """
     The get_contact function takes in a contact_id and returns the corresponding Contact object.
         Args:
@@ -80,13 +109,39 @@ async def get_contact(contact_id: int, db: Session, user: User):
     :param contact_id: int: Specify the id of the contact to be retrieved
     :param db: Session: Pass the database session to the function
     :param user: User: Ensure that the user is authorized to access this contact
+    :param fields: tuple[str, ...]: Select only these columns, and return a row instead of a contact
     :return: A contact object
     :doc-author: Trelent
     """
-    return db.query(Contact).filter(Contact.id == contact_id, user=user).first()
+    if fields:
+        contact = db.execute(select(*_columns(fields))
+                             .where(Contact.id == contact_id, Contact.user_id == user.id)).mappings().first()
+    else:
+        contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
+    release_connection(db)
+    return contact
+
 
+async def get_contacts_by_ids(contact_ids: list[int], db: Session, user: User | Principal,
+                              fields: tuple[str, ...] | None = None):
+    """
+    The get_contacts_by_ids function fetches many contacts of the user with one query.
 
-async def create_contact(body: ContactBase, db: Session, user: User):
+    :param contact_ids: list[int]: The ids of the contacts, in any order and with repeats
+    :param db: Session: Pass the database session to the function
+    :param user: User: Ensure that only the user's contacts are returned
+    :param fields: tuple[str, ...]: Select only these columns, and return rows instead of contacts
+    :return: The contacts that exist, in no particular order
+    :doc-author: Trelent
+    """
+    if not contact_ids:
+        return []
+    contacts = _find(db, fields, Contact.id.in_(set(contact_ids)), Contact.user_id == user.id)
+    release_connection(db)
+    return contacts
+
+
+async def create_contact(body: ContactBase, db: Session, user: User | Principal):
     """
     The create_contact function creates a new contact in the database.
 
@@ -100,16 +155,20 @@ async def create_contact(body: ContactBase, db: Session, user: User):
                       fullname=body.fullname,
                       email=body.email,
                       phone_number=body.phone_number,
+                      phone_e164=to_e164(body.phone_number),
                       birthday=body.birthday,
                       description=body.description,
-                      user=user)
+                      user_id=user.id)
     db.add(contact)
+    db.flush()
+    birthdays.remember_contact(db, contact, date.today(), config.BIRTHDAY_WINDOW_DAYS)
     db.commit()
     db.refresh(contact)
+    release_connection(db)
     return contact
 
 
-async def update_contact(contact_id: int, body: ContactBase, db: Session, user: User):
+async def update_contact(contact_id: int, body: ContactBase, db: Session, user: User | Principal):
     """
     The update_contact function updates a contact in the database.
         Args:
@@ -123,19 +182,26 @@ async def update_contact(contact_id: int, body: ContactBase, db: Session, user:
     :return: The contact that was updated
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(Contact.id == contact_id, user=user).first()
+    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
     if contact:
         contact.name = body.name
         contact.fullname = body.fullname
         contact.email = body.email
         contact.phone_number = body.phone_number
+        contact.phone_e164 = to_e164(body.phone_number)
         contact.birthday = body.birthday
         contact.description = body.description
+        birthdays.forget_contact(db, contact.id)
+        birthdays.remember_contact(db, contact, date.today(), config.BIRTHDAY_WINDOW_DAYS)
     db.commit()
+    if contact:
+        # updated_at was set by the database, load it now instead of while the response is serialized
+        db.refresh(contact)
+        release_connection(db)
     return contact
 
 
-async def remove_contact(contact_id: int, db: Session, user: User):
+async def remove_contact(contact_id: int, db: Session, user: User | Principal):
     """
     The remove_contact function removes a contact from the database.
         Args:
@@ -149,8 +215,117 @@ async def remove_contact(contact_id: int, db: Session, user: User):
     :return: The contact that was removed
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(Contact.id == contact_id, user=user).first()
+    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
     if contact:
+        birthdays.forget_contact(db, contact.id)
         db.delete(contact)
         db.commit()
     return contact
+
+
+async def get_contacts_by_phone(numbers: list[str], db: Session, user: User | Principal,
+                                fields: tuple[str, ...] | None = None):
+    """
+    The get_contacts_by_phone function finds the contacts of the user that own any of the given numbers.
+        The numbers must already be in E.164, so that the lookup is one probe of the (user_id, phone_e164) index.
+
+    :param numbers: list[str]: The phone numbers in E.164
+    :param db: Session: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :param fields: tuple[str, ...]: Select only these columns, and return rows instead of contacts
+    :return: A list of contacts, ordered by id
+    :doc-author: Trelent
+    """
+    if not numbers:
+        return []
+    contacts = _find(db, fields, Contact.user_id == user.id, Contact.phone_e164.in_(set(numbers)),
+                     order_by=(Contact.id,))
+    release_connection(db)
+    return contacts
+
+
+async def get_contact_stats(db: Session, user: User | Principal, now: datetime, top_domains: int):
+    """
+    The get_contact_stats function summarizes the contacts of the user with a single grouped query.
+        The rows are counted per birthday month and email domain, with the recently added ones alongside,
+        and the few dozen groups are then added up per month and per domain.
+
+    :param db: Session: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :param now: datetime: The moment the recent counts are measured from, in the time zone of created_at
+    :param top_domains: int: How many of the most common email domains are reported
+    :return: The statistics
+    :doc-author: Trelent
+    """
+    week, month = now - timedelta(days=7), now - timedelta(days=30)
+    rows = db.execute(
+        select(extract("month", Contact.birthday), email_domain(Contact.email), func.count(),
+               func.sum(case((Contact.created_at >= week, 1), else_=0)),
+               func.sum(case((Contact.created_at >= month, 1), else_=0)))
+        .where(Contact.user_id == user.id)
+        .group_by(extract("month", Contact.birthday), email_domain(Contact.email))
+    ).all()
+    release_connection(db)
+    birthdays_by_month = dict.fromkeys(range(1, 13), 0)
+    domains = Counter()
+    total = added_last_7_days = added_last_30_days = 0
+    for birthday_month, domain, count, last_week, last_month in rows:
+        birthdays_by_month[int(birthday_month)] += count
+        domains[domain] += count
+        total += count
+        added_last_7_days += last_week or 0
+        added_last_30_days += last_month or 0
+    return ContactStats(total=total, birthdays_by_month=birthdays_by_month,
+                        email_domains=[DomainCount(domain=domain, contacts=count)
+                                       for domain, count in domains.most_common(top_domains)],
+                        added_last_7_days=added_last_7_days, added_last_30_days=added_last_30_days)
+
+
+async def get_dedupe_candidates(db: Session, user: User | Principal):
+    """
+    The get_dedupe_candidates function loads the columns the dedupe engine compares, for all contacts of the user.
+
+    :param db: Session: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :return: Rows with id, fullname, email, phone_number and birthday
+    :doc-author: Trelent
+    """
+    candidates = db.execute(select(Contact.id, Contact.fullname, Contact.email, Contact.phone_number,
+                                   Contact.birthday).where(Contact.user_id == user.id)).all()
+    release_connection(db)
+    return candidates
+
+
+async def merge_contacts(keep_id: int, merge_ids: list[int], db: Session, user: User | Principal):
+    """
+    The merge_contacts function folds duplicate contacts into one, in a single transaction.
+        The kept contact keeps its own fields and collects the descriptions of the others, which are deleted.
+        The rows are locked first, so that two concurrent merges of the same contacts cannot both succeed.
+
+    :param keep_id: int: The contact that remains
+    :param merge_ids: list[int]: The contacts merged into it
+    :param db: Session: Pass the database session to the function
+    :param user: User: Ensure that all contacts belong to the user
+    :return: The kept contact, or None if one of the contacts does not exist
+    :doc-author: Trelent
+    """
+    ids = [keep_id, *merge_ids]
+    contacts = {contact.id: contact for contact in
+                db.query(Contact).filter(Contact.id.in_(ids), Contact.user_id == user.id).with_for_update().all()}
+    if len(contacts) != len(set(ids)):
+        db.rollback()
+        return None
+    keep = contacts[keep_id]
+    descriptions = []
+    for contact_id in ids:
+        description = (contacts[contact_id].description or "").strip()
+        if description and description not in descriptions:
+            descriptions.append(description)
+    keep.description = "; ".join(descriptions)[:150]
+    for contact_id in merge_ids:
+        birthdays.forget_contact(db, contact_id)
+    db.execute(delete(Contact).where(Contact.id.in_(merge_ids), Contact.user_id == user.id))
+    db.commit()
+    db.refresh(keep)
+    release_connection(db)
+    return keep
@@ -3,7 +3,7 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 from libgravatar import Gravatar
 
-from src.database.db import get_db
+from src.database.db import get_db, release_connection
 from src.database.models import User
 from src.schemas import UserSchema
 
@@ -18,7 +18,9 @@ async def get_user_by_email(email: str, db: Session):
     :return: A user object
     :doc-author: Trelent
     """
-    return db.query(User).filter(User.email == email).first()
+    user = db.query(User).filter(User.email == email).first()
+    release_connection(db)
+    return user
 
 
 async def create_user(body: UserSchema, db: Session = Depends(get_db)):
@@ -44,6 +46,7 @@ async def create_user(body: UserSchema, db: Session = Depends(get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    release_connection(db)
     return new_user
 
 
@@ -65,6 +68,20 @@ async def update_token(user: User, token: str | None, db: Session):
     db.commit()
 
 
+async def update_password(user: User, password_hash: str, db: Session):
+    """
+    The update_password function stores a new password hash of a user.
+
+    :param user: User: The user
+    :param password_hash: str: The new hash
+    :param db: Session: Pass in the database session
+    :return: None
+    :doc-author: Trelent
+    """
+    user.password = password_hash
+    db.commit()
+
+
 async def confirmed_email(email: str, db: Session) -> None:
     """
     The confirmed_email function takes in an email and a database session,
@@ -95,4 +112,5 @@ async def update_avatar_url(email: str, url: str | None, db: Session) -> User:
     user.avatar = url
     db.commit()
     db.refresh(user)
+    release_connection(db)
     return user
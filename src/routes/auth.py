@@ -1,18 +1,32 @@
+import pathlib
+
 from fastapi import APIRouter, HTTPException, Depends, status, Path, Query, Security, Request, Response, BackgroundTasks
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
+from src.conf.config import config
+from src.database.db import get_db, SessionLocal
 from src.repository import users as repository_users
 from src.schemas import UserSchema, TokenSchema, UserResponse, RequestEmail
 from src.services.auth import auth_service
 from src.services.email import send_email
+from src.services.events import OpenEventRecorder
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
 get_refresh_token = HTTPBearer()
 
+# Read once, every email open is answered from memory
+OPEN_CHECK_PIXEL = (pathlib.Path(__file__).parent.parent / "static" / "open_check.png").read_bytes()
+# Each open must reach the server, so neither the mail client nor a proxy may keep the image
+NO_CACHE_HEADERS = {"Cache-Control": "no-store, no-cache, must-revalidate, max-age=0", "Pragma": "no-cache",
+                    "Expires": "0"}
+
+open_events = OpenEventRecorder(SessionLocal, batch_size=config.OPEN_EVENTS_BATCH_SIZE,
+                                flush_seconds=config.OPEN_EVENTS_FLUSH_SECONDS,
+                                max_buffered=config.OPEN_EVENTS_MAX_BUFFERED)
+
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def signup(body: UserSchema, bt: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
@@ -31,7 +45,7 @@ async def signup(body: UserSchema, bt: BackgroundTasks, request: Request, db: Se
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await run_in_threadpool(auth_service.get_password_hash, body.password)
     new_user = await repository_users.create_user(body, db)
     bt.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
     return new_user
@@ -43,6 +57,7 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
     The login function is used to authenticate a user.
         It takes the username and password from the request body,
         verifies that they are correct, and then returns an access token.
+        A password hash made under an older hashing policy is replaced while the password is at hand.
 
     :param body: OAuth2PasswordRequestForm: Get the username and password from the request body
     :param db: Session: Get the database session
@@ -52,12 +67,16 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
     user = await repository_users.get_user_by_email(body.username, db)
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
-    if not auth_service.verify_password(body.password, user.password):
+    # Hashing takes a few hundred milliseconds on purpose, other requests are served meanwhile
+    verified, new_hash = await run_in_threadpool(auth_service.verify_and_update, body.password, user.password)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
+    if new_hash is not None:
+        await repository_users.update_password(user, new_hash, db)
     # Generate JWT
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
+    access_token = await auth_service.create_access_token(data=auth_service.access_token_claims(user))
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
     await repository_users.update_token(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
@@ -83,7 +102,7 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(get
         await repository_users.update_token(user, None, db)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
+    access_token = await auth_service.create_access_token(data=auth_service.access_token_claims(user))
     refresh_token = await auth_service.create_refresh_token(data={"sub": email})
     await repository_users.update_token(user, refresh_token, db)
     return {"access_token": access_token, " refresh_token": refresh_token, "token_type": "bearer"}
@@ -126,18 +145,16 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
 
 
 @router.get('/{username}')
-async def request_email(username: str, response: Response, db: Session = Depends(get_db)):
+async def email_opened(username: str, request: Request):
     """
-    The request_email function is used to send an email to the user with a link that will allow them
-    to reset their password. The function takes in a username and returns an image of the open_check.png file.
+    The email_opened function serves the tracking pixel embedded in the emails sent to a user.
+        The open is buffered and written to the database later with other opens in one insert,
+        so a burst of opens costs the database nothing per request.
 
     :param username: str: Get the username from the url
-    :param response: Response: Set the response headers
-    :param db: Session: Access the database
-    :return: A fileresponse object
+    :param request: Request: Get the user agent of the mail client
+    :return: The pixel image
     :doc-author: Trelent
     """
-    print("----------------------------")
-    print(f"{username} open email in bd")
-    print("----------------------------")
-    return FileResponse("src/static/open_check.png", media_type="image/png", content_disposition_type="inline")
+    open_events.record(username, request.headers.get("user-agent"))
+    return Response(OPEN_CHECK_PIXEL, media_type="image/png", headers=NO_CACHE_HEADERS)
@@ -1,20 +1,53 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
-from src.database.models import User
-from src.schemas import ContactBase, ContactResponse
+from src.database.replicas import get_read_db, get_write_db
+from src.schemas import (CONTACT_BATCH_MAX_IDS, CONTACT_FIELDS, ContactBase, ContactBatchItem, ContactBatchRequest,
+                         ContactResponse, ContactStats, DuplicateReport, MergeRequest, PhoneLookupRequest,
+                         PhoneLookupResult, Principal)
 from src.repository import contacts as repository_contacts
 from src.services.auth import auth_service
+from src.services.dedupe import find_duplicates
+from src.services.phones import to_e164
+from src.services.stats import get_contact_stats, invalidate_contact_stats
 
 router = APIRouter(prefix='/contacts', tags=["contacts"])
 
 
+def contact_fields(fields: str | None = Query(None, description="Comma separated fields to return, "
+                                                                f"out of {', '.join(CONTACT_FIELDS)}")):
+    """
+    The contact_fields function parses the fields= query parameter of the contact read endpoints.
+
+    :param fields: str: The comma separated field names
+    :return: The field names, id first and without repeats, or None to return every field
+    :doc-author: Trelent
+    """
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(names) - set(CONTACT_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(["id", *names]))
+
+
+def _sparse(rows) -> JSONResponse:
+    # Rows of the selected columns only, sent without validating them through ContactResponse
+    return JSONResponse(jsonable_encoder([dict(row) for row in rows]))
+
+
 @router.get("/search_by_elem_body", response_model=list[ContactResponse],
             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
 async def search_contacts(name: str = None, fullname: str = None, email: str = None,
-                          db: Session = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+                          fields: tuple[str, ...] | None = Depends(contact_fields),
+                          db: Session = Depends(get_read_db),
+                          user: Principal = Depends(auth_service.get_current_principal)):
 
     """
     The search_contacts function searches for contacts in the database.
@@ -24,93 +57,284 @@ async def search_contacts(name: str = None, fullname: str = None, email: str = N
     :param name: str: Search for a contact by name
     :param fullname: str: Search for a contact by fullname
     :param email: str: Search for a contact by email
+    :param fields: tuple[str, ...]: The fields to return, all of them by default
     :param db: Session: Get the database session
-    :param user: User: Get the current user from the auth_service
+    :param user: Principal: Get the current user from the auth_service
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.search_contacts(name, fullname, email, db, user)
+    contacts = await repository_contacts.search_contacts(name, fullname, email, db, user, fields)
     if contacts is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if fields:
+        return _sparse(contacts)
     return contacts
 
 
 @router.get("/search_by_birthday", response_model=list[ContactResponse],
             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def search_contacts(db: Session = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+async def search_contacts(fields: tuple[str, ...] | None = Depends(contact_fields),
+                          db: Session = Depends(get_read_db),
+                          user: Principal = Depends(auth_service.get_current_principal)):
 
     """
     The search_contacts function is used to search for contacts that have a birthday in the next 7 days.
         The function takes in a database session and an authenticated user as parameters.
         It then calls the repository_contacts.search_birthday function, which returns all contacts with birthdays within 7 days of today's date.
 
+    :param fields: tuple[str, ...]: The fields to return, all of them by default
     :param db: Session: Get the database session
-    :param user: User: Get the user id from the token
+    :param user: Principal: Get the user id from the token
     :return: A list of contacts with a birthday in the next month
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.search_birthday(db, user)
+    contacts = await repository_contacts.search_birthday(db, user, fields)
 
     if contacts is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if fields:
+        return _sparse(contacts)
     return contacts
 
 
+def contact_ids(ids: str = Query(description=f"Comma separated contact ids, at most {CONTACT_BATCH_MAX_IDS}")):
+    """
+    The contact_ids function parses the ids= query parameter of the batch endpoint.
+
+    :param ids: str: The comma separated ids
+    :return: The ids in the order given
+    :doc-author: Trelent
+    """
+    try:
+        parsed = [int(contact_id) for contact_id in ids.split(",") if contact_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be comma separated integers")
+    if not 1 <= len(parsed) <= CONTACT_BATCH_MAX_IDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Between 1 and {CONTACT_BATCH_MAX_IDS} ids are needed")
+    return parsed
+
+
+async def _batch(ids: list[int], db: Session, user: Principal,
+                 fields: tuple[str, ...] | None = None) -> list[ContactBatchItem] | JSONResponse:
+    if fields:
+        found = {row["id"]: row for row in await repository_contacts.get_contacts_by_ids(ids, db, user, fields)}
+        return JSONResponse(jsonable_encoder([{"id": contact_id, "found": contact_id in found,
+                                               "contact": dict(found[contact_id]) if contact_id in found else None}
+                                              for contact_id in ids]))
+    found = {contact.id: contact for contact in await repository_contacts.get_contacts_by_ids(ids, db, user)}
+    return [ContactBatchItem(id=contact_id, found=contact_id in found,
+                             contact=ContactResponse.model_validate(found[contact_id]) if contact_id in found else None)
+            for contact_id in ids]
+
+
+@router.get("/batch", response_model=list[ContactBatchItem], dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def read_contacts_batch(ids: list[int] = Depends(contact_ids),
+                              fields: tuple[str, ...] | None = Depends(contact_fields),
+                              db: Session = Depends(get_read_db),
+                              user: Principal = Depends(auth_service.get_current_principal)):
+    """
+    The read_contacts_batch function fetches many contacts by id with one query, for clients that hold a list of ids.
+
+    :param ids: list[int]: The contact ids, from ?ids=1,2,3
+    :param fields: tuple[str, ...]: The fields to return for each contact, all of them by default
+    :param db: Session: Get the database session
+    :param user: Principal: Get the current user
+    :return: One item per requested id, in request order, with found=false for the ids the user has no contact for
+    :doc-author: Trelent
+    """
+    return await _batch(ids, db, user, fields)
+
+
+@router.post("/batch", response_model=list[ContactBatchItem],
+             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def read_contacts_batch_post(body: ContactBatchRequest,
+                                   fields: tuple[str, ...] | None = Depends(contact_fields),
+                                   db: Session = Depends(get_read_db),
+                                   user: Principal = Depends(auth_service.get_current_principal)):
+    """
+    The read_contacts_batch_post function is the variant of read_contacts_batch for id lists too long for a URL.
+
+    :param body: ContactBatchRequest: The contact ids
+    :param fields: tuple[str, ...]: The fields to return for each contact, all of them by default
+    :param db: Session: Get the database session
+    :param user: Principal: Get the current user
+    :return: One item per requested id, in request order, with found=false for the ids the user has no contact for
+    :doc-author: Trelent
+    """
+    return await _batch(body.ids, db, user, fields)
+
+
+@router.get("/stats", response_model=ContactStats, dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def read_contact_stats(db: Session = Depends(get_read_db),
+                             user: Principal = Depends(auth_service.get_current_principal)):
+    """
+    The read_contact_stats function returns the number of contacts, their birthdays per month, their email
+        domains and how many were added recently. The result is cached until the user changes a contact.
+
+    :param db: Session: Get the database session
+    :param user: Principal: Get the current user
+    :return: The statistics
+    :doc-author: Trelent
+    """
+    return await get_contact_stats(db, user)
+
+
+@router.get("/by_phone", response_model=list[ContactResponse],
+            dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def find_by_phone(number: str, fields: tuple[str, ...] | None = Depends(contact_fields),
+                        db: Session = Depends(get_read_db),
+                        user: Principal = Depends(auth_service.get_current_principal)):
+    """
+    The find_by_phone function answers which contacts of the user own a phone number, in any spelling of it.
+
+    :param number: str: The phone number
+    :param fields: tuple[str, ...]: The fields to return, all of them by default
+    :param db: Session: Get the database session
+    :param user: Principal: Get the current user
+    :return: The contacts with that number
+    :doc-author: Trelent
+    """
+    e164 = to_e164(number)
+    if e164 is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid phone number")
+    contacts = await repository_contacts.get_contacts_by_phone([e164], db, user, fields)
+    if fields:
+        return _sparse(contacts)
+    return contacts
+
+
+@router.post("/by_phone", response_model=list[PhoneLookupResult],
+             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def find_by_phones(body: PhoneLookupRequest, db: Session = Depends(get_read_db),
+                         user: Principal = Depends(auth_service.get_current_principal)):
+    """
+    The find_by_phones function looks up many phone numbers with one query.
+        Every number gets a result in the order of the request, with no contacts when it is invalid or unknown.
+
+    :param body: PhoneLookupRequest: The phone numbers
+    :param db: Session: Get the database session
+    :param user: Principal: Get the current user
+    :return: The number, its E.164 form and its contacts, for every number
+    :doc-author: Trelent
+    """
+    numbers = [(number, to_e164(number)) for number in body.numbers]
+    owners = {}
+    for contact in await repository_contacts.get_contacts_by_phone([e164 for _, e164 in numbers if e164], db, user):
+        owners.setdefault(contact.phone_e164, []).append(contact)
+    return [PhoneLookupResult(number=number, e164=e164,
+                              contacts=[ContactResponse.model_validate(c) for c in owners.get(e164, [])])
+            for number, e164 in numbers]
+
+
+@router.get("/duplicates", response_model=DuplicateReport,
+            dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def find_duplicate_contacts(limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_read_db),
+                                  user: Principal = Depends(auth_service.get_current_principal)):
+    """
+    The find_duplicate_contacts function reports the groups of contacts that look like the same person.
+        The comparison runs in a worker thread, so large address books do not block other requests.
+
+    :param limit: int: The maximum number of groups returned, largest first
+    :param db: Session: Get the database session
+    :param user: Principal: Get the current user
+    :return: The number of contacts and duplicates, and the groups
+    :doc-author: Trelent
+    """
+    candidates = await repository_contacts.get_dedupe_candidates(db, user)
+    groups = await asyncio.to_thread(find_duplicates, candidates)
+    return DuplicateReport(contacts=len(candidates),
+                           duplicates=sum(len(group.contact_ids) - 1 for group in groups),
+                           groups=groups[:limit])
+
+
+@router.post("/merge", response_model=ContactResponse, dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def merge_contacts(body: MergeRequest, db: Session = Depends(get_write_db),
+                         user: Principal = Depends(auth_service.get_current_principal)):
+    """
+    The merge_contacts function merges duplicate contacts into the contact to keep and deletes the others.
+
+    :param body: MergeRequest: The contact to keep and the contacts merged into it
+    :param db: Session: Get the database session
+    :param user: Principal: Get the current user
+    :return: The kept contact
+    :doc-author: Trelent
+    """
+    if body.keep_id in body.merge_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot merge a contact into itself")
+    contact = await repository_contacts.merge_contacts(body.keep_id, body.merge_ids, db, user)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    invalidate_contact_stats(user.id)
+    return contact
+
+
 @router.get("/", response_model=list[ContactResponse], dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def read_contacts(offset: int = 0, limit: int = 100, db: Session = Depends(get_db),
-                        user: User = Depends(auth_service.get_current_user)):
+async def read_contacts(offset: int = 0, limit: int = 100, fields: tuple[str, ...] | None = Depends(contact_fields),
+                        db: Session = Depends(get_read_db),
+                        user: Principal = Depends(auth_service.get_current_principal)):
     """
     The read_contacts function returns a list of contacts.
+        With fields= only those columns are read and returned, without validating them through ContactResponse.
 
     :param offset: int: Specify the starting point of the query
     :param limit: int: Limit the number of contacts returned
+    :param fields: tuple[str, ...]: The fields to return, all of them by default
     :param db: Session: Get the database session
-    :param user: User: Get the user from the database
+    :param user: Principal: Get the user from the database
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.get_contacts(offset, limit, db, user)
+    contacts = await repository_contacts.get_contacts(offset, limit, db, user, fields)
+    if fields:
+        return _sparse(contacts)
     return contacts
 
 
 @router.get("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def read_contact(contact_id: int, db: Session = Depends(get_db),
-                       user: User = Depends(auth_service.get_current_user)):
+async def read_contact(contact_id: int, fields: tuple[str, ...] | None = Depends(contact_fields),
+                       db: Session = Depends(get_read_db),
+                       user: Principal = Depends(auth_service.get_current_principal)):
     """
     The read_contact function is used to retrieve a single contact from the database.
     It takes in an integer representing the ID of the contact, and returns a Contact object.
 
     :param contact_id: int: Specify the contact id that is passed in the url
+    :param fields: tuple[str, ...]: The fields to return, all of them by default
     :param db: Session: Pass the database session to the function
-    :param user: User: Get the current user, and the db: session parameter is used to get a database session
+    :param user: Principal: Get the current user, and the db: session parameter is used to get a database session
     :return: A contact object, which is defined in the models
     :doc-author: Trelent
     """
-    contact = await repository_contacts.get_contact(contact_id, db, user)
+    contact = await repository_contacts.get_contact(contact_id, db, user, fields)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    if fields:
+        return JSONResponse(jsonable_encoder(dict(contact)))
     return contact
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED,
              dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def create_contact(body: ContactBase, db: Session = Depends(get_db),
-                         user: User = Depends(auth_service.get_current_user)):
+async def create_contact(body: ContactBase, db: Session = Depends(get_write_db),
+                         user: Principal = Depends(auth_service.get_current_principal)):
     """
     The create_contact function creates a new contact in the database.
 
     :param body: ContactBase: Specify the type of data that will be passed to the function
     :param db: Session: Pass the database session into the function
-    :param user: User: Get the user id from the current user
+    :param user: Principal: Get the user id from the current user
     :return: The new contact
     :doc-author: Trelent
     """
-    return await repository_contacts.create_contact(body, db, user)
+    contact = await repository_contacts.create_contact(body, db, user)
+    invalidate_contact_stats(user.id)
+    return contact
 
 
 @router.put("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def update_contact(body: ContactBase, contact_id: int, db: Session = Depends(get_db),
-                         user: User = Depends(auth_service.get_current_user)):
+async def update_contact(body: ContactBase, contact_id: int, db: Session = Depends(get_write_db),
+                         user: Principal = Depends(auth_service.get_current_principal)):
     """
     The update_contact function updates a contact in the database.
         The function takes three arguments:
@@ -121,30 +345,32 @@ async def update_contact(body: ContactBase, contact_id: int, db: Session = Depen
     :param body: ContactBase: Get the data from the request body
     :param contact_id: int: Identify the contact to be deleted
     :param db: Session: Pass the database session to the repository function
-    :param user: User: Get the current user
+    :param user: Principal: Get the current user
     :return: A contactbase object
     :doc-author: Trelent
     """
     contact = await repository_contacts.update_contact(contact_id, body, db, user)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    invalidate_contact_stats(user.id)
     return contact
 
 
 @router.delete("/{contact_id}", response_model=ContactResponse,
                dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def remove_contact(contact_id: int, db: Session = Depends(get_db),
-                         user: User = Depends(auth_service.get_current_user)):
+async def remove_contact(contact_id: int, db: Session = Depends(get_write_db),
+                         user: Principal = Depends(auth_service.get_current_principal)):
     """
     The remove_contact function removes a contact from the database.
 
     :param contact_id: int: Specify the id of the contact to be removed
     :param db: Session: Pass the database session to the repository layer
-    :param user: User: Get the current user
+    :param user: Principal: Get the current user
     :return: The contact that was removed
     :doc-author: Trelent
     """
     contact = await repository_contacts.remove_contact(contact_id, db, user)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    invalidate_contact_stats(user.id)
     return contact
@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from src.conf.config import config
+from src.database.db import engine
+from src.services.auth import auth_service
+from src.services.health import HealthMonitor
+
+router = APIRouter(prefix='/health', tags=['health'])
+
+monitor = HealthMonitor(engine, lambda: auth_service.cache, interval=config.HEALTH_REFRESH_SECONDS)
+
+
+@router.get("/live")
+async def live():
+    """
+    The live function is the liveness probe. It answers as long as the event loop runs and never does any I/O.
+
+    :return: A status message
+    :doc-author: Trelent
+    """
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def ready():
+    """
+    The ready function is the readiness probe. It returns the report kept by the health monitor,
+    with the database pool usage, the Redis ping latency and the event loop lag.
+    The checks themselves run at most every HEALTH_REFRESH_SECONDS, whatever the probe rate.
+
+    :return: The readiness report, with status 503 when the database or Redis is unavailable
+    :doc-author: Trelent
+    """
+    report = await monitor.get_report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
@@ -1,7 +1,5 @@
-import pickle
+from functools import lru_cache
 
-import cloudinary
-import cloudinary.uploader
 from fastapi import APIRouter, Depends, status, Path, Query, UploadFile, File
 from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.orm import Session
@@ -14,7 +12,23 @@ from src.conf.config import config
 from src.repository import users as repository_users
 
 router = APIRouter(prefix='/users', tags=['users'])
-cloudinary.config(cloud_name=config.CLD_NAME, api_key=config.CLD_API_KEY, api_secret=config.CLD_API_SECRET, secure=True)
+
+
+@lru_cache
+def get_cloudinary():
+    """
+    The get_cloudinary function imports and configures the cloudinary SDK on first use,
+    so that workers which never upload an avatar do not pay for it at startup.
+
+    :return: The configured cloudinary module
+    :doc-author: Trelent
+    """
+    import cloudinary
+    import cloudinary.uploader
+
+    cloudinary.config(cloud_name=config.CLD_NAME, api_key=config.CLD_API_KEY, api_secret=config.CLD_API_SECRET,
+                      secure=True)
+    return cloudinary
 
 
 @router.get("/me", response_model=UserResponse, dependencies=[Depends(RateLimiter(times=1, seconds=20))])
@@ -46,12 +60,12 @@ async def get_current_user(file: UploadFile = File(), user: User = Depends(auth_
     :return: A user object
     :doc-author: Trelent
     """
+    cloudinary = get_cloudinary()
     public_id = f"Web21/{user.email}"
     res = cloudinary.uploader.upload(file.file, public_id=public_id, owerite=True)
     print(res)
     res_url = cloudinary.CloudinaryImage(public_id).build_url(width=250, height=250, crop="fill",
                                                               version=res.get("version"))
     user = await repository_users.update_avatar_url(user.email, res_url, db)
-    auth_service.cache.set(user.email, pickle.dumps(user))
-    auth_service.cache.expire(user.email, 300)
+    auth_service.user_cache.set(user.email, user)
     return user
@@ -13,6 +13,7 @@ class ContactBase(BaseModel):
 
 class ContactResponse(ContactBase):
     id: int
+    phone_e164: str | None = None
     created_at: datetime
     created_at: datetime | None
     updated_at: datetime | None
@@ -20,6 +21,61 @@ class ContactResponse(ContactBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+# The fields a client may pick with ?fields=, the id is always returned
+CONTACT_FIELDS = tuple(ContactResponse.model_fields)
+CONTACT_BATCH_MAX_IDS = 1000
+CONTACT_MERGE_MAX_IDS = 100
+
+
+class ContactBatchRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=CONTACT_BATCH_MAX_IDS)
+
+
+class ContactBatchItem(BaseModel):
+    id: int
+    found: bool
+    contact: ContactResponse | None = None
+
+
+class DuplicateGroup(BaseModel):
+    contact_ids: list[int]
+    reasons: list[str]
+
+
+class DuplicateReport(BaseModel):
+    contacts: int
+    duplicates: int
+    groups: list[DuplicateGroup]
+
+
+class MergeRequest(BaseModel):
+    keep_id: int
+    merge_ids: list[int] = Field(min_length=1, max_length=CONTACT_MERGE_MAX_IDS)
+
+
+class PhoneLookupRequest(BaseModel):
+    numbers: list[str] = Field(min_length=1, max_length=1000)
+
+
+class PhoneLookupResult(BaseModel):
+    number: str
+    e164: str | None
+    contacts: list[ContactResponse]
+
+
+class DomainCount(BaseModel):
+    domain: str
+    contacts: int
+
+
+class ContactStats(BaseModel):
+    total: int
+    birthdays_by_month: dict[int, int]
+    email_domains: list[DomainCount]
+    added_last_7_days: int
+    added_last_30_days: int
+
+
 class UserSchema(BaseModel):
     username: str = Field(min_length=3, max_length=50)
     email: EmailStr
@@ -35,6 +91,14 @@ class UserResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class Principal(BaseModel):
+    id: int
+    email: str
+    confirmed: bool = False
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class TokenSchema(BaseModel):
     access_token: str
     refresh_token: str
@@ -0,0 +1,241 @@
+"""
+Build step and handler for the static files.
+
+The build copies every file of src/static to src/static/build under a name that contains a hash of its
+content, writes gzip and, when the brotli package is installed, brotli variants next to the text files,
+and records the names in manifest.json:
+
+    python -m src.services.assets
+
+Templates link to the hashed names through static_url, and PrecompressedStaticFiles serves them with
+the best variant the browser accepts and a one year immutable Cache-Control. Pages that depend on nothing
+but their template are rendered once by RenderedPage and served the same way.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+from functools import lru_cache
+from mimetypes import guess_type
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.templating import Jinja2Templates
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+STATIC_DIR = Path(__file__).parent.parent / "static"
+BUILD_DIR = STATIC_DIR / "build"
+MANIFEST = "manifest.json"
+HASH_LENGTH = 12
+COMPRESSIBLE = {".css", ".js", ".map", ".svg", ".json", ".txt", ".html"}
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_HASHED = re.compile(r"\.([0-9a-f]{%d})\.[^.]+$" % HASH_LENGTH)
+_SOURCE_MAP = re.compile(rb"(sourceMappingURL=)([^\s*]+)")
+# Preferred order when the browser accepts several encodings
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _compress(data: bytes) -> dict[str, bytes]:
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return variants
+
+
+def build(source: Path = STATIC_DIR, output: Path = BUILD_DIR) -> dict:
+    """
+    The build function writes the content-hashed copies of the static files and their compressed variants.
+        Source maps are built first, so that the sourceMappingURL comments of the CSS and JavaScript files
+        can point to the hashed map names. A variant is only kept when it is smaller than the original.
+
+    :param source: Path: The directory with the static files
+    :param output: Path: Where to write the build, it is emptied first
+    :return: The manifest, mapping each path relative to source to its hashed path
+    :doc-author: Trelent
+    """
+    shutil.rmtree(output, ignore_errors=True)
+    files = sorted((path for path in source.rglob("*") if path.is_file() and output not in path.parents),
+                   key=lambda path: (path.suffix != ".map", path.as_posix()))
+    manifest = {}
+    for path in files:
+        relative = path.relative_to(source).as_posix()
+        data = path.read_bytes()
+        if path.suffix in (".css", ".js"):
+            directory = path.parent.relative_to(source)
+
+            def hashed_map(match):
+                built = manifest.get((directory / match.group(2).decode()).as_posix())
+                return match.group(1) + (Path(built).name.encode() if built else match.group(2))
+
+            data = _SOURCE_MAP.sub(hashed_map, data)
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        target = output / path.parent.relative_to(source) / f"{path.stem}.{digest}{path.suffix}"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        if path.suffix in COMPRESSIBLE and len(data) >= MIN_COMPRESS_SIZE:
+            for suffix, compressed in _compress(data).items():
+                if len(compressed) < len(data):
+                    target.with_name(target.name + suffix).write_bytes(compressed)
+        manifest[relative] = target.relative_to(source).as_posix()
+    (output / MANIFEST).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+@lru_cache
+def load_manifest(directory: Path = BUILD_DIR) -> dict:
+    try:
+        return json.loads((directory / MANIFEST).read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def static_url(path: str) -> str:
+    """
+    The static_url function returns the URL of a static file, using its hashed name once the build has run.
+        Without a build, the original file is linked so that development needs no extra step.
+
+    :param path: str: The path of the file relative to src/static
+    :return: The URL of the file
+    :doc-author: Trelent
+    """
+    return "/static/" + load_manifest().get(path, path)
+
+
+def accepted_encodings(header: str) -> set[str]:
+    encodings = set()
+    for item in header.split(","):
+        name, *params = (part.strip() for part in item.split(";"))
+        q = next((param[2:] for param in params if param.startswith("q=")), "1")
+        try:
+            weight = float(q)
+        except ValueError:
+            weight = 0.0
+        if name and weight > 0:
+            encodings.add(name.lower())
+    return encodings
+
+
+@lru_cache(maxsize=1024)
+def _variants(full_path: str) -> dict[str, tuple[str, os.stat_result]]:
+    variants = {}
+    for encoding, suffix in _ENCODINGS:
+        try:
+            variants[encoding] = (full_path + suffix, os.stat(full_path + suffix))
+        except FileNotFoundError:
+            pass
+    return variants
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles for the output of the build step. Content-hashed files never change, so they are sent with an
+    immutable Cache-Control and their hash as ETag, and with the precompressed variant the client accepts.
+    Other files are served like StaticFiles does.
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        full_path = str(full_path)
+        hashed = _HASHED.search(os.path.basename(full_path))
+        if hashed is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        request_headers = Headers(scope=scope)
+        variants = _variants(full_path)
+        headers = {"cache-control": IMMUTABLE}
+        etag = hashed.group(1)
+        path = full_path
+        if variants:
+            headers["vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+            for encoding, _ in _ENCODINGS:
+                if encoding in accepted and encoding in variants:
+                    path, stat_result = variants[encoding]
+                    headers["content-encoding"] = encoding
+                    etag = f"{etag}-{encoding}"
+                    break
+        headers["etag"] = f'"{etag}"'
+
+        response = FileResponse(path, status_code=status_code, headers=headers, stat_result=stat_result,
+                                media_type=guess_type(full_path)[0] or "text/plain")
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def _not_modified(request_headers: Headers, etag: str) -> bool:
+    if_none_match = request_headers.get("if-none-match", "")
+    return etag in [tag.strip(" W/") for tag in if_none_match.split(",")]
+
+
+class RenderedPage:
+    """
+    A template without per-request context, rendered once with its compressed variants. The template file's
+    modification time is checked on every request and the page is rendered again when it changes.
+    Browsers revalidate the page with its ETag, so a changed page is picked up on the next load.
+    """
+
+    def __init__(self, templates: Jinja2Templates, name: str):
+        self.templates = templates
+        self.name = name
+        self._path = None
+        self._mtime = None
+        self._page = None
+
+    def current(self) -> tuple[str, dict[str | None, bytes]]:
+        """
+        The current function returns the rendered page, rendering it first if the template has changed.
+
+        :param self: Represent the instance of the class
+        :return: The content hash and the body for each encoding, None being the uncompressed one
+        :doc-author: Trelent
+        """
+        if self._path is None:
+            self._path = self.templates.get_template(self.name).filename
+        mtime = os.stat(self._path).st_mtime_ns
+        if mtime != self._mtime:
+            body = self.templates.get_template(self.name).render().encode()
+            variants = _compress(body)
+            bodies = {None: body}
+            for encoding, suffix in _ENCODINGS:
+                if len(variants.get(suffix, body)) < len(body):
+                    bodies[encoding] = variants[suffix]
+            self._page = (hashlib.sha256(body).hexdigest()[:HASH_LENGTH], bodies)
+            self._mtime = mtime
+        return self._page
+
+    def response(self, request: Request) -> Response:
+        """
+        The response function answers a request for the page with the best encoding the client accepts,
+        or with 304 Not Modified when the client already has it.
+
+        :param self: Represent the instance of the class
+        :param request: Request: The request for the page
+        :return: The response
+        :doc-author: Trelent
+        """
+        digest, bodies = self.current()
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((encoding for encoding, _ in _ENCODINGS if encoding in accepted and encoding in bodies), None)
+        etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+        headers = {"etag": etag, "cache-control": REVALIDATE, "vary": "Accept-Encoding"}
+        if _not_modified(request.headers, etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["content-encoding"] = encoding
+        return Response(bodies[encoding], media_type="text/html", headers=headers)
+
+
+if __name__ == "__main__":
+    built = build()
+    print(f"Built {len(built)} static files into {BUILD_DIR}")
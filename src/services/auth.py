@@ -1,25 +1,54 @@
 import redis
-import pickle
 from datetime import datetime, timedelta
 from typing import Optional
 
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
 from src.repository import users as repository_users
+from src.schemas import Principal
+from src.services.cache import SingleFlightCache
+from src.services.metrics import register_cache
+from src.services.passwords import password_context
 from src.conf.config import config
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = password_context(config.PASSWORD_BCRYPT_ROUNDS)
     SECRET_KEY = config.SECRET_KEY_JWT
     ALGORITHM = config.ALGORITHM
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
-    cache = redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
+
+    def __init__(self):
+        self._cache = None
+        self.user_cache = SingleFlightCache(ttl=config.AUTH_CACHE_TTL, jitter=config.AUTH_CACHE_TTL_JITTER,
+                                            beta=config.AUTH_CACHE_EARLY_REFRESH_BETA,
+                                            lock=config.AUTH_CACHE_REDIS_LOCK,
+                                            lock_timeout=config.AUTH_CACHE_LOCK_TIMEOUT,
+                                            client_factory=lambda: self.cache)
+
+    @property
+    def cache(self):
+        """
+        The cache property returns the Redis client of the auth cache.
+            The client is created on first use, so importing this module needs no Redis configuration
+            and every worker process builds its own connection pool.
+
+        :param self: Represent the instance of the class
+        :return: A Redis client
+        :doc-author: Trelent
+        """
+        if self._cache is None:
+            self._cache = redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0,
+                                      password=config.REDIS_PASSWORD)
+        return self._cache
+
+    @cache.setter
+    def cache(self, client):
+        self._cache = client
 
     def verify_password(self, plain_password, hashed_password):
         """
@@ -35,6 +64,20 @@ class Auth:
         """
         return self.pwd_context.verify(plain_password, hashed_password)
 
+    def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        The verify_and_update function checks a password and, when it matches a hash made under another
+        policy, hashes it again under the current one. Both steps are slow on purpose, so callers on the
+        event loop should run it in the threadpool.
+
+        :param self: Represent the instance of the class
+        :param plain_password: str: The password the user entered
+        :param hashed_password: str: The stored hash
+        :return: Whether the password matches, and the new hash to store or None
+        :doc-author: Trelent
+        """
+        return self.pwd_context.verify_and_update(plain_password, hashed_password)
+
     def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password as input and returns the hash of that password.
@@ -47,6 +90,22 @@ class Auth:
         """
         return self.pwd_context.hash(password)
 
+    def access_token_claims(self, user) -> dict:
+        """
+        The access_token_claims function builds the claims that are signed into an access token.
+        When JWT_EMBED_PRINCIPAL is enabled, the user id and the confirmed flag travel with the token,
+        so get_current_principal can authorize a request without a cache or database lookup.
+
+        :param self: Represent the instance of the class
+        :param user: User: The authenticated user
+        :return: A dictionary of claims for create_access_token
+        :doc-author: Trelent
+        """
+        claims = {"sub": user.email}
+        if config.JWT_EMBED_PRINCIPAL:
+            claims.update({"uid": user.id, "confirmed": bool(user.confirmed)})
+        return claims
+
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         to_encode = data.copy()
@@ -102,17 +161,13 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-
+    def decode_access_token(self, token: str) -> dict:
         """
-        The get_current_user function is a dependency that will be used in the
-            protected endpoints. It takes a token as an argument and returns the user
-            if it's valid, otherwise raises an HTTPException with status code 401.
+        The decode_access_token function checks the signature and the scope of an access token.
 
         :param self: Represent the instance of the class
-        :param token: str: Get the token from the request header
-        :param db: Session: Get the database session
-        :return: A user object
+        :param token: str: The access token from the request header
+        :return: The payload of the token
         :doc-author: Trelent
         """
         credentials_exception = HTTPException(
@@ -136,21 +191,63 @@ class Auth:
         except JWTError:
             raise credentials_exception
 
-        user_hash = str(email)
-        user = self.cache.get(user_hash)
+        return payload
 
-        if user is None:
-            print("User from database")
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
 
-            self.cache.set(user_hash, pickle.dumps(user))
-            self.cache.expire(user_hash, time=300)
-        else:
-            print("User from cache")
-            user = pickle.loads(user)
+        """
+        The get_current_user function is a dependency that will be used in the
+            protected endpoints. It takes a token as an argument and returns the user
+            if it's valid, otherwise raises an HTTPException with status code 401.
+
+        :param self: Represent the instance of the class
+        :param token: str: Get the token from the request header
+        :param db: Session: Get the database session
+        :return: A user object
+        :doc-author: Trelent
+        """
+        payload = self.decode_access_token(token)
+        return await self.load_user(payload["sub"], db)
+
+    async def get_current_principal(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+        """
+        The get_current_principal function is a lightweight alternative to get_current_user.
+            Tokens issued with embedded claims are answered from the token alone, without touching
+            the cache or the database. Older tokens that only carry the email fall back to a user lookup.
 
+        :param self: Represent the instance of the class
+        :param token: str: Get the token from the request header
+        :param db: Session: Get the database session, used only for tokens without embedded claims
+        :return: A principal with the user id, email and confirmed flag
+        :doc-author: Trelent
+        """
+        payload = self.decode_access_token(token)
+        if "uid" in payload:
+            return Principal(id=payload["uid"], email=payload["sub"], confirmed=payload.get("confirmed", False))
+        user = await self.load_user(payload["sub"], db)
+        return Principal.model_validate(user)
+
+    async def load_user(self, email: str, db: Session):
+        """
+        The load_user function returns the user with the given email, from the cache when possible.
+        Concurrent cache misses for the same email share a single database query.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email from the token
+        :param db: Session: Get the database session
+        :return: A user object
+        :doc-author: Trelent
+        """
+        async def load():
+            return await repository_users.get_user_by_email(email, db)
+
+        user = await self.user_cache.get_or_load(str(email), load)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
         return user
 
     def create_email_token(self, data: dict):
@@ -194,3 +291,4 @@ class Auth:
 
 
 auth_service = Auth()
+register_cache("auth_user", auth_service.user_cache)
@@ -0,0 +1,104 @@
+"""
+Daily birthday job.
+
+It rebuilds the upcoming_birthdays table that /api/contacts/search_by_birthday reads, then sends every
+confirmed user with upcoming birthdays one digest email, in batches with a pause in between so that the
+mail server is not flooded. Run it once a day shortly after midnight, for example from cron:
+
+    5 0 * * * cd /app && python -m src.services.birthdays
+"""
+import argparse
+import asyncio
+import time
+from datetime import date
+from itertools import groupby
+
+from sqlalchemy.orm import Session
+
+from src.conf.config import config
+from src.database.db import release_connection
+from src.repository import birthdays as repository_birthdays
+from src.services.email import send_birthday_digest
+
+
+async def send_digests(db: Session, today: date, batch_size: int, pause: float, send=send_birthday_digest,
+                       page_size: int = 1000) -> dict:
+    """
+    The send_digests function sends one digest per user, batch_size messages at a time.
+        The recipients are read page_size users at a time, and the transaction of each page ends before
+        its messages are sent, so no connection is held while the batches wait for the mail server.
+
+    :param db: Session: Pass the database session to the function
+    :param today: date: The day the upcoming_birthdays table was built for
+    :param batch_size: int: How many messages are sent concurrently
+    :param pause: float: Seconds to wait between two batches
+    :param send: The coroutine function that sends one digest
+    :param page_size: int: How many users are read from the database at a time
+    :return: The number of messages sent and failed
+    :doc-author: Trelent
+    """
+    counts = {"sent": 0, "failed": 0}
+    batch = []
+
+    async def send_batch():
+        for ok in await asyncio.gather(*batch):
+            counts["sent" if ok else "failed"] += 1
+        batch.clear()
+
+    after_user_id = 0
+    while rows := await repository_birthdays.get_digest_rows(db, today, after_user_id, page_size):
+        release_connection(db)
+        after_user_id = rows[-1][0]
+        for (user_id, email, username), group in groupby(rows, key=lambda row: tuple(row[:3])):
+            birthdays = [{"name": name, "fullname": fullname, "birthday_on": birthday_on}
+                         for *_, name, fullname, birthday_on in group]
+            batch.append(send(email, username, birthdays))
+            if len(batch) == batch_size:
+                await send_batch()
+                await asyncio.sleep(pause)
+    release_connection(db)
+    if batch:
+        await send_batch()
+    return counts
+
+
+async def run(db: Session, today: date, days: int, batch_size: int, pause: float, send_emails: bool = True) -> dict:
+    """
+    The run function rebuilds the upcoming birthdays and sends the digests.
+
+    :param db: Session: Pass the database session to the function
+    :param today: date: The first day of the window
+    :param days: int: How many days after today the window covers
+    :param batch_size: int: How many messages are sent concurrently
+    :param pause: float: Seconds to wait between two batches
+    :param send_emails: bool: Send the digests after the rebuild
+    :return: The number of upcoming birthdays, the time the rebuild took and the message counts
+    :doc-author: Trelent
+    """
+    start = time.perf_counter()
+    rows = await repository_birthdays.materialize_upcoming_birthdays(db, today, days)
+    report = {"birthdays": rows, "materialize_seconds": time.perf_counter() - start, "sent": 0, "failed": 0}
+    if send_emails:
+        report.update(await send_digests(db, today, batch_size, pause))
+    return report
+
+
+def main():
+    from src.database.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today(), help="the first day of the window")
+    parser.add_argument("--days", type=int, default=config.BIRTHDAY_WINDOW_DAYS)
+    parser.add_argument("--batch-size", type=int, default=config.BIRTHDAY_DIGEST_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=config.BIRTHDAY_DIGEST_PAUSE_SECONDS)
+    parser.add_argument("--no-email", action="store_true", help="only rebuild the table")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        report = asyncio.run(run(db, args.date, args.days, args.batch_size, args.pause, not args.no_email))
+    print(f"{report['birthdays']} upcoming birthdays in {report['materialize_seconds']:.2f} s, "
+          f"{report['sent']} digests sent, {report['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
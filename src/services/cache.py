@@ -0,0 +1,193 @@
+import asyncio
+import math
+import pickle
+import random
+import time
+import uuid
+
+# Deletes the lock only while it still holds our token, in one step, so a lock that expired and was taken
+# by another worker meanwhile is left alone
+RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LoadAbandoned(Exception):
+    """
+    Set on the shared load of a key when the caller running it is cancelled, the callers waiting for it retry.
+    """
+
+
+class SingleFlightCache:
+    """
+    Read-through cache on top of a Redis client.
+
+    Concurrent misses for the same key share one load per worker, and with lock=True the workers
+    also agree through a short Redis lock on who loads. Entries get a jittered TTL and are refreshed
+    early with a probability that grows as they approach expiry (XFetch), so hot keys do not all
+    expire at the same moment.
+    """
+
+    def __init__(self, client=None, ttl: int = 300, jitter: float = 0.1, beta: float = 1.0,
+                 lock: bool = False, lock_timeout: float = 5.0, client_factory=None):
+        self._client = client
+        self._client_factory = client_factory
+        self.ttl = ttl
+        self.jitter = jitter
+        self.beta = beta
+        self.lock = lock
+        self.lock_timeout = lock_timeout
+        self.hits = 0
+        self.misses = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def client(self):
+        """
+        The client property returns the Redis client, created by client_factory on first use.
+
+        :param self: Represent the instance of the class
+        :return: The Redis client
+        :doc-author: Trelent
+        """
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def get(self, key: str):
+        """
+        The get function returns the cached entry for a key as a (value, delta, expires_at) tuple.
+
+        :param self: Represent the instance of the class
+        :param key: str: The cache key
+        :return: The cached entry, or None if the key is missing or holds data in another format
+        :doc-author: Trelent
+        """
+        data = self.client.get(key)
+        if data is None:
+            return None
+        entry = pickle.loads(data)
+        if not isinstance(entry, tuple) or len(entry) != 3:
+            return None
+        return entry
+
+    def set(self, key: str, value, delta: float = 0.0):
+        """
+        The set function stores a value with a jittered TTL.
+
+        :param self: Represent the instance of the class
+        :param key: str: The cache key
+        :param value: The value to store, it must be picklable
+        :param delta: float: How long the value took to load, in seconds
+        :return: None
+        :doc-author: Trelent
+        """
+        ttl = self.ttl * (1 - self.jitter * random.random())
+        self.client.set(key, pickle.dumps((value, delta, time.time() + ttl)), px=max(int(ttl * 1000), 1))
+
+    def delete(self, key: str):
+        """
+        The delete function removes a key from the cache.
+
+        :param self: Represent the instance of the class
+        :param key: str: The cache key
+        :return: None
+        :doc-author: Trelent
+        """
+        self.client.delete(key)
+
+    def should_refresh(self, delta: float, expires_at: float) -> bool:
+        """
+        The should_refresh function decides whether an entry that has not expired yet is refreshed now.
+        Entries that were slow to load and are close to expiry are the most likely to be refreshed.
+
+        :param self: Represent the instance of the class
+        :param delta: float: How long the value took to load, in seconds
+        :param expires_at: float: The unix time when the entry expires
+        :return: True if the caller should reload the value
+        :doc-author: Trelent
+        """
+        return time.time() - delta * self.beta * math.log(1.0 - random.random()) >= expires_at
+
+    async def get_or_load(self, key: str, loader):
+        """
+        The get_or_load function returns the cached value for a key, loading it with loader on a miss.
+        Only one load per key runs at a time in this worker, the other callers wait for its result.
+        A caller that decides to refresh early while another refresh is running gets the cached value.
+
+        :param self: Represent the instance of the class
+        :param key: str: The cache key
+        :param loader: An async callable that returns the value, or None if there is nothing to cache
+        :return: The cached or loaded value
+        :doc-author: Trelent
+        """
+        entry = self.get(key)
+        if entry is not None:
+            value, delta, expires_at = entry
+            if key in self._inflight or not self.should_refresh(delta, expires_at):
+                self.hits += 1
+                return value
+        self.misses += 1
+
+        # A waiter is cancelled only with its own request, when the loader is cancelled one of the waiters
+        # takes the load over and the others wait for it
+        future = self._inflight.get(key)
+        while future is not None:
+            try:
+                return await asyncio.shield(future)
+            except LoadAbandoned:
+                future = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load(key, loader)
+        except asyncio.CancelledError:
+            future.set_exception(LoadAbandoned(key))
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when no one else is waiting for it
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    async def _load(self, key: str, loader):
+        if not self.lock:
+            return await self._load_and_set(key, loader)
+
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        if self.client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000)):
+            try:
+                return await self._load_and_set(key, loader)
+            finally:
+                self.client.register_script(RELEASE_LOCK)(keys=[lock_key], args=[token])
+
+        # Another worker is loading the key, wait for its result
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            entry = self.get(key)
+            if entry is not None:
+                return entry[0]
+        return await self._load_and_set(key, loader)
+
+    async def _load_and_set(self, key: str, loader):
+        start = time.perf_counter()
+        value = await loader()
+        if value is not None:
+            self.set(key, value, time.perf_counter() - start)
+        return value
@@ -0,0 +1,143 @@
+import gzip
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from src.services.assets import accepted_encodings
+from src.services.metrics import HTTP_COMPRESSED_RESPONSES, HTTP_COMPRESSION_SAVED_BYTES, HTTP_COMPRESSION_SKIPPED
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Formats that are compressed already, compressing them again costs CPU and saves nothing
+COMPRESSED_TYPES = ("image/", "video/", "audio/", "font/woff", "application/zip", "application/gzip",
+                    "application/x-gzip", "application/pdf", "application/octet-stream")
+# Formats whose bodies are sent in chunks as they are produced, buffering them would delay every event
+STREAMING_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses response bodies with brotli or gzip, whichever the client prefers
+    and the server supports. Bodies below minimum_size, bodies that are encoded already (like the
+    precompressed static files), streamed bodies and formats that are compressed by nature pass through.
+    Bodies of thread_size bytes or more are compressed in a worker thread, so the event loop keeps serving
+    other requests meanwhile.
+    """
+
+    def __init__(self, app, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4,
+                 thread_size: int = 65536):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.thread_size = thread_size
+
+    def choose_encoding(self, scope) -> str | None:
+        """
+        The choose_encoding function picks the encoding of the response from the Accept-Encoding header.
+
+        :param self: Represent the instance of the class
+        :param scope: The ASGI scope of the request
+        :return: "br", "gzip", or None when the client accepts neither
+        :doc-author: Trelent
+        """
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        """
+        The compress function encodes a body with the configured level.
+
+        :param self: Represent the instance of the class
+        :param encoding: str: "br" or "gzip"
+        :param body: bytes: The response body
+        :return: The compressed body
+        :doc-author: Trelent
+        """
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    @staticmethod
+    def skip_reason(headers: Headers) -> str | None:
+        if "content-encoding" in headers:
+            return "encoded"
+        if "content-range" in headers:
+            return "range"
+        content_type = headers.get("content-type", "").lower()
+        if content_type.startswith(STREAMING_TYPES):
+            return "streaming"
+        if content_type.startswith(COMPRESSED_TYPES) and not content_type.startswith("image/svg"):
+            return "content_type"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passing = False
+
+        async def skip(reason: str, message):
+            nonlocal start, passing
+            HTTP_COMPRESSION_SKIPPED.labels(reason).inc()
+            passing = True
+            if start is not None:
+                await send(start)
+                start = None
+            await send(message)
+
+        async def send_wrapper(message):
+            nonlocal start
+            if passing:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                reason = self.skip_reason(Headers(raw=message.get("headers", [])))
+                if reason is not None:
+                    await skip(reason, message)
+                else:
+                    start = message
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                await skip("streaming", message)
+                return
+            if len(body) < self.minimum_size:
+                await skip("small", message)
+                return
+            if len(body) >= self.thread_size:
+                compressed = await run_in_threadpool(self.compress, encoding, body)
+            else:
+                compressed = self.compress(encoding, body)
+            if len(compressed) >= len(body):
+                await skip("incompressible", message)
+                return
+
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            # The compressed body is another representation, so a strong validator no longer matches it byte for byte
+            etag = headers.get("etag")
+            if etag is not None and not etag.startswith("W/"):
+                headers["etag"] = "W/" + etag
+            HTTP_COMPRESSED_RESPONSES.labels(encoding).inc()
+            HTTP_COMPRESSION_SAVED_BYTES.labels(encoding).inc(len(body) - len(compressed))
+            await send({**start, "headers": headers.raw})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
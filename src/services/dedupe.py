@@ -0,0 +1,185 @@
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Iterable
+
+from src.schemas import DuplicateGroup
+from src.services.phones import to_e164
+
+NAME_SIMILARITY = 0.85
+# Each name is compared with this many following names of its birthday block, sorted by name
+NAME_WINDOW = 8
+# No group grows beyond this many contacts, and an email or phone shared by more contacts is a placeholder
+# such as an office switchboard, not a person
+MAX_GROUP_SIZE = 20
+GMAIL_DOMAINS = {"gmail.com", "googlemail.com"}
+_NOT_LETTER = re.compile(r"[^\w]+|[\d_]+")
+
+
+def normalize_email(email: str | None) -> str | None:
+    """
+    The normalize_email function turns the spellings of one mailbox into one key.
+        Case and surrounding spaces never matter, and Gmail also ignores dots and +tags in the local part.
+
+    :param email: str: The email address
+    :return: The normalized address, or None when there is none
+    :doc-author: Trelent
+    """
+    if not email:
+        return None
+    local, _, domain = email.strip().casefold().rpartition("@")
+    if domain in GMAIL_DOMAINS:
+        local = local.split("+", 1)[0].replace(".", "")
+        domain = "gmail.com"
+    return f"{local}@{domain}" if local else None
+
+
+def normalize_phone(phone: str | None) -> str | None:
+    """
+    The normalize_phone function keys a phone number by its E.164 form, so that the national and the
+        international spelling of a number, with or without separators, share the key.
+
+    :param phone: str: The phone number as entered
+    :return: The key, or None when the number is not a valid phone number
+    :doc-author: Trelent
+    """
+    return to_e164(phone)
+
+
+def normalize_name(name: str | None) -> str:
+    """
+    The normalize_name function reduces a name to lowercase letters without accents, with the words sorted,
+        so that "Shevchenko Olena" and "olena shevchenko" are the same name.
+
+    :param name: str: The full name
+    :return: The normalized name
+    :doc-author: Trelent
+    """
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return " ".join(sorted(_NOT_LETTER.sub(" ", text).split()))
+
+
+def _similar(matcher: SequenceMatcher, a: str, threshold: float) -> bool:
+    # The matcher already holds the other name as seq2, which is the expensive side to prepare
+    b = matcher.b
+    if a == b:
+        return True
+    if 2 * min(len(a), len(b)) < threshold * (len(a) + len(b)):
+        return False
+    matcher.set_seq1(a)
+    return matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
+
+def similar_names(a: str, b: str, threshold: float = NAME_SIMILARITY) -> bool:
+    """
+    The similar_names function compares two normalized names with difflib's ratio.
+
+    :param a: str: A normalized name
+    :param b: str: Another normalized name
+    :param threshold: float: The minimum ratio
+    :return: True if the names are at least threshold similar
+    :doc-author: Trelent
+    """
+    return _similar(SequenceMatcher(None, "", b, autojunk=False), a, threshold)
+
+
+class UnionFind:
+    """
+    Disjoint sets over 0..n-1 with path halving and union by size.
+    """
+
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> int:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+
+def find_duplicates(candidates: Iterable, name_similarity: float = NAME_SIMILARITY,
+                    window: int = NAME_WINDOW, max_group: int = MAX_GROUP_SIZE) -> list[DuplicateGroup]:
+    """
+    The find_duplicates function groups the contacts that describe the same person.
+
+        Contacts are first put into blocks that share a key, so only contacts within a block are compared:
+            - the same normalized email,
+            - the same normalized phone number,
+            - the same birthday, where the names must also be similar.
+        Email and phone blocks are merged without comparisons. Birthday blocks are sorted by name and each
+        name is compared with the next window names only. The work is therefore linear in the number of
+        contacts. Groups that share a contact are joined with a union-find, unless the joined group would
+        hold more than max_group contacts, and email and phone blocks larger than that are skipped, so that
+        one shared address cannot chain a whole address book into a single group.
+
+    :param candidates: Iterable: The contacts of one user, with id, fullname, email, phone_number and birthday
+    :param name_similarity: float: The minimum SequenceMatcher ratio of two names
+    :param window: int: How many following names each name is compared with
+    :param max_group: int: The most contacts a group may hold
+    :return: The groups of two or more contacts, largest first, with the keys that matched
+    :doc-author: Trelent
+    """
+    candidates = list(candidates)
+    sets = UnionFind(len(candidates))
+    reasons = defaultdict(set)
+    blocks = {"email": defaultdict(list), "phone": defaultdict(list), "name": defaultdict(list)}
+    names = []
+    for i, candidate in enumerate(candidates):
+        email, phone = normalize_email(candidate.email), normalize_phone(candidate.phone_number)
+        names.append(normalize_name(candidate.fullname))
+        if email:
+            blocks["email"][email].append(i)
+        if phone:
+            blocks["phone"][phone].append(i)
+        if candidate.birthday is not None and names[i]:
+            blocks["name"][candidate.birthday].append(i)
+
+    pairs = []
+    for reason in ("email", "phone"):
+        for members in blocks[reason].values():
+            if len(members) > max_group:
+                continue
+            pairs.extend((members[0], other, reason) for other in members[1:])
+    matcher = SequenceMatcher(None, autojunk=False)
+    for members in blocks["name"].values():
+        if len(members) < 2:
+            continue
+        members.sort(key=names.__getitem__)
+        for position, i in enumerate(members[:-1]):
+            matcher.set_seq2(names[i])
+            for j in members[position + 1:position + 1 + window]:
+                if _similar(matcher, names[j], name_similarity):
+                    pairs.append((i, j, "name"))
+
+    for i, j, reason in pairs:
+        a, b = sets.find(i), sets.find(j)
+        if a != b and sets.size[a] + sets.size[b] > max_group:
+            continue
+        sets.union(a, b)
+        reasons[i].add(reason)
+        reasons[j].add(reason)
+
+    groups = defaultdict(list)
+    for i in range(len(candidates)):
+        if sets.size[sets.find(i)] > 1:
+            groups[sets.find(i)].append(i)
+    result = [DuplicateGroup(contact_ids=sorted(candidates[i].id for i in members),
+                             reasons=sorted(set().union(*(reasons[i] for i in members))))
+              for members in groups.values()]
+    result.sort(key=lambda group: (-len(group.contact_ids), group.contact_ids[0]))
+    return result
@@ -1,25 +1,37 @@
+from functools import lru_cache
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
 from src.conf.config import config
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=config.MAIL_USERNAME,
-    MAIL_PASSWORD=config.MAIL_PASSWORD,
-    MAIL_FROM=config.MAIL_FROM,
-    MAIL_PORT=config.MAIL_PORT,
-    MAIL_SERVER=config.MAIL_SERVER,
-    MAIL_FROM_NAME="TODO Systems",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+
+@lru_cache
+def get_connection_config():
+    """
+    The get_connection_config function builds the mail connection settings on first use.
+    fastapi_mail is imported here and not at module level, because it is slow to import and only
+    the requests that send mail need it.
+
+    :return: The ConnectionConfig for FastMail
+    :doc-author: Trelent
+    """
+    from fastapi_mail import ConnectionConfig
+
+    return ConnectionConfig(
+        MAIL_USERNAME=config.MAIL_USERNAME,
+        MAIL_PASSWORD=config.MAIL_PASSWORD,
+        MAIL_FROM=config.MAIL_FROM,
+        MAIL_PORT=config.MAIL_PORT,
+        MAIL_SERVER=config.MAIL_SERVER,
+        MAIL_FROM_NAME="TODO Systems",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=True,
+        USE_CREDENTIALS=True,
+        VALIDATE_CERTS=True,
+        TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+    )
 
 
 async def send_email(email: EmailStr, username: str, host: str):
@@ -36,6 +48,9 @@ async def send_email(email: EmailStr, username: str, host: str):
     :return: A coroutine, which is a special type of object that can be used with await or yield from
     :doc-author: Trelent
     """
+    from fastapi_mail import FastMail, MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
     try:
         token_verification = auth_service.create_email_token({"sub": email})
         message = MessageSchema(
@@ -45,7 +60,36 @@ async def send_email(email: EmailStr, username: str, host: str):
             subtype=MessageType.html
         )
 
-        fm = FastMail(conf)
+        fm = FastMail(get_connection_config())
         await fm.send_message(message, template_name="verify_email.html")
     except ConnectionErrors as err:
         print(err)
+
+
+async def send_birthday_digest(email: EmailStr, username: str, birthdays: list[dict]) -> bool:
+    """
+    The send_birthday_digest function sends a user the list of their contacts with a birthday in the coming days.
+
+    :param email: EmailStr: Specify the email address of the recipient
+    :param username: str: Pass the username to the template
+    :param birthdays: list[dict]: The name, fullname and birthday date of each contact
+    :return: True if the message was handed to the mail server
+    :doc-author: Trelent
+    """
+    from fastapi_mail import FastMail, MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
+    try:
+        message = MessageSchema(
+            subject="Upcoming birthdays",
+            recipients=[email],
+            template_body={"username": username, "birthdays": birthdays},
+            subtype=MessageType.html
+        )
+
+        fm = FastMail(get_connection_config())
+        await fm.send_message(message, template_name="birthday_digest.html")
+        return True
+    except ConnectionErrors as err:
+        print(err)
+        return False
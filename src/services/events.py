@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import EmailOpenEvent
+from src.services.metrics import EVENTS_BUFFERED, EVENTS_DROPPED, EVENTS_FLUSH_LATENCY, EVENTS_RECORDED
+
+logger = logging.getLogger(__name__)
+
+
+class OpenEventRecorder:
+    """
+    Buffers email open events in memory and writes them behind the requests, one multi-row insert per
+    flush. A flush happens when batch_size events are waiting or every flush_seconds, whichever comes first,
+    so an open costs the pixel request no database work at all. The buffer holds at most max_buffered
+    events: when the database falls behind, new events are dropped and counted instead of growing the
+    worker's memory. After a failed write the next one waits flush_seconds, however many events arrive
+    meanwhile. Events still buffered when a worker is killed without a shutdown are lost.
+    """
+
+    def __init__(self, session_factory: sessionmaker, batch_size: int = 500, flush_seconds: float = 5.0,
+                 max_buffered: int = 10000):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffered = max_buffered
+        self.buffer = deque()
+        self.dropped = 0
+        self.retry_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def record(self, username: str, user_agent: str | None, opened_at: datetime | None = None) -> bool:
+        """
+        The record function adds one open to the buffer. It never waits and never touches the database.
+
+        :param self: Represent the instance of the class
+        :param username: str: The user whose email was opened
+        :param user_agent: str | None: The User-Agent header of the request, cut to the column size
+        :param opened_at: datetime | None: When the email was opened, now by default
+        :return: False when the buffer is full and the event was dropped
+        :doc-author: Trelent
+        """
+        if len(self.buffer) >= self.max_buffered:
+            self.dropped += 1
+            EVENTS_DROPPED.labels("email_open", "buffer_full").inc()
+            return False
+        self.buffer.append({"username": username[:50],
+                            "user_agent": user_agent[:255] if user_agent else None,
+                            "opened_at": opened_at or datetime.utcnow()})
+        EVENTS_RECORDED.labels("email_open").inc()
+        EVENTS_BUFFERED.labels("email_open").set(len(self.buffer))
+        if len(self.buffer) >= self.batch_size and time.monotonic() >= self.retry_at:
+            self._wakeup.set()
+        return True
+
+    def _write(self, rows: list[dict]):
+        with self.session_factory() as db:
+            db.execute(insert(EmailOpenEvent), rows)
+            db.commit()
+
+    async def flush(self) -> int:
+        """
+        The flush function writes the buffered events in batches of batch_size, in a worker thread.
+            A batch that fails to write goes back to the front of the buffer, as far as there is room,
+            and is retried flush_seconds later.
+
+        :param self: Represent the instance of the class
+        :return: The number of events written
+        :doc-author: Trelent
+        """
+        written = 0
+        async with self._lock:
+            while self.buffer:
+                rows = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                start = time.perf_counter()
+                try:
+                    await asyncio.to_thread(self._write, rows)
+                except Exception:
+                    logger.exception("Could not write %d email open events", len(rows))
+                    # Full batches must not wake the flush for every open while the database is down
+                    self.retry_at = time.monotonic() + self.flush_seconds
+                    self._wakeup.clear()
+                    room = max(self.max_buffered - len(self.buffer), 0)
+                    self.buffer.extendleft(reversed(rows[:room]))
+                    if len(rows) > room:
+                        self.dropped += len(rows) - room
+                        EVENTS_DROPPED.labels("email_open", "write_failed").inc(len(rows) - room)
+                    break
+                finally:
+                    EVENTS_BUFFERED.labels("email_open").set(len(self.buffer))
+                EVENTS_FLUSH_LATENCY.observe(time.perf_counter() - start)
+                written += len(rows)
+        return written
+
+    async def _flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        """
+        The start function starts the background flush.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        # An event is bound to the loop that first waits on it, so every start gets a new one
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_forever())
+
+    async def stop(self):
+        """
+        The stop function stops the background flush and writes what is still buffered.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
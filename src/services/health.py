@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from src.services.metrics import pool_status
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """
+    Keeps a readiness report that is refreshed in the background at most every interval seconds,
+    so that frequent orchestrator probes never reach the database or Redis themselves.
+    """
+
+    def __init__(self, engine: Engine, redis_factory, interval: float = 5.0, lag_interval: float = 0.5):
+        self.engine = engine
+        self.redis_factory = redis_factory
+        self.interval = interval
+        self.lag_interval = lag_interval
+        self.report = None
+        self.refreshed_at = 0.0
+        self.loop_lag = None
+        self._lock = asyncio.Lock()
+        self._tasks = []
+
+    def _check_database(self) -> dict:
+        start = time.perf_counter()
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            result = {"ok": True, "latency_ms": (time.perf_counter() - start) * 1000}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        result["pool"] = pool_status(self.engine)
+        return result
+
+    def _check_redis(self) -> dict:
+        start = time.perf_counter()
+        try:
+            self.redis_factory().ping()
+            return {"ok": True, "latency_ms": (time.perf_counter() - start) * 1000}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    async def refresh(self) -> dict:
+        """
+        The refresh function runs the checks in worker threads and stores a new report.
+
+        :param self: Represent the instance of the class
+        :return: The new report
+        :doc-author: Trelent
+        """
+        database, redis = await asyncio.gather(asyncio.to_thread(self._check_database),
+                                               asyncio.to_thread(self._check_redis))
+        self.report = {
+            "ready": database["ok"] and redis["ok"],
+            "database": database,
+            "redis": redis,
+            "event_loop_lag_ms": None if self.loop_lag is None else self.loop_lag * 1000,
+        }
+        self.refreshed_at = time.monotonic()
+        return self.report
+
+    async def get_report(self) -> dict:
+        """
+        The get_report function returns the latest report with its age. When the background task is not
+        running or has fallen behind, one caller refreshes the report and the others wait for it.
+
+        :param self: Represent the instance of the class
+        :return: The readiness report
+        :doc-author: Trelent
+        """
+        if self.report is None or time.monotonic() - self.refreshed_at > self.interval:
+            async with self._lock:
+                if self.report is None or time.monotonic() - self.refreshed_at > self.interval:
+                    await self.refresh()
+        return {**self.report, "age_seconds": round(time.monotonic() - self.refreshed_at, 3)}
+
+    async def _refresh_forever(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Could not refresh the readiness report")
+            await asyncio.sleep(self.interval)
+
+    async def _measure_loop_lag(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag = max(time.perf_counter() - start - self.lag_interval, 0.0)
+
+    def start(self):
+        """
+        The start function starts the background refresh and the event loop lag probe.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self._tasks = [asyncio.create_task(self._refresh_forever()), asyncio.create_task(self._measure_loop_lag())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,372 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from starlette.routing import Mount
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        """
+        The labels function returns the child metric for a combination of label values.
+        Callers on hot paths should keep the child instead of calling labels for every observation.
+
+        :param self: Represent the instance of the class
+        :param values: The label values, in the order of labelnames
+        :return: The child metric
+        :doc-author: Trelent
+        """
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        The _new_child function creates the value kept for one combination of label values.
+
+        :param self: Represent the instance of the class
+        :return: The new child metric
+        :doc-author: Trelent
+        """
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self, name: str, labelnames: tuple, values: tuple) -> list[str]:
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class _HistogramValue:
+
+    def __init__(self, buckets: tuple):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name: str, labelnames: tuple, values: tuple) -> list[str]:
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {total}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {total}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+class Registry:
+    """
+    A small Prometheus registry. Metrics are rendered in the text exposition format,
+    collectors are called at scrape time to refresh gauges that are cheaper to read than to track.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        """
+        The render function returns every registered metric in the Prometheus text format.
+
+        :param self: Represent the instance of the class
+        :return: The exposition text
+        :doc-author: Trelent
+        """
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests being processed", ("method",)))
+HTTP_COMPRESSED_RESPONSES = registry.register(Counter(
+    "http_compressed_responses_total", "Responses compressed by the compression middleware", ("encoding",)))
+HTTP_COMPRESSION_SAVED_BYTES = registry.register(Counter(
+    "http_compression_saved_bytes_total", "Response body bytes saved by compression", ("encoding",)))
+HTTP_COMPRESSION_SKIPPED = registry.register(Counter(
+    "http_compression_skipped_total", "Responses the compression middleware left alone, by reason", ("reason",)))
+DB_QUERIES = registry.register(Counter(
+    "db_queries_total", "SQL statements executed"))
+DB_QUERY_LATENCY = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)))
+DB_POOL_CHECKOUT = registry.register(Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a connection from the pool",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)))
+DB_POOL_TIMEOUTS = registry.register(Counter(
+    "db_pool_timeouts_total", "Connection requests that gave up waiting for the pool", ("pool",)))
+DB_POOL_SIZE = registry.register(Gauge(
+    "db_pool_size", "Configured number of persistent connections", ("pool",)))
+DB_POOL_CHECKED_OUT = registry.register(Gauge(
+    "db_pool_checked_out", "Connections currently in use", ("pool",)))
+DB_POOL_CHECKED_IN = registry.register(Gauge(
+    "db_pool_checked_in", "Idle connections kept by the pool", ("pool",)))
+DB_POOL_OVERFLOW = registry.register(Gauge(
+    "db_pool_overflow", "Connections opened above the pool size, negative while the pool is not full", ("pool",)))
+CACHE_REQUESTS = registry.register(Counter(
+    "cache_requests_total", "Cache lookups by result", ("cache", "result")))
+CACHE_HIT_RATIO = registry.register(Gauge(
+    "cache_hit_ratio", "Share of cache lookups that were hits", ("cache",)))
+EVENTS_RECORDED = registry.register(Counter(
+    "events_recorded_total", "Events accepted into the write-behind buffer", ("event",)))
+EVENTS_DROPPED = registry.register(Counter(
+    "events_dropped_total", "Events lost before reaching the database, by reason", ("event", "reason")))
+EVENTS_BUFFERED = registry.register(Gauge(
+    "events_buffered", "Events waiting in the write-behind buffer", ("event",)))
+EVENTS_FLUSH_LATENCY = registry.register(Histogram(
+    "events_flush_seconds", "Time to write one batch of buffered events"))
+
+_caches = {}
+_engines = {}
+
+
+def register_cache(name: str, cache):
+    """
+    The register_cache function exports the hit and miss counters of a SingleFlightCache.
+
+    :param name: str: The cache label
+    :param cache: SingleFlightCache: The cache to report
+    :return: The cache
+    :doc-author: Trelent
+    """
+    _caches[name] = cache
+    return cache
+
+
+@registry.add_collector
+def _collect_caches():
+    for name, cache in _caches.items():
+        CACHE_REQUESTS.labels(name, "hit").set(cache.hits)
+        CACHE_REQUESTS.labels(name, "miss").set(cache.misses)
+        total = cache.hits + cache.misses
+        CACHE_HIT_RATIO.labels(name).set(cache.hits / total if total else 0.0)
+
+
+def pool_status(engine: Engine) -> dict:
+    """
+    The pool_status function describes the connection pool of an engine.
+    Pools without a fixed size, such as NullPool or StaticPool, only report their class.
+
+    :param engine: Engine: The engine to inspect
+    :return: The pool class and, when the pool has them, its size, checked out connections and overflow
+    :doc-author: Trelent
+    """
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if method is not None:
+            status[name] = method()
+    return status
+
+
+@registry.add_collector
+def _collect_pools():
+    for name, engine in _engines.items():
+        status = pool_status(engine)
+        for gauge, key in ((DB_POOL_SIZE, "size"), (DB_POOL_CHECKED_OUT, "checkedout"),
+                           (DB_POOL_CHECKED_IN, "checkedin"), (DB_POOL_OVERFLOW, "overflow")):
+            if key in status:
+                gauge.labels(name).set(status[key])
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    DB_QUERIES.inc()
+    DB_QUERY_LATENCY.observe(time.perf_counter() - context._metrics_start)
+
+
+def instrument_engine(engine: Engine, name: str = "primary") -> Engine:
+    """
+    The instrument_engine function records how long the engine waits for a pool connection,
+    counts pool timeouts and exports the state of the pool at scrape time.
+    Statement counts and timings are collected for every engine through engine events.
+
+    :param engine: Engine: The engine to instrument
+    :param name: str: The pool label
+    :return: The same engine
+    :doc-author: Trelent
+    """
+    raw_connection = engine.raw_connection
+    timeouts = DB_POOL_TIMEOUTS.labels(name)
+
+    def timed_raw_connection():
+        start = time.perf_counter()
+        try:
+            return raw_connection()
+        except PoolTimeoutError:
+            timeouts.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT.observe(time.perf_counter() - start)
+
+    engine.raw_connection = timed_raw_connection
+    _engines[name] = engine
+    return engine
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records request latency per route template and the requests in flight.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        in_flight = REQUESTS_IN_FLIGHT.labels(method)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(method, route_name(scope), status_code).observe(time.perf_counter() - start)
+
+
+def route_name(scope) -> str:
+    """
+    The route_name function returns a low-cardinality name for the route that handled a request.
+
+    :param scope: The ASGI scope after routing
+    :return: The route template, the path of the mount that served it, or "unmatched"
+    :doc-author: Trelent
+    """
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        # Mounted apps like the static files set no route, the mount they are served from names them
+        for mount in getattr(scope.get("app"), "routes", ()):
+            if isinstance(mount, Mount) and mount.app is endpoint:
+                return mount.path
+    return "unmatched"
@@ -0,0 +1,93 @@
+"""
+Password hashing policy and the calibration of its bcrypt cost factor.
+
+Every extra round doubles the time of a hash. The calibration measures the hash time on this machine for
+growing costs and recommends the highest one that stays within PASSWORD_HASH_TARGET_MS:
+
+    python -m src.services.passwords
+    python -m src.services.passwords --target-ms 100
+
+Put the result in PASSWORD_BCRYPT_ROUNDS. Hashes made with another cost are replaced on the next login.
+"""
+import argparse
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+from src.conf.config import config
+
+# bcrypt cost factors below 10 are too cheap to slow down offline guessing, above 16 a login takes seconds
+CALIBRATION_MIN_ROUNDS = 10
+CALIBRATION_MAX_ROUNDS = 16
+
+
+def password_context(rounds: int) -> CryptContext:
+    """
+    The password_context function builds the passlib context of the hashing policy.
+        Hashes with any other cost than rounds, cheaper or more expensive, need an update.
+
+    :param rounds: int: The bcrypt cost factor
+    :return: The passlib context
+    :doc-author: Trelent
+    """
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=rounds,
+                        bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+
+
+def hash_time(rounds: int, samples: int = 3) -> float:
+    """
+    The hash_time function measures how long one hash with the given cost takes on this machine.
+
+    :param rounds: int: The bcrypt cost factor
+    :param samples: int: How many hashes to time
+    :return: The median time of a hash in seconds
+    :doc-author: Trelent
+    """
+    context = password_context(rounds)
+    durations = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration password")
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def calibrate(target_ms: float, samples: int = 3, min_rounds: int = CALIBRATION_MIN_ROUNDS,
+              max_rounds: int = CALIBRATION_MAX_ROUNDS) -> tuple[int, dict[int, float]]:
+    """
+    The calibrate function picks the cost factor for a target hash time.
+        Costs are measured from min_rounds up until one takes longer than the target, so the slowest cost
+        measured is at most about twice the target.
+
+    :param target_ms: float: The longest acceptable hash time in milliseconds
+    :param samples: int: How many hashes to time per cost
+    :param min_rounds: int: The lowest cost considered, returned even when it is slower than the target
+    :param max_rounds: int: The highest cost considered
+    :return: The recommended cost and the measured median times in milliseconds per cost
+    :doc-author: Trelent
+    """
+    timings = {}
+    for rounds in range(min_rounds, max_rounds + 1):
+        timings[rounds] = hash_time(rounds, samples) * 1000
+        if timings[rounds] > target_ms:
+            break
+    within = [rounds for rounds, duration in timings.items() if duration <= target_ms]
+    return max(within, default=min_rounds), timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=config.PASSWORD_HASH_TARGET_MS)
+    parser.add_argument("--samples", type=int, default=3)
+    args = parser.parse_args()
+
+    rounds, timings = calibrate(args.target_ms, args.samples)
+    for cost, duration in timings.items():
+        print(f"rounds {cost:2}: {duration:8.1f} ms per hash, {1000 / duration:6.1f} hashes per second per core")
+    print(f"Current policy: {config.PASSWORD_BCRYPT_ROUNDS} rounds")
+    print(f"PASSWORD_BCRYPT_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
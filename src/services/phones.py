@@ -0,0 +1,39 @@
+import re
+
+from src.conf.config import config
+
+_SEPARATORS = re.compile(r"[\s().\-/]+")
+
+
+def to_e164(number: str | None, country_code: str | None = None, trunk_prefix: str | None = None) -> str | None:
+    """
+    The to_e164 function normalizes a phone number to E.164, a + followed by the country code and the number.
+        Numbers written with + or 00 are international already. A number that starts with the trunk prefix is
+        national and gets the default country code, as does a number that starts with the country code but
+        lacks the +. Spaces, dashes, dots, slashes and parentheses are ignored.
+
+    :param number: str: The phone number as entered
+    :param country_code: str: The country code of national numbers, PHONE_COUNTRY_CODE by default
+    :param trunk_prefix: str: The prefix of national numbers, PHONE_TRUNK_PREFIX by default
+    :return: The number in E.164, or None if it cannot be one
+    :doc-author: Trelent
+    """
+    if not number:
+        return None
+    country_code = country_code or config.PHONE_COUNTRY_CODE
+    trunk_prefix = config.PHONE_TRUNK_PREFIX if trunk_prefix is None else trunk_prefix
+    number = _SEPARATORS.sub("", number)
+    if number.startswith("+"):
+        digits = number[1:]
+    elif number.startswith("00"):
+        digits = number[2:]
+    elif trunk_prefix and number.startswith(trunk_prefix):
+        digits = country_code + number[len(trunk_prefix):]
+    elif number.startswith(country_code):
+        digits = number
+    else:
+        digits = country_code + number
+    # Country codes never start with 0, and E.164 allows at most 15 digits
+    if not digits.isdigit() or digits[0] == "0" or not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
@@ -0,0 +1,154 @@
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class StackSampler:
+    """
+    Pure-Python sampling profiler for one thread. A background thread reads the stack of the
+    target thread every interval seconds and counts the collapsed stacks. With a root frame only the
+    samples taken while that frame is on the stack are counted, which on an event loop thread keeps
+    the stacks of one coroutine and drops those of the tasks that run in between.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.001, root=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            inside = self.root is None
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+                inside = inside or frame is self.root
+                frame = frame.f_back
+            if inside:
+                # Frames are collected innermost first, flame graphs expect the root first
+                self.stacks[";".join(reversed(names))] += 1
+
+    def folded(self) -> str:
+        """
+        The folded function returns the samples in the collapsed stack format read by flamegraph.pl,
+        inferno and speedscope, one "frame;frame;frame count" line per distinct stack.
+
+        :param self: Represent the instance of the class
+        :return: The collapsed stacks
+        :doc-author: Trelent
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _short_path(filename: str) -> str:
+    try:
+        return os.path.relpath(filename)
+    except ValueError:
+        return filename
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles single requests on demand. A request is profiled when it carries
+    the X-Profile header with the configured token, or when it is picked by the sampling rate.
+    Only one request per worker is profiled at a time, the others that ask for it meanwhile are served
+    without a profile. The profile holds the samples of the event loop thread taken while the request's
+    own coroutines run, work it hands to the threadpool (sync dependencies and routes) is not in it.
+    It is written to directory as a .folded file, keeping the newest max_files of them.
+    """
+
+    def __init__(self, app, directory: str, token: str | None = None, sample_rate: float = 0.0,
+                 interval: float = 0.001, max_files: int = 100):
+        self.app = app
+        self.directory = Path(directory)
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_files = max_files
+        self._profiling = threading.Lock()
+
+    def should_profile(self, scope) -> bool:
+        """
+        The should_profile function decides whether a request is profiled.
+
+        :param self: Represent the instance of the class
+        :param scope: The ASGI scope of the request
+        :return: True if the request carries the profiling token or was sampled
+        :doc-author: Trelent
+        """
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def write(self, name: str, folded: str):
+        """
+        The write function stores a profile and removes the oldest ones above max_files.
+
+        :param self: Represent the instance of the class
+        :param name: str: The file name
+        :param folded: str: The collapsed stacks
+        :return: None
+        :doc-author: Trelent
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / name).write_text(folded)
+        # File names start with the UTC time, so they sort oldest first
+        for old in sorted(self.directory.glob("*.folded"))[:-self.max_files]:
+            old.unlink(missing_ok=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not self._profiling.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            self._profiling.release()
+
+    async def _profile(self, scope, receive, send):
+
+        started = time.time()
+        name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(started))}-{int(started * 1000) % 1000:03d}-" \
+               f"{scope['method']}-{_UNSAFE.sub('_', scope['path']).strip('_') or 'root'}.folded"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-file", name.encode())]}
+            await send(message)
+
+        sampler = StackSampler(threading.get_ident(), self.interval, root=sys._getframe())
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            await run_in_threadpool(sampler.stop)
+            await run_in_threadpool(self.write, name, sampler.folded())
@@ -0,0 +1,151 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.conf.config import config
+from src.services.metrics import route_name
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryStats:
+    """
+    Statement count, database time and statement shapes for one request or one tracked block.
+    """
+
+    def __init__(self, route: str = "-"):
+        self.route = route
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        The repeated function returns the statement shapes that ran at least threshold times, the usual sign of N+1.
+
+        :param self: Represent the instance of the class
+        :param threshold: int: The number of repeats that counts as N+1
+        :return: A list of (statement, count) pairs
+        :doc-author: Trelent
+        """
+        return [(statement, count) for statement, count in self.shapes.most_common() if count >= threshold]
+
+
+_request_stats: ContextVar[QueryStats | None] = ContextVar("request_query_stats", default=None)
+_trackers: list[QueryStats] = []
+
+
+def current_stats() -> QueryStats | None:
+    """
+    The current_stats function returns the statistics of the request being processed, if any.
+
+    :return: The QueryStats of the current request or None
+    :doc-author: Trelent
+    """
+    return _request_stats.get()
+
+
+@contextmanager
+def track_queries():
+    """
+    The track_queries function counts every statement executed while the block runs, in any thread.
+    It is meant for tests, where the application may run in another thread than the test itself.
+
+    :return: A QueryStats object that is filled while the block runs
+    :doc-author: Trelent
+    """
+    stats = QueryStats()
+    _trackers.append(stats)
+    try:
+        yield stats
+    finally:
+        _trackers.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(budget: int):
+    """
+    The assert_max_queries function fails with AssertionError when the block executes more than budget statements.
+
+    :param budget: int: The largest allowed number of statements
+    :return: A QueryStats object that is filled while the block runs
+    :doc-author: Trelent
+    """
+    with track_queries() as stats:
+        yield stats
+    if stats.count > budget:
+        statements = "\n".join(f"{count} x {statement}" for statement, count in stats.shapes.most_common())
+        raise AssertionError(f"{stats.count} statements executed, budget is {budget}:\n{statements}")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_stats_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._query_stats_start
+    stats = _request_stats.get()
+    if stats is None and not _trackers:
+        if duration * 1000 >= config.SLOW_QUERY_MS:
+            logger.warning("Slow query %.1f ms: %s", duration * 1000, statement)
+        return
+
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    if stats is not None:
+        stats.record(shape, duration)
+    for tracker in _trackers:
+        tracker.record(shape, duration)
+    if duration * 1000 >= config.SLOW_QUERY_MS:
+        route = stats.route if stats is not None else "-"
+        logger.warning("Slow query %.1f ms on %s: %s", duration * 1000, route, shape)
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware that counts statements and database time per request. With QUERY_DEBUG_HEADERS
+    the numbers are returned in the X-DB-Query-Count and X-DB-Query-Time headers, and requests that
+    repeat one statement N_PLUS_ONE_THRESHOLD times or more are logged as likely N+1 patterns.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and config.QUERY_DEBUG_HEADERS:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-query-time", f"{stats.duration * 1000:.2f}ms".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            stats.route = f"{scope['method']} {scope['path']}"
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            stats.route = f"{scope['method']} {route_name(scope)}"
+            for statement, count in stats.repeated(config.N_PLUS_ONE_THRESHOLD):
+                logger.warning("Possible N+1 on %s: %d x %s", stats.route, count, statement)
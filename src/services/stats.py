@@ -0,0 +1,52 @@
+import logging
+from datetime import datetime
+
+from redis.exceptions import RedisError
+from sqlalchemy.orm import Session
+
+from src.conf.config import config
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactStats, Principal
+from src.services.auth import auth_service
+from src.services.cache import SingleFlightCache
+from src.services.metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+stats_cache = register_cache("contact_stats", SingleFlightCache(ttl=config.STATS_CACHE_TTL,
+                                                                client_factory=lambda: auth_service.cache))
+
+
+def stats_key(user_id: int) -> str:
+    return f"contacts:stats:{user_id}"
+
+
+async def get_contact_stats(db: Session, user: Principal) -> ContactStats:
+    """
+    The get_contact_stats function returns the statistics of the user's contacts, from the cache when possible.
+
+    :param db: Session: Get the database session
+    :param user: Principal: The current user
+    :return: The statistics
+    :doc-author: Trelent
+    """
+    async def load():
+        # created_at is filled by the database, whose clock SQLite and a UTC Postgres keep in UTC
+        return await repository_contacts.get_contact_stats(db, user, datetime.utcnow(), config.STATS_TOP_DOMAINS)
+
+    return await stats_cache.get_or_load(stats_key(user.id), load)
+
+
+def invalidate_contact_stats(user_id: int):
+    """
+    The invalidate_contact_stats function drops the cached statistics of a user after their contacts changed.
+        A write must not fail because Redis is away, the entry then expires after STATS_CACHE_TTL.
+
+    :param user_id: int: The user whose contacts changed
+    :return: None
+    :doc-author: Trelent
+    """
+    try:
+        stats_cache.delete(stats_key(user_id))
+    except RedisError:
+        logger.warning("Could not invalidate the contact stats of user %s", user_id, exc_info=True)
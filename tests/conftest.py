@@ -17,6 +17,40 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 
+class DictRedis:
+    """Minimal synchronous stand-in for the redis client methods used by SingleFlightCache."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def register_script(self, script):
+        # Only the lock release script of the cache is registered, a compare and delete
+        def release(keys, args):
+            if self.data.get(keys[0]) != args[0].encode():
+                return 0
+            self.delete(keys[0])
+            return 1
+
+        return release
+
+
+@pytest.fixture()
+def redis():
+    return DictRedis()
+
+
 @pytest.fixture(scope="module")
 def session():
     # Create the database
@@ -0,0 +1,16 @@
+import subprocess
+import sys
+
+DEFERRED = ["cloudinary", "fastapi_mail"]
+
+
+def test_main_import_defers_heavy_modules():
+    code = "import sys, main; print(' '.join(m for m in %r if m in sys.modules))" % DEFERRED
+    process = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert process.stdout.strip() == ""
+
+
+def test_main_import_does_not_connect():
+    code = "import main; from src.services.auth import auth_service; print(auth_service._cache)"
+    process = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert process.stdout.strip() == "None"
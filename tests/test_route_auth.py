@@ -1,6 +1,12 @@
 from unittest.mock import MagicMock
 
+from jose import jwt
+
 from src.database.models import User
+from src.routes.auth import OPEN_CHECK_PIXEL
+from src.services.auth import Auth
+from src.services.events import OpenEventRecorder
+from src.services.passwords import password_context
 
 
 def test_create_user(client, user, monkeypatch):
@@ -47,7 +53,25 @@ def test_login_user(client, session, user):
     assert response.status_code == 200, response.text
     data = response.json()
     assert data["token_type"] == "bearer"
+    claims = jwt.get_unverified_claims(data["access_token"])
+    assert claims["uid"] == current_user.id
+    assert claims["confirmed"] is True
+
+
 
+def test_login_rehashes_password_of_older_policy(client, session, user, monkeypatch):
+    monkeypatch.setattr(Auth, "pwd_context", password_context(5))
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.password = password_context(4).hash(user.get('password'))
+    session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    assert response.status_code == 200, response.text
+    password = session.query(User.password).filter(User.email == user.get('email')).scalar()
+    assert password.startswith("$2b$05$")
+    assert password_context(5).verify(user.get('password'), password)
 
 def test_login_wrong_password(client, user):
     response = client.post(
@@ -67,3 +91,14 @@ def test_login_wrong_email(client, user):
     assert response.status_code == 401, response.text
     data = response.json()
     assert data["detail"] == "Invalid email"
+
+
+def test_email_opened(client, monkeypatch):
+    recorder = OpenEventRecorder(None)
+    monkeypatch.setattr("src.routes.auth.open_events", recorder)
+    response = client.get("/api/auth/deadpool", headers={"user-agent": "Thunderbird/115.0"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert "no-store" in response.headers["cache-control"]
+    assert response.content == OPEN_CHECK_PIXEL
+    assert [(e["username"], e["user_agent"]) for e in recorder.buffer] == [("deadpool", "Thunderbird/115.0")]
@@ -0,0 +1,57 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.routes.health import monitor
+from src.services.query_stats import track_queries
+from tests.conftest import engine
+
+
+@pytest.fixture()
+def healthy(monkeypatch):
+    monkeypatch.setattr(monitor, "engine", engine)
+    monkeypatch.setattr(monitor, "redis_factory", lambda: MagicMock())
+    monkeypatch.setattr(monitor, "report", None)
+
+
+def test_live(client):
+    with track_queries() as stats:
+        response = client.get("/api/health/live")
+    assert response.status_code == 200, response.text
+    assert response.json() == {"status": "alive"}
+    assert stats.count == 0
+
+
+def test_ready(client, healthy):
+    response = client.get("/api/health/ready")
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["ready"] is True
+    assert data["database"]["pool"]["class"] == "StaticPool"
+    assert "latency_ms" in data["redis"]
+
+
+def test_ready_is_cached(client, healthy):
+    client.get("/api/health/ready")
+    with track_queries() as stats:
+        for _ in range(10):
+            response = client.get("/api/health/ready")
+    assert response.status_code == 200, response.text
+    assert stats.count == 0
+
+
+def test_ready_redis_down(client, monkeypatch):
+    redis = MagicMock()
+    redis.ping.side_effect = ConnectionError("Connection refused")
+    monkeypatch.setattr(monitor, "engine", engine)
+    monkeypatch.setattr(monitor, "redis_factory", lambda: redis)
+    monkeypatch.setattr(monitor, "report", None)
+    response = client.get("/api/health/ready")
+    assert response.status_code == 503, response.text
+    assert response.json()["redis"] == {"ok": False, "error": "Connection refused"}
+
+
+def test_healthchecker(client, healthy):
+    response = client.get("/api/healthchecker")
+    assert response.status_code == 200, response.text
+    assert response.json() == {"message": "Welcome to FastAPI!"}
@@ -0,0 +1,8 @@
+def test_metrics(client, user):
+    client.post("/api/auth/login", data={"username": user.get('email'), "password": user.get('password')})
+    response = client.get("/metrics")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_bucket{method="POST",route="/api/auth/login",status="401"' in response.text
+    assert 'db_queries_total' in response.text
+    assert 'cache_hit_ratio{cache="auth_user"}' in response.text
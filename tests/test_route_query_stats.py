@@ -0,0 +1,45 @@
+import logging
+
+from src.conf.config import config
+from src.database.models import User
+from src.services.query_stats import assert_max_queries, track_queries
+
+
+def test_query_headers(client, monkeypatch):
+    monkeypatch.setattr(config, "QUERY_DEBUG_HEADERS", True)
+    response = client.post("/api/auth/login", data={"username": "nobody@example.com", "password": "12345678"})
+    assert response.status_code == 401, response.text
+    assert response.headers["x-db-query-count"] == "1"
+    assert response.headers["x-db-query-time"].endswith("ms")
+
+
+def test_query_headers_disabled(client):
+    response = client.post("/api/auth/login", data={"username": "nobody@example.com", "password": "12345678"})
+    assert "x-db-query-count" not in response.headers
+
+
+def test_login_statement_budget(client, session, user, monkeypatch):
+    monkeypatch.setattr("src.services.email.send_email", lambda *args: None)
+    client.post("/api/auth/signup", json=user)
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.confirmed = True
+    session.commit()
+    with assert_max_queries(2):
+        response = client.post("/api/auth/login",
+                               data={"username": user.get('email'), "password": user.get('password')})
+    assert response.status_code == 200, response.text
+
+
+def test_slow_query_logged(session, monkeypatch, caplog):
+    monkeypatch.setattr(config, "SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="src.services.query_stats"):
+        session.query(User).first()
+    assert "Slow query" in caplog.text
+
+
+def test_repeated_statements(session):
+    with track_queries() as stats:
+        for user_id in range(3):
+            session.query(User).filter(User.id == user_id).first()
+    assert stats.count == 3
+    assert len(stats.repeated(3)) == 1
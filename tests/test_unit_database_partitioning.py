@@ -0,0 +1,46 @@
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, User
+from src.database.partitioning import is_partitioned, partition_contacts, unpartition_contacts
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactBase
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/partitioning.db")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def test_sqlite_is_left_alone(engine):
+    with engine.connect() as connection:
+        assert not is_partitioned(connection)
+        assert not partition_contacts(connection, 16)
+        assert not unpartition_contacts(connection)
+
+
+def test_writes_name_the_partition_key(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(" ".join(statement.split())))
+    with sessionmaker(bind=engine, expire_on_commit=False)() as db:
+        user = User(username="owner", email="owner@example.com", password="x")
+        db.add(user)
+        db.commit()
+        body = ContactBase(name="olena", fullname="Olena Shevchenko", email="olena@example.com",
+                           phone_number="0501234567", birthday=date(1990, 1, 1), description="")
+        contact = asyncio.run(repository_contacts.create_contact(body, db, user))
+        asyncio.run(repository_contacts.update_contact(contact.id, body.model_copy(update={"name": "lena"}), db, user))
+        asyncio.run(repository_contacts.remove_contact(contact.id, db, user))
+
+    writes = [statement for statement in statements
+              if statement.startswith(("UPDATE contacts", "DELETE FROM contacts"))]
+    assert len(writes) == 2
+    assert all(statement.endswith("WHERE contacts.id = ? AND contacts.user_id = ?") for statement in writes)
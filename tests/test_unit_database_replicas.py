@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import create_engine, text, update
+
+from src.database.models import User
+
+from src.database.replicas import ReplicaRouter, get_read_db, get_write_db
+from src.schemas import Principal
+from tests.conftest import TestingSessionLocal
+
+USER = Principal(id=1, email="reader@example.com", confirmed=True)
+
+
+@pytest.fixture()
+def replica_urls(tmp_path):
+    urls = []
+    for name in ("replica0", "replica1"):
+        url = f"sqlite:///{tmp_path}/{name}.db"
+        with create_engine(url).begin() as connection:
+            connection.execute(text("CREATE TABLE origin (name VARCHAR)"))
+            connection.execute(text("INSERT INTO origin VALUES (:name)"), {"name": name})
+        urls.append(url)
+    return urls
+
+
+@pytest.fixture()
+def router(replica_urls, redis):
+    return ReplicaRouter(replica_urls, sticky_seconds=0.2, client_factory=lambda: redis)
+
+
+def served_by(router, user_id=USER.id):
+    replica = router.pick(user_id)
+    if replica is None:
+        return "primary"
+    with replica.session_factory() as session:
+        return session.execute(text("SELECT name FROM origin")).scalar()
+
+
+def test_round_robin(router):
+    assert [served_by(router) for _ in range(4)] == ["replica0", "replica1", "replica0", "replica1"]
+
+
+def test_read_your_writes(router, redis, replica_urls):
+    router.mark_write(USER.id)
+    assert served_by(router) == "primary"
+    assert served_by(router, user_id=2) != "primary"
+    # Another worker sees the mark through Redis
+    other = ReplicaRouter(replica_urls, client_factory=lambda: redis)
+    assert served_by(other) == "primary"
+    time.sleep(0.25)
+    redis.delete(router._sticky_key(USER.id))
+    assert served_by(router) != "primary"
+
+
+def test_lagging_replica_is_skipped(router, monkeypatch):
+    monkeypatch.setattr(router, "measure_lag", lambda replica: 10.0 if replica.name == "replica0" else 0.0)
+    router.check_all()
+    assert {served_by(router) for _ in range(4)} == {"replica1"}
+    monkeypatch.setattr(router, "measure_lag", lambda replica: 10.0)
+    router.check_all()
+    assert served_by(router) == "primary"
+
+
+def test_unavailable_replica_is_skipped(replica_urls, tmp_path):
+    router = ReplicaRouter([f"sqlite:///{tmp_path}/missing/replica.db", replica_urls[1]])
+    router.check_all()
+    assert {served_by(router) for _ in range(4)} == {"replica1"}
+
+
+def test_pick_does_not_probe(router, monkeypatch):
+    def probe(replica):
+        raise AssertionError("pick must not connect")
+
+    monkeypatch.setattr(router, "measure_lag", probe)
+    assert served_by(router) == "replica0"
+
+
+def test_monitor_checks_in_the_background(router, monkeypatch):
+    checked = []
+    monkeypatch.setattr(router, "measure_lag", lambda replica: checked.append(replica.name) or 10.0)
+    router.check_interval = 0.01
+
+    async def run():
+        router.start()
+        await asyncio.sleep(0.1)
+        await router.stop()
+
+    asyncio.run(run())
+    assert {"replica0", "replica1"} <= set(checked)
+    assert router.pick(USER.id) is None
+
+
+def test_failed_replica_read_is_retried_on_the_primary(tmp_path, monkeypatch):
+    router = ReplicaRouter([f"sqlite:///{tmp_path}/missing/replica.db"])
+    monkeypatch.setattr("src.database.replicas.replica_router", router)
+    primary = TestingSessionLocal()
+    reads = get_read_db(USER, primary)
+    session = next(reads)
+    assert session is not primary
+    assert [user.id for user in session.query(User)] == [user.id for user in primary.query(User)]
+    assert not router.replicas[0].available
+    assert router.pick(USER.id) is None
+    reads.close()
+    primary.close()
+
+
+def test_without_replicas_everything_reads_the_primary():
+    router = ReplicaRouter([])
+    assert router.pick(USER.id) is None
+
+
+def test_dependencies(router, monkeypatch):
+    monkeypatch.setattr("src.database.replicas.replica_router", router)
+    primary = TestingSessionLocal()
+    writes = get_write_db(USER, primary)
+    assert next(writes) is primary
+    # Ending a read transaction does not pin the reads
+    primary.query(User).all()
+    primary.commit()
+    assert router.pick(USER.id) is not None
+    primary.add(User(username="writer", email="writer@example.com", password="x"))
+    primary.flush()
+    primary.rollback()
+    primary.commit()
+    assert router.pick(USER.id) is not None
+    primary.execute(update(User).where(User.id == -1).values(username="nobody"))
+    primary.commit()
+    writes.close()
+    reads = get_read_db(USER, primary)
+    assert next(reads) is primary
+    reads.close()
+    primary.close()
@@ -28,6 +28,22 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         result = await get_contacts(offset=0, limit=100, user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_fields(self):
+        rows = [{"id": 1, "name": "Test1"}]
+        self.session.execute().mappings().all.return_value = rows
+        result = await get_contacts(offset=0, limit=100, user=self.user, db=self.session, fields=("id", "name"))
+        self.assertEqual(result, rows)
+        statement = self.session.execute.call_args.args[0]
+        self.assertEqual([column.name for column in statement.selected_columns], ["id", "name"])
+        self.assertNotIn("users", str(statement))
+
+    async def test_get_contact_fields(self):
+        self.session.execute().mappings().first.return_value = None
+        result = await get_contact(contact_id=1, user=self.user, db=self.session, fields=("id", "phone_e164"))
+        self.assertIsNone(result)
+        statement = self.session.execute.call_args.args[0]
+        self.assertEqual([column.name for column in statement.selected_columns], ["id", "phone_e164"])
+
     async def test_get_contact_found(self):
         contact = Contact()
         self.session.query().filter().first.return_value = contact
@@ -109,10 +125,18 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_search_birthday(self):
         contacts = [Contact(), Contact(), Contact(), Contact()]
+        self.session.query().filter().first.return_value = None
         self.session.query().filter().all.return_value = contacts
         result = await search_birthday(user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
+    async def test_search_birthday_materialized(self):
+        contacts = [Contact(), Contact()]
+        self.session.query().filter().first.return_value = 1
+        self.session.query().join().filter().order_by().all.return_value = contacts
+        result = await search_birthday(user=self.user, db=self.session)
+        self.assertEqual(result, contacts)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import json
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Contact, UpcomingBirthday, User
+from src.repository import contacts as repository_contacts
+from src.routes.contacts import _batch, contact_fields, contact_ids
+from src.schemas import CONTACT_BATCH_MAX_IDS
+
+
+def test_contact_fields():
+    assert contact_fields(None) is None
+    assert contact_fields("") is None
+    assert contact_fields("name, phone_number,name") == ("id", "name", "phone_number")
+    assert contact_fields("id,birthday") == ("id", "birthday")
+
+
+def test_contact_fields_are_allowlisted():
+    with pytest.raises(HTTPException) as error:
+        contact_fields("name,user_id,password")
+    assert error.value.status_code == 400
+    assert error.value.detail == "Unknown fields: password, user_id"
+
+
+def test_contact_ids():
+    assert contact_ids("3, 1,3,") == [3, 1, 3]
+    for ids in ("1,two", "", ",".join(["1"] * (CONTACT_BATCH_MAX_IDS + 1))):
+        with pytest.raises(HTTPException) as error:
+            contact_ids(ids)
+        assert error.value.status_code == 400
+
+
+@pytest.fixture()
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/batch.db")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        owner, other = User(username="owner", email="owner@example.com", password="x"), \
+            User(username="other", email="other@example.com", password="x")
+        session.add_all([owner, other])
+        session.commit()
+        contacts = [Contact(name=name, fullname=f"{name} Contact", email=f"{name}@example.com",
+                            phone_number="0501234567", phone_e164="+380501234567", birthday=date.today(),
+                            description="", user_id=user.id)
+                    for name, user in (("first", owner), ("second", owner), ("foreign", other))]
+        session.add_all(contacts)
+        session.commit()
+        yield session, owner, contacts
+
+
+def test_batch_keeps_request_order(db):
+    db, owner, contacts = db
+    first, second, foreign = (contact.id for contact in contacts)
+    items = asyncio.run(_batch([second, 999, foreign, first, second], db, owner))
+    assert [(item.id, item.found) for item in items] == [(second, True), (999, False), (foreign, False),
+                                                         (first, True), (second, True)]
+    assert items[0].contact.name == "second" and items[1].contact is None
+
+
+def test_batch_fields(db):
+    db, owner, contacts = db
+    first = contacts[0].id
+    response = asyncio.run(_batch([first, 999], db, owner, ("id", "name")))
+    assert json.loads(response.body) == [{"id": first, "found": True, "contact": {"id": first, "name": "first"}},
+                                         {"id": 999, "found": False, "contact": None}]
+
+
+def test_read_routes_select_fields(db):
+    db, owner, contacts = db
+    fields = ("id", "name")
+    expected = [{"id": contact.id, "name": contact.name} for contact in contacts[:2]]
+    assert asyncio.run(repository_contacts.search_contacts("first", None, None, db, owner, fields)) == expected[:1]
+    assert asyncio.run(repository_contacts.get_contacts_by_phone(["+380501234567"], db, owner, fields)) == expected
+    assert sorted(asyncio.run(repository_contacts.search_birthday(db, owner, fields)), key=lambda row: row["id"]) \
+        == expected
+    db.add_all([UpcomingBirthday(user_id=owner.id, contact_id=contact.id, birthday_on=date.today(),
+                                 computed_on=date.today()) for contact in contacts[:2]])
+    db.commit()
+    assert asyncio.run(repository_contacts.search_birthday(db, owner, fields)) == expected
@@ -0,0 +1,114 @@
+import gzip
+import importlib.util
+import os
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount, Route
+from starlette.templating import Jinja2Templates
+from starlette.testclient import TestClient
+
+from src.services.assets import (PrecompressedStaticFiles, RenderedPage, accepted_encodings, build, load_manifest,
+                                 static_url)
+
+BEST = "br" if importlib.util.find_spec("brotli") else "gzip"
+CSS = b"body { color: red; }\n" * 50 + b"/*# sourceMappingURL=site.css.map */"
+
+
+@pytest.fixture()
+def static(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "site.css").write_bytes(CSS)
+    (tmp_path / "css" / "site.css.map").write_text('{"version": 3, "sources": []}')
+    (tmp_path / "pixel.png").write_bytes(b"\x89PNG" + b"\x00" * 400)
+    (tmp_path / "plain.txt").write_text("not built")
+    manifest = build(tmp_path, tmp_path / "build")
+    return tmp_path, manifest
+
+
+@pytest.fixture()
+def client(static):
+    directory, _ = static
+    return TestClient(Starlette(routes=[Mount("/static", PrecompressedStaticFiles(directory=directory))]))
+
+
+def test_build(static):
+    directory, manifest = static
+    css = manifest["css/site.css"]
+    assert css.startswith("build/css/site.") and css.endswith(".css")
+    built = (directory / css).read_bytes()
+    # The CSS points to the hashed source map
+    assert f"sourceMappingURL={manifest['css/site.css.map'].rsplit('/', 1)[1]}".encode() in built
+    assert gzip.decompress((directory / (css + ".gz")).read_bytes()) == built
+    assert not (directory / (manifest["pixel.png"] + ".gz")).exists()
+    assert build(directory, directory / "build") == manifest
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate, br;q=1.0") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("br;q=0, gzip") == {"gzip"}
+    assert accepted_encodings("") == set()
+
+
+@pytest.mark.parametrize("accept, encoding", [("gzip, br", BEST), ("gzip", "gzip"), ("identity", None)])
+def test_negotiation(static, client, accept, encoding):
+    _, manifest = static
+    response = client.get(f"/static/{manifest['css/site.css']}", headers={"Accept-Encoding": accept})
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == encoding
+    assert response.headers["content-type"].startswith("text/css")
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == CSS.replace(b"site.css.map", manifest["css/site.css.map"].rsplit("/", 1)[1].encode())
+
+
+def test_etag_revalidation(static, client):
+    _, manifest = static
+    url = f"/static/{manifest['css/site.css']}"
+    etag = client.get(url, headers={"Accept-Encoding": "gzip"}).headers["etag"]
+    assert client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"Accept-Encoding": "identity", "If-None-Match": etag}).status_code == 200
+
+
+def test_unhashed_files_are_served_as_before(client):
+    response = client.get("/static/plain.txt", headers={"Accept-Encoding": "gzip"})
+    assert response.text == "not built"
+    assert "cache-control" not in response.headers
+
+
+def test_static_url(static, monkeypatch):
+    directory, manifest = static
+    monkeypatch.setattr("src.services.assets.load_manifest", lambda: load_manifest(directory / "build"))
+    assert static_url("css/site.css") == f"/static/{manifest['css/site.css']}"
+    assert static_url("missing.css") == "/static/missing.css"
+
+
+@pytest.fixture()
+def page_client(tmp_path):
+    (tmp_path / "page.html").write_text("<p>" + "hello " * 100 + "</p>")
+    page = RenderedPage(Jinja2Templates(directory=str(tmp_path)), "page.html")
+    app = Starlette(routes=[Route("/", lambda request: page.response(request))])
+    return tmp_path / "page.html", TestClient(app)
+
+
+def test_rendered_page(page_client):
+    _, client = page_client
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == "<p>" + "hello " * 100 + "</p>"
+    assert response.headers["cache-control"] == "no-cache"
+    etag = response.headers["etag"]
+    assert client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.headers["etag"] != etag
+
+
+def test_rendered_page_follows_template_changes(page_client):
+    path, client = page_client
+    etag = client.get("/").headers["etag"]
+    path.write_text("<p>changed</p>")
+    os.utime(path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.text == "<p>changed</p>"
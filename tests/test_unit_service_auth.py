@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from src.database.models import User
+from src.schemas import Principal
+from src.services.auth import Auth
+from src.services.cache import SingleFlightCache
+from tests.conftest import DictRedis
+
+
+class TestAuth(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=Session)
+        self.auth = Auth()
+        self.auth.cache = MagicMock()
+        self.auth.user_cache = SingleFlightCache(DictRedis())
+        self.user = User(id=1, username='test_user', email="ex@example.com", password='qwerty', confirmed=True)
+
+    async def test_access_token_claims(self):
+        claims = self.auth.access_token_claims(self.user)
+        self.assertEqual(claims, {"sub": "ex@example.com", "uid": 1, "confirmed": True})
+
+    async def test_get_current_principal_from_claims(self):
+        token = await self.auth.create_access_token(data=self.auth.access_token_claims(self.user))
+        with patch("src.repository.users.get_user_by_email") as get_user_by_email:
+            result = await self.auth.get_current_principal(token, self.session)
+        self.assertEqual(result, Principal(id=1, email="ex@example.com", confirmed=True))
+        get_user_by_email.assert_not_called()
+        self.auth.cache.get.assert_not_called()
+        self.assertEqual(self.auth.user_cache.misses, 0)
+
+    async def test_get_current_principal_legacy_token(self):
+        token = await self.auth.create_access_token(data={"sub": self.user.email})
+        self.auth.user_cache.set(self.user.email, self.user)
+        result = await self.auth.get_current_principal(token, self.session)
+        self.assertEqual(result, Principal(id=1, email="ex@example.com", confirmed=True))
+
+    async def test_get_current_principal_refresh_token(self):
+        token = await self.auth.create_refresh_token(data=self.auth.access_token_claims(self.user))
+        with self.assertRaises(HTTPException):
+            await self.auth.get_current_principal(token, self.session)
+
+    async def test_get_current_user_cold_key_single_db_load(self):
+        token = await self.auth.create_access_token(data={"sub": self.user.email})
+        loads = 0
+
+        async def get_user_by_email(email, db):
+            nonlocal loads
+            loads += 1
+            await asyncio.sleep(0.05)
+            return self.user
+
+        with patch("src.repository.users.get_user_by_email", get_user_by_email):
+            users = await asyncio.gather(*[self.auth.get_current_user(token, self.session) for _ in range(500)])
+        self.assertEqual(loads, 1)
+        self.assertTrue(all(user.email == self.user.email for user in users))
+
+
+if __name__ == '__main__':
+    unittest.main()
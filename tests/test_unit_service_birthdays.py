@@ -0,0 +1,138 @@
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Contact, UpcomingBirthday, User
+from src.repository import contacts as repository_contacts
+from src.repository import birthdays as repository_birthdays
+from src.repository.birthdays import birthday_window, materialize_upcoming_birthdays
+from src.schemas import ContactBase
+from src.services.birthdays import run, send_digests
+
+TODAY = date(2025, 2, 25)
+
+
+@pytest.fixture()
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/birthdays.db")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        yield session
+
+
+def add_user(db, name, confirmed=True):
+    user = User(username=name, email=f"{name}@example.com", password="x", confirmed=confirmed)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def add_contact(db, user, name, birthday):
+    contact = Contact(name=name, fullname=f"{name} Contact", email=f"{name}@example.com", phone_number="0501234567",
+                      birthday=birthday, user_id=user.id)
+    db.add(contact)
+    db.commit()
+    return contact
+
+
+def test_birthday_window_crosses_months_and_handles_february_29():
+    window = birthday_window(TODAY, 7)
+    assert window[225] == TODAY
+    assert window[304] == date(2025, 3, 4)
+    assert window[229] == date(2025, 2, 28)
+    assert 305 not in window
+    assert 229 not in birthday_window(date(2025, 3, 1), 7)
+    assert birthday_window(date(2024, 2, 25), 7)[229] == date(2024, 2, 29)
+
+
+def test_materialize(db):
+    alice, bob = add_user(db, "alice"), add_user(db, "bob")
+    leap = add_contact(db, alice, "leap", date(1996, 2, 29))
+    add_contact(db, alice, "later", date(1990, 4, 1))
+    march = add_contact(db, bob, "march", date(1985, 3, 2))
+    assert asyncio.run(materialize_upcoming_birthdays(db, TODAY, 7)) == 2
+    rows = {row.contact_id: row.birthday_on for row in db.query(UpcomingBirthday)}
+    assert rows == {leap.id: date(2025, 2, 28), march.id: date(2025, 3, 2)}
+    # A second run replaces the rows
+    asyncio.run(materialize_upcoming_birthdays(db, TODAY, 7))
+    assert db.query(UpcomingBirthday).count() == 2
+
+
+def test_endpoint_reads_the_table_and_follows_writes(db, monkeypatch):
+    monkeypatch.setattr(repository_contacts, "date", type("FixedDate", (date,), {"today": staticmethod(lambda: TODAY)}))
+    alice = add_user(db, "alice")
+    first = add_contact(db, alice, "first", date(1990, 3, 1))
+    add_contact(db, alice, "second", date(1990, 2, 26))
+
+    # Before the job ran, the contacts table is asked
+    assert {c.name for c in asyncio.run(repository_contacts.search_birthday(db, alice))} == {"first", "second"}
+
+    asyncio.run(materialize_upcoming_birthdays(db, TODAY, 7))
+    assert [c.name for c in asyncio.run(repository_contacts.search_birthday(db, alice))] == ["second", "first"]
+
+    body = ContactBase(name="new", fullname="New Contact", email="new@example.com", phone_number="0501234567",
+                       birthday=date(1991, 2, 27), description="")
+    created = asyncio.run(repository_contacts.create_contact(body, db, alice))
+    asyncio.run(repository_contacts.update_contact(first.id, body.model_copy(update={"birthday": date(1990, 6, 1)}),
+                                                   db, alice))
+    assert [c.id for c in asyncio.run(repository_contacts.search_birthday(db, alice))][1:] == [created.id]
+    asyncio.run(repository_contacts.remove_contact(created.id, db, alice))
+    assert [c.name for c in asyncio.run(repository_contacts.search_birthday(db, alice))] == ["second"]
+    assert db.query(UpcomingBirthday).count() == 1
+
+
+def test_digests_are_sent_once_per_user_in_batches(db):
+    users = [add_user(db, f"user{i}") for i in range(5)]
+    unconfirmed = add_user(db, "unconfirmed", confirmed=False)
+    for user in users + [unconfirmed]:
+        add_contact(db, user, f"{user.username}a", date(1990, 2, 26))
+        add_contact(db, user, f"{user.username}b", date(1990, 2, 27))
+    sent = []
+
+    async def send(email, username, birthdays):
+        sent.append((email, [birthday["name"] for birthday in birthdays]))
+        return username != "user3"
+
+    asyncio.run(materialize_upcoming_birthdays(db, TODAY, 7))
+    counts = asyncio.run(send_digests(db, TODAY, batch_size=2, pause=0, send=send))
+    assert counts == {"sent": 4, "failed": 1}
+    assert sent[0] == ("user0@example.com", ["user0a", "user0b"])
+    assert len(sent) == 5
+
+
+def test_digests_are_read_in_pages_without_holding_a_transaction(db):
+    users = [add_user(db, f"user{i}") for i in range(5)]
+    for user in users:
+        add_contact(db, user, f"{user.username}a", date(1990, 2, 26))
+        add_contact(db, user, f"{user.username}b", date(1990, 2, 27))
+    sent = []
+
+    async def send(email, username, birthdays):
+        assert not db.in_transaction()
+        sent.append((username, [birthday["name"] for birthday in birthdays]))
+        return True
+
+    asyncio.run(materialize_upcoming_birthdays(db, TODAY, 7))
+    counts = asyncio.run(send_digests(db, TODAY, batch_size=3, pause=0, send=send, page_size=2))
+    assert counts == {"sent": 5, "failed": 0}
+    assert sent == [(user.username, [f"{user.username}a", f"{user.username}b"]) for user in users]
+
+
+def test_is_materialized_is_remembered_for_the_day(db):
+    add_contact(db, add_user(db, "alice"), "soon", date(1990, 2, 26))
+    assert not repository_birthdays.is_materialized(db, TODAY)
+    asyncio.run(materialize_upcoming_birthdays(db, TODAY, 7))
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert repository_birthdays.is_materialized(db, TODAY)
+    assert statements == []
+    assert not repository_birthdays.is_materialized(db, date(2025, 2, 26))
+
+
+def test_run_without_email(db):
+    add_contact(db, add_user(db, "alice"), "soon", date(1990, 2, 26))
+    report = asyncio.run(run(db, TODAY, 7, batch_size=10, pause=0, send_emails=False))
+    assert report["birthdays"] == 1 and report["sent"] == 0
@@ -0,0 +1,103 @@
+import asyncio
+import time
+import unittest
+
+from src.services.cache import SingleFlightCache
+from tests.conftest import DictRedis
+
+
+class TestSingleFlightCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.client = DictRedis()
+        self.loads = 0
+
+    async def load(self):
+        self.loads += 1
+        await asyncio.sleep(0.01)
+        return {"id": 1}
+
+    async def test_concurrent_misses_share_one_load(self):
+        cache = SingleFlightCache(self.client)
+        results = await asyncio.gather(*[cache.get_or_load("cold", self.load) for _ in range(500)])
+        self.assertEqual(self.loads, 1)
+        self.assertTrue(all(result == {"id": 1} for result in results))
+
+    async def test_concurrent_misses_with_redis_lock(self):
+        cache = SingleFlightCache(self.client, lock=True)
+        await asyncio.gather(*[cache.get_or_load("cold", self.load) for _ in range(500)])
+        self.assertEqual(self.loads, 1)
+        self.assertNotIn("lock:cold", self.client.data)
+
+    async def test_waiting_for_other_worker_lock(self):
+        cache = SingleFlightCache(self.client, lock=True, lock_timeout=1.0)
+        self.client.set("lock:cold", "other-worker")
+        other = SingleFlightCache(self.client)
+        task = asyncio.create_task(cache.get_or_load("cold", self.load))
+        await asyncio.sleep(0.02)
+        other.set("cold", {"id": 2})
+        self.assertEqual(await task, {"id": 2})
+        self.assertEqual(self.loads, 0)
+
+    async def test_lock_of_another_worker_is_not_released(self):
+        cache = SingleFlightCache(self.client, lock=True, lock_timeout=1.0)
+
+        async def load_past_lock_expiry():
+            # The lock expired during the load and another worker took it
+            self.client.set("lock:cold", "other-worker")
+            return {"id": 1}
+
+        await cache.get_or_load("cold", load_past_lock_expiry)
+        self.assertEqual(self.client.data["lock:cold"], b"other-worker")
+
+    async def test_cancelled_loader_hands_over_to_a_waiter(self):
+        cache = SingleFlightCache(self.client)
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(10)
+
+        loader = asyncio.create_task(cache.get_or_load("cold", hang))
+        await started.wait()
+        waiters = [asyncio.create_task(cache.get_or_load("cold", self.load)) for _ in range(10)]
+        await asyncio.sleep(0)
+        loader.cancel()
+        self.assertEqual(await asyncio.gather(*waiters), [{"id": 1}] * 10)
+        self.assertEqual(self.loads, 1)
+        self.assertTrue(loader.cancelled())
+
+    async def test_failed_load_is_not_cached(self):
+        cache = SingleFlightCache(self.client)
+
+        async def fail():
+            raise ValueError("db is down")
+
+        with self.assertRaises(ValueError):
+            await cache.get_or_load("cold", fail)
+        self.assertEqual(await cache.get_or_load("cold", self.load), {"id": 1})
+
+    async def test_hit_does_not_load(self):
+        cache = SingleFlightCache(self.client)
+        cache.set("warm", {"id": 3})
+        self.assertEqual(await cache.get_or_load("warm", self.load), {"id": 3})
+        self.assertEqual(self.loads, 0)
+        self.assertEqual(cache.hits, 1)
+
+    def test_ttl_is_jittered(self):
+        cache = SingleFlightCache(self.client, ttl=300, jitter=0.1)
+        expiries = set()
+        for i in range(20):
+            cache.set(f"key{i}", i)
+            expiries.add(round(cache.get(f"key{i}")[2] - time.time()))
+        self.assertTrue(all(270 <= expiry <= 300 for expiry in expiries))
+        self.assertGreater(len(expiries), 1)
+
+    def test_should_refresh(self):
+        cache = SingleFlightCache(self.client)
+        self.assertFalse(cache.should_refresh(0.01, time.time() + 300))
+        self.assertTrue(cache.should_refresh(0.01, time.time() - 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
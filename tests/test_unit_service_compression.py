@@ -0,0 +1,114 @@
+import gzip
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.services import compression
+from src.services.compression import CompressionMiddleware
+from src.services.metrics import HTTP_COMPRESSION_SAVED_BYTES, HTTP_COMPRESSION_SKIPPED
+
+ROWS = [{"id": i, "name": f"Contact {i}", "phone_number": f"+380501234{i:03d}"} for i in range(100)]
+
+
+async def contacts(request):
+    return JSONResponse(ROWS, headers={"etag": '"v1"'})
+
+
+async def small(request):
+    return JSONResponse({"id": 1})
+
+
+async def encoded(request):
+    return Response(gzip.compress(b"x" * 1000), headers={"content-encoding": "gzip"})
+
+
+async def image(request):
+    return Response(b"\x89PNG" + b"\0" * 1000, media_type="image/png")
+
+
+async def stream(request):
+    async def chunks():
+        for _ in range(3):
+            yield b"x" * 1000
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+def client(**options) -> TestClient:
+    app = Starlette(routes=[Route("/contacts", contacts), Route("/small", small), Route("/encoded", encoded),
+                            Route("/image", image), Route("/stream", stream)])
+    return TestClient(CompressionMiddleware(app, **options))
+
+
+def get(test_client, path, accept="gzip"):
+    # Read the body as sent, without the transparent decoding of the client
+    with test_client.stream("GET", path, headers={"accept-encoding": accept}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_gzip():
+    saved = HTTP_COMPRESSION_SAVED_BYTES.labels("gzip").value
+    response, body = get(client(), "/contacts")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-length"] == str(len(body))
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"v1"'
+    plain = gzip.decompress(body)
+    assert json.loads(plain) == ROWS
+    assert HTTP_COMPRESSION_SAVED_BYTES.labels("gzip").value - saved == len(plain) - len(body)
+
+
+def test_brotli_is_preferred():
+    if compression.brotli is None:
+        pytest.skip("brotli is not installed")
+    response, body = get(client(), "/contacts", accept="gzip, deflate, br")
+    assert response.headers["content-encoding"] == "br"
+    assert json.loads(compression.brotli.decompress(body)) == ROWS
+
+
+def test_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    response, _ = get(client(), "/contacts", accept="br, gzip;q=0.5")
+    assert response.headers["content-encoding"] == "gzip"
+    response, _ = get(client(), "/contacts", accept="br")
+    assert "content-encoding" not in response.headers
+
+
+def test_large_bodies_compress_in_a_thread(monkeypatch):
+    calls = []
+
+    async def run_in_threadpool(function, *args):
+        calls.append(function)
+        return function(*args)
+
+    monkeypatch.setattr(compression, "run_in_threadpool", run_in_threadpool)
+    response, body = get(client(thread_size=1000), "/contacts")
+    assert len(calls) == 1
+    assert json.loads(gzip.decompress(body)) == ROWS
+    get(client(thread_size=10 ** 9), "/contacts")
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("path, reason", [("/small", "small"), ("/encoded", "encoded"), ("/image", "content_type"),
+                                          ("/stream", "streaming")])
+def test_passes_through(path, reason):
+    skipped = HTTP_COMPRESSION_SKIPPED.labels(reason).value
+    response, body = get(client(), path)
+    assert response.status_code == 200
+    assert HTTP_COMPRESSION_SKIPPED.labels(reason).value == skipped + 1
+    if path == "/encoded":
+        assert gzip.decompress(body) == b"x" * 1000
+    else:
+        assert "content-encoding" not in response.headers
+    if path == "/stream":
+        assert body == b"x" * 3000
+
+
+def test_identity_when_not_accepted():
+    response, body = get(client(), "/contacts", accept="identity")
+    assert "content-encoding" not in response.headers
+    assert json.loads(body) == ROWS
@@ -0,0 +1,122 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Contact, User
+from src.repository.contacts import get_dedupe_candidates, merge_contacts
+from src.schemas import CONTACT_MERGE_MAX_IDS, MergeRequest
+from src.services.dedupe import (UnionFind, find_duplicates, normalize_email, normalize_name, normalize_phone,
+                                 similar_names)
+
+
+def candidate(id, fullname, email, phone, birthday=date(1990, 1, 1)):
+    return SimpleNamespace(id=id, fullname=fullname, email=email, phone_number=phone, birthday=birthday)
+
+
+def test_normalizers():
+    assert normalize_email(" O.Lena+work@GoogleMail.com") == "olena@gmail.com"
+    assert normalize_email("o.lena+work@ukr.net") == "o.lena+work@ukr.net"
+    assert normalize_phone("+38 (050) 123-45-67") == normalize_phone("0501234567") == "+380501234567"
+    assert normalize_phone("123") is None
+    assert normalize_name("Shevchenko,  Olena") == normalize_name("olena shevchenko") == "olena shevchenko"
+    assert normalize_name("Zoë") == "zoe"
+    assert similar_names("olena shevchenko", "olena shevchenco")
+    assert not similar_names("olena shevchenko", "oleh shevchuk")
+
+
+def test_union_find():
+    sets = UnionFind(5)
+    sets.union(0, 1)
+    sets.union(3, 4)
+    sets.union(1, 4)
+    assert sets.find(0) == sets.find(3)
+    assert sets.find(2) != sets.find(0)
+    assert sets.size[sets.find(0)] == 4
+
+
+def test_find_duplicates():
+    groups = find_duplicates([
+        candidate(1, "Olena Shevchenko", "olena@gmail.com", "0501234567"),
+        candidate(2, "Shevchenko Olena", "o.lena@gmail.com", "0661111111", date(1985, 5, 5)),
+        candidate(3, "Andrii Koval", "andrii@ukr.net", "+380501234567", date(1970, 3, 3)),
+        candidate(4, "Iryna Bondar", "iryna@ukr.net", "0672222222", date(1992, 7, 7)),
+        candidate(5, "Iryna Bondar", "bondar@i.ua", "0673333333", date(1992, 7, 7)),
+        candidate(6, "Iryna Bondar", "other@i.ua", "0674444444", date(1993, 7, 7)),
+        candidate(7, "Maria Melnyk", "maria@i.ua", "0675555555", date(1993, 7, 7)),
+    ])
+    assert [(group.contact_ids, group.reasons) for group in groups] == [
+        ([1, 2, 3], ["email", "phone"]),
+        ([4, 5], ["name"]),
+    ]
+
+
+def word(i):
+    letters = ""
+    for _ in range(4):
+        i, letter = divmod(i, 26)
+        letters += chr(ord("a") + letter)
+    return letters
+
+
+def test_large_blocks_stay_linear():
+    # Every contact shares the birthday, only the window of neighbours is compared
+    contacts = [candidate(i, f"{word(i)} {word(i * 7919)}", f"p{i}@example.com", f"050{i:07d}")
+                for i in range(20_000)]
+    contacts.append(candidate(20_000, f"{word(42)} {word(42 * 7919)}x", "dup@example.com", "0999999999"))
+    groups = find_duplicates(contacts)
+    assert [group.contact_ids for group in groups] == [[42, 20_000]]
+
+
+def test_shared_keys_do_not_chain_everything_into_one_group():
+    # A shared placeholder email is ignored, and the phone chain stops growing at max_group contacts
+    contacts = [candidate(i, f"{word(i)} {word(i * 7919)}", "none@example.com", f"050{i // 2:07d}",
+                          date(1990, 1, 1 + i % 28)) for i in range(10)]
+    contacts += [candidate(10 + i, f"{word(100 + i)} x", f"chain{i // 2}@example.com", f"066{(i + 1) // 2:07d}",
+                           date(1980, 1, 1 + i)) for i in range(10)]
+    groups = find_duplicates(contacts, max_group=4)
+    assert all(len(group.contact_ids) <= 4 for group in groups)
+    assert [group.contact_ids for group in groups if group.contact_ids[0] < 10] == [[0, 1], [2, 3], [4, 5], [6, 7],
+                                                                                    [8, 9]]
+    assert sum(len(group.contact_ids) for group in groups if group.contact_ids[0] >= 10) == 10
+
+
+def test_merge_request_is_capped():
+    MergeRequest(keep_id=1, merge_ids=list(range(2, CONTACT_MERGE_MAX_IDS + 2)))
+    with pytest.raises(ValidationError):
+        MergeRequest(keep_id=1, merge_ids=list(range(2, CONTACT_MERGE_MAX_IDS + 3)))
+
+
+@pytest.fixture()
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/dedupe.db")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+def test_merge(db):
+    owner, other = User(username="owner", email="owner@example.com", password="x"), \
+        User(username="other", email="other@example.com", password="x")
+    db.add_all([owner, other])
+    db.commit()
+    contacts = [Contact(name="Olena", fullname="Olena Shevchenko", email="olena@gmail.com", phone_number="0501234567",
+                        birthday=date(1990, 1, 1), description=description, user_id=owner.id)
+                for description in ("work", "", "met at the conference")]
+    foreign = Contact(name="Olena", fullname="Olena Shevchenko", email="olena@gmail.com", phone_number="0501234567",
+                      birthday=date(1990, 1, 1), description="", user_id=other.id)
+    db.add_all(contacts + [foreign])
+    db.commit()
+    ids = [contact.id for contact in contacts]
+
+    assert asyncio.run(merge_contacts(ids[0], [ids[1], foreign.id], db, owner)) is None
+    assert len(asyncio.run(get_dedupe_candidates(db, owner))) == 3
+
+    kept = asyncio.run(merge_contacts(ids[0], ids[1:], db, owner))
+    assert kept.id == ids[0]
+    assert kept.description == "work; met at the conference"
+    assert [row.id for row in asyncio.run(get_dedupe_candidates(db, owner))] == [ids[0]]
@@ -0,0 +1,106 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, EmailOpenEvent
+from src.services.events import OpenEventRecorder
+from src.services.metrics import EVENTS_DROPPED
+
+OPENED_AT = datetime(2025, 6, 15, 12, 0)
+
+
+@pytest.fixture()
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/events.db")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def stored(session_factory) -> list[tuple]:
+    with session_factory() as db:
+        return db.execute(select(EmailOpenEvent.username, EmailOpenEvent.user_agent).order_by(EmailOpenEvent.id)).all()
+
+
+def test_flush_writes_in_batches(session_factory, monkeypatch):
+    recorder = OpenEventRecorder(session_factory, batch_size=2)
+    writes = []
+    write = recorder._write
+    monkeypatch.setattr(recorder, "_write", lambda rows: writes.append(len(rows)) or write(rows))
+    for i in range(5):
+        recorder.record(f"user{i}", "Thunderbird/115.0" if i else None, OPENED_AT)
+    assert asyncio.run(recorder.flush()) == 5
+    assert writes == [2, 2, 1]
+    assert stored(session_factory)[:2] == [("user0", None), ("user1", "Thunderbird/115.0")]
+    assert not recorder.buffer
+
+
+def test_full_buffer_drops_new_events(session_factory):
+    recorder = OpenEventRecorder(session_factory, max_buffered=3)
+    dropped = EVENTS_DROPPED.labels("email_open", "buffer_full").value
+    assert [recorder.record("user", None, OPENED_AT) for _ in range(5)] == [True, True, True, False, False]
+    assert recorder.dropped == 2
+    assert EVENTS_DROPPED.labels("email_open", "buffer_full").value == dropped + 2
+
+
+def test_failed_write_is_retried(session_factory, monkeypatch):
+    recorder = OpenEventRecorder(session_factory, batch_size=10, max_buffered=10)
+    for i in range(3):
+        recorder.record(f"user{i}", None, OPENED_AT)
+    write = recorder._write
+
+    def down(rows):
+        raise OperationalError("INSERT", {}, Exception("database is down"))
+
+    monkeypatch.setattr(recorder, "_write", down)
+    assert asyncio.run(recorder.flush()) == 0
+    assert [row["username"] for row in recorder.buffer] == ["user0", "user1", "user2"]
+
+    monkeypatch.setattr(recorder, "_write", write)
+    assert asyncio.run(recorder.flush()) == 3
+    assert len(stored(session_factory)) == 3
+
+
+def test_full_batch_wakes_the_flush(session_factory):
+    async def run():
+        recorder = OpenEventRecorder(session_factory, batch_size=3, flush_seconds=60)
+        recorder.start()
+        for i in range(3):
+            recorder.record(f"user{i}", None)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if not recorder.buffer:
+                break
+        recorder.record("late", None)
+        await recorder.stop()
+
+    asyncio.run(run())
+    assert [username for username, _ in stored(session_factory)] == ["user0", "user1", "user2", "late"]
+
+
+def test_database_outage_backs_off(session_factory, monkeypatch):
+    writes = 0
+
+    def down(rows):
+        nonlocal writes
+        writes += 1
+        raise OperationalError("INSERT", {}, Exception("database is down"))
+
+    async def run():
+        recorder = OpenEventRecorder(session_factory, batch_size=2, flush_seconds=60)
+        monkeypatch.setattr(recorder, "_write", down)
+        recorder.start()
+        # Opens keep arriving while the database is down, each of them finds a full batch waiting
+        for i in range(50):
+            recorder.record(f"user{i}", None)
+            await asyncio.sleep(0.001)
+        monkeypatch.setattr(recorder, "_write", lambda rows: None)
+        await recorder.stop()
+        return recorder
+
+    recorder = asyncio.run(run())
+    assert writes == 1
+    assert not recorder.buffer and recorder.dropped == 0
@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+
+from fastapi import FastAPI
+
+from src.services.metrics import (Counter, Histogram, MetricsMiddleware, Registry, REQUEST_LATENCY, REQUESTS_IN_FLIGHT,
+                                  _Metric, route_name)
+
+
+async def plain_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def receive():
+    return {"type": "http.request"}
+
+
+async def send(message):
+    pass
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counter_render(self):
+        registry = Registry()
+        counter = registry.register(Counter("jobs_total", "Jobs", ("kind",)))
+        counter.labels("email").inc()
+        counter.labels("email").inc(2)
+        self.assertIn('jobs_total{kind="email"} 3.0', registry.render())
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = registry.register(Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+        text = registry.render()
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_count 4', text)
+
+    def test_metric_kinds_must_create_children(self):
+        with self.assertRaises(TypeError):
+            _Metric("base", "Not a metric kind")
+
+    def test_mounted_apps_are_labelled_by_mount_path(self):
+        async def static(scope, receive, send):
+            await plain_app(scope, receive, send)
+
+        app = FastAPI()
+        app.get("/")(lambda: "ok")
+        app.mount("/static", static)
+        names = []
+
+        async def labelled(scope, receive, send):
+            await app(scope, receive, send)
+            names.append(route_name(scope))
+
+        for path in ("/static/product.css", "/", "/missing"):
+            # Behind a proxy the root_path carries the prefix of the whole app
+            asyncio.run(labelled({"type": "http", "method": "GET", "path": path, "root_path": "/proxy",
+                                  "query_string": b"", "headers": []}, receive, send))
+        self.assertEqual(names, ["/static", "/", "unmatched"])
+
+    def test_middleware_records_latency_and_in_flight(self):
+        latency = REQUEST_LATENCY.labels("GET", "unmatched", 200)
+        count = sum(latency.counts)
+        asyncio.run(MetricsMiddleware(plain_app)({"type": "http", "method": "GET", "path": "/"}, receive, send))
+        self.assertEqual(sum(latency.counts), count + 1)
+        self.assertEqual(REQUESTS_IN_FLIGHT.labels("GET").value, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import pytest
+
+from src.services import passwords
+from src.services.auth import Auth
+from src.services.passwords import calibrate, password_context
+
+
+@pytest.fixture()
+def auth(monkeypatch):
+    # The lowest bcrypt cost keeps the tests fast, the policy logic is the same for any cost
+    monkeypatch.setattr(Auth, "pwd_context", password_context(5))
+    return Auth()
+
+
+def test_hash_under_policy_is_kept(auth):
+    hashed = auth.get_password_hash("secret")
+    assert auth.verify_and_update("secret", hashed) == (True, None)
+
+
+@pytest.mark.parametrize("rounds", [4, 6])
+def test_hash_under_another_policy_is_replaced(auth, rounds):
+    hashed = password_context(rounds).hash("secret")
+    verified, new_hash = auth.verify_and_update("secret", hashed)
+    assert verified
+    assert new_hash.startswith("$2b$05$")
+    assert auth.verify_password("secret", new_hash)
+
+
+def test_wrong_password_is_not_rehashed(auth):
+    hashed = password_context(4).hash("secret")
+    assert auth.verify_and_update("wrong", hashed) == (False, None)
+
+
+def test_calibrate_picks_the_slowest_cost_within_target(monkeypatch):
+    monkeypatch.setattr(passwords, "hash_time", lambda rounds, samples: 0.01 * 2 ** (rounds - 10))
+    rounds, timings = calibrate(target_ms=50, min_rounds=10, max_rounds=16)
+    assert rounds == 12
+    assert list(timings) == [10, 11, 12, 13]
+
+
+def test_calibrate_falls_back_to_min_rounds(monkeypatch):
+    monkeypatch.setattr(passwords, "hash_time", lambda rounds, samples: 1.0)
+    assert calibrate(target_ms=50, min_rounds=10, max_rounds=16) == (10, {10: 1000.0})
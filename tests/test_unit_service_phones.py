@@ -0,0 +1,54 @@
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, User
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactBase
+from src.services.phones import to_e164
+
+
+def test_to_e164():
+    for number in ("+380501234567", "0501234567", "380501234567", "+38 (050) 123-45-67", "00380501234567",
+                   "050.123.45.67", "501234567"):
+        assert to_e164(number) == "+380501234567", number
+    assert to_e164("+1 (202) 555-0143") == "+12025550143"
+    assert to_e164("020 7946 0958", country_code="44") == "+442079460958"
+    for number in (None, "", "12", "+0501234567", "+1234567890123456", "050-CALL-ME"):
+        assert to_e164(number) is None, number
+
+
+@pytest.fixture()
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/phones.db")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        yield session
+
+
+def contact(name, phone_number):
+    return ContactBase(name=name, fullname=f"{name} Contact", email=f"{name}@example.com",
+                       phone_number=phone_number, birthday=date(1990, 1, 1), description="")
+
+
+def test_lookup_by_phone(db):
+    owner, other = User(username="owner", email="owner@example.com", password="x"), \
+        User(username="other", email="other@example.com", password="x")
+    db.add_all([owner, other])
+    db.commit()
+    olena = asyncio.run(repository_contacts.create_contact(contact("olena", "+38 050 1234567"), db, owner))
+    andrii = asyncio.run(repository_contacts.create_contact(contact("andrii", "0671112233"), db, owner))
+    asyncio.run(repository_contacts.create_contact(contact("foreign", "0501234567"), db, other))
+    assert olena.phone_e164 == "+380501234567"
+
+    found = asyncio.run(repository_contacts.get_contacts_by_phone(["+380501234567", "+380671112233"], db, owner))
+    assert [c.id for c in found] == [olena.id, andrii.id]
+    assert asyncio.run(repository_contacts.get_contacts_by_phone([], db, owner)) == []
+
+    asyncio.run(repository_contacts.update_contact(andrii.id, contact("andrii", "380501234567"), db, owner))
+    found = asyncio.run(repository_contacts.get_contacts_by_phone(["+380501234567"], db, owner))
+    assert [c.id for c in found] == [olena.id, andrii.id]
+    assert asyncio.run(repository_contacts.get_contacts_by_phone(["+380671112233"], db, owner)) == []
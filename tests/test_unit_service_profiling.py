@@ -0,0 +1,101 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from src.services.profiling import ProfilingMiddleware
+
+
+def busy_work():
+    end = time.perf_counter() + 0.05
+    while time.perf_counter() < end:
+        pass
+
+
+async def app(scope, receive, send):
+    busy_work()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def other_work():
+    end = time.perf_counter() + 0.05
+    while time.perf_counter() < end:
+        pass
+
+
+async def slow_app(scope, receive, send):
+    await asyncio.sleep(0.02)
+    busy_work()
+    await asyncio.sleep(0.02)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def receive():
+    return {"type": "http.request"}
+
+
+class TestProfiling(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.messages = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    async def request(self, middleware, headers=()):
+        scope = {"type": "http", "method": "GET", "path": "/api/contacts/", "headers": list(headers)}
+        await middleware(scope, receive, self.send)
+
+    async def test_profile_with_token(self):
+        middleware = ProfilingMiddleware(app, self.directory.name, token="secret")
+        await self.request(middleware, [(b"x-profile", b"secret")])
+        files = list(Path(self.directory.name).glob("*.folded"))
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].name.endswith("-GET-api_contacts.folded"))
+        self.assertIn("busy_work", files[0].read_text())
+        self.assertIn((b"x-profile-file", files[0].name.encode()), self.messages[0]["headers"])
+
+    async def test_wrong_token(self):
+        middleware = ProfilingMiddleware(app, self.directory.name, token="secret")
+        await self.request(middleware, [(b"x-profile", b"guess")])
+        self.assertEqual(list(Path(self.directory.name).iterdir()), [])
+
+    async def test_sample_rate(self):
+        middleware = ProfilingMiddleware(app, self.directory.name, sample_rate=1.0)
+        await self.request(middleware)
+        self.assertEqual(len(list(Path(self.directory.name).glob("*.folded"))), 1)
+
+    async def test_one_profile_at_a_time(self):
+        middleware = ProfilingMiddleware(slow_app, self.directory.name, sample_rate=1.0)
+        await asyncio.gather(*[self.request(middleware) for _ in range(5)])
+        self.assertEqual(len(list(Path(self.directory.name).glob("*.folded"))), 1)
+        self.assertEqual(sum(1 for message in self.messages if message["type"] == "http.response.start"), 5)
+
+    async def test_other_tasks_are_left_out(self):
+        async def other_task():
+            await asyncio.sleep(0.005)
+            other_work()
+
+        middleware = ProfilingMiddleware(slow_app, self.directory.name, sample_rate=1.0)
+        await asyncio.gather(self.request(middleware), other_task())
+        folded = next(Path(self.directory.name).glob("*.folded")).read_text()
+        self.assertIn("busy_work", folded)
+        self.assertNotIn("other_work", folded)
+
+    async def test_oldest_profiles_are_removed(self):
+        middleware = ProfilingMiddleware(app, self.directory.name, sample_rate=1.0, max_files=2)
+        for i in range(4):
+            middleware.write(f"20250101T00000{i}-000-GET-root.folded", "")
+        self.assertEqual(sorted(path.name for path in Path(self.directory.name).iterdir()),
+                         ["20250101T000002-000-GET-root.folded", "20250101T000003-000-GET-root.folded"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+from redis.exceptions import ConnectionError
+from sqlalchemy import create_engine, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+
+from src.database.functions import email_domain
+from src.database.models import Base, Contact, User
+from src.repository.contacts import get_contact_stats
+from src.services import stats
+
+NOW = datetime(2025, 6, 15, 12, 0)
+
+
+class DownRedis:
+
+    def delete(self, key):
+        raise ConnectionError("Redis is down")
+
+
+@pytest.fixture()
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/stats.db")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        owner, other = User(username="owner", email="owner@example.com", password="x"), \
+            User(username="other", email="other@example.com", password="x")
+        session.add_all([owner, other])
+        session.commit()
+        rows = [("olena@Gmail.com", date(1990, 1, 5), NOW - timedelta(days=1), owner),
+                ("andrii@gmail.com", date(1985, 1, 20), NOW - timedelta(days=10), owner),
+                ("iryna@ukr.net", date(1992, 7, 7), NOW - timedelta(days=100), owner),
+                ("maria@ukr.net", date(1993, 7, 8), NOW - timedelta(days=100), other)]
+        session.add_all([Contact(name="c", fullname="c c", email=email, phone_number="0501234567", birthday=birthday,
+                                 description="", created_at=created_at, user_id=user.id)
+                         for email, birthday, created_at, user in rows])
+        session.commit()
+        yield session, owner
+
+
+def test_email_domain_compiles_per_dialect():
+    query = select(email_domain(Contact.email))
+    assert "lower(substr(contacts.email, instr(contacts.email, '@') + 1))" in str(query)
+    assert "lower(split_part(contacts.email, '@', 2))" in str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_contact_stats(db):
+    session, owner = db
+    result = asyncio.run(get_contact_stats(session, owner, NOW, top_domains=1))
+    assert result.total == 3
+    assert result.birthdays_by_month[1] == 2 and result.birthdays_by_month[7] == 1
+    assert sum(result.birthdays_by_month.values()) == 3
+    assert [(d.domain, d.contacts) for d in result.email_domains] == [("gmail.com", 2)]
+    assert (result.added_last_7_days, result.added_last_30_days) == (1, 2)
+
+
+def test_cached_until_invalidated(db, redis, monkeypatch):
+    session, owner = db
+    monkeypatch.setattr(stats.stats_cache, "_client", redis)
+    monkeypatch.setattr(stats.stats_cache, "hits", 0)
+    first = asyncio.run(stats.get_contact_stats(session, owner))
+    session.add(Contact(name="n", fullname="n n", email="new@i.ua", phone_number="0501234567",
+                        birthday=date(1990, 3, 3), description="", user_id=owner.id))
+    session.commit()
+    assert asyncio.run(stats.get_contact_stats(session, owner)) == first
+    assert stats.stats_cache.hits == 1
+
+    stats.invalidate_contact_stats(owner.id)
+    assert asyncio.run(stats.get_contact_stats(session, owner)).total == first.total + 1
+
+
+def test_invalidation_survives_redis_errors(monkeypatch):
+    monkeypatch.setattr(stats.stats_cache, "_client", DownRedis())
+    stats.invalidate_contact_stats(1)
@@ -0,0 +1,26 @@
+import runpy
+from pathlib import Path
+
+from src.database.db import engine
+from src.services.auth import auth_service
+from tests.conftest import DictRedis
+
+settings = runpy.run_path(str(Path(__file__).parent.parent / "gunicorn.conf.py"))
+
+
+def test_settings():
+    assert settings["wsgi_app"] == "main:app"
+    assert settings["worker_class"] == "uvicorn.workers.UvicornWorker"
+    assert settings["preload_app"] is True
+    assert settings["workers"] >= 1
+    assert settings["max_requests"] > 0 and settings["max_requests_jitter"] > 0
+
+
+def test_post_fork_drops_inherited_connections():
+    pool = engine.pool
+    auth_service.cache = DictRedis()
+    auth_service.user_cache.client = auth_service.cache
+    settings["post_fork"](None, None)
+    assert engine.pool is not pool
+    assert auth_service._cache is None
+    assert auth_service.user_cache._client is None